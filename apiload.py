@@ -0,0 +1,112 @@
+import sys
+import time
+import asyncio
+import argparse
+# PC から IoTServer の /api/* に負荷をかけて、応答時間と 1 秒あたりのリクエスト数を表示する
+# 例: python apiload.py 192.168.4.1 -c 4 -n 200
+#     python apiload.py 192.168.4.1 --path /api/state --post '/api/pixel={"n":0,"r":100,"g":0,"b":0}'
+#     python apiload.py 127.0.0.1 --port 8080     （PC のエミュレーター python host/emulator.py に向ける）
+
+async def read_response(reader):
+    """ステータスコードと、接続を続けられるかを返す"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("closed")
+    status = int(status_line.split()[1])
+    length = 0
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+def make_requests(host, paths, posts):
+    """送るリクエストのバイト列のリスト（順番に使う）"""
+    requests = []
+    for path in paths:
+        requests.append(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    for post in posts:
+        path, _, body = post.partition("=")
+        body = body.encode()
+        requests.append(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    return requests
+
+
+async def worker(host, port, requests, count, latencies, statuses):
+    """1 本の接続で count 回リクエストを送る（サーバーが閉じたらつなぎ直す）"""
+    reader = writer = None
+    for i in range(count):
+        request = requests[i % len(requests)]
+        start = time.perf_counter()
+        # サーバーが keep-alive の接続を閉じていたら、新しい接続で 1 回だけ送り直す
+        for retry in (writer is not None, False):
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await read_response(reader)
+                break
+            except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+                if writer:
+                    writer.close()
+                reader = writer = None
+                if not retry:
+                    statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+        else:
+            continue
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer:
+        writer.close()
+
+
+async def run(args):
+    """負荷をかけて結果を表示し、(req/s, 応答時間のリスト（昇順、秒）, ステータスの数) を返す"""
+    requests = make_requests(args.host, args.path or ["/api/sensors"], args.post or [])
+    latencies = []
+    statuses = {}
+    per_worker = args.requests // args.concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(args.host, args.port, requests, per_worker, latencies, statuses)
+                           for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{len(latencies)} 件の応答 / {elapsed:.2f} 秒 ({len(latencies) / elapsed:.1f} req/s)")
+    print("ステータス:", statuses)
+    if latencies:
+        def ms(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        print(f"応答時間 ms: 50%={ms(0.5):.1f} 95%={ms(0.95):.1f} 99%={ms(0.99):.1f} 最大={latencies[-1] * 1000:.1f}")
+    return len(latencies) / elapsed, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IoTServer の JSON API の負荷テスト")
+    parser.add_argument("host", help="デバイスの IP アドレス（アクセスポイントなら 192.168.4.1）")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="同時接続数（サーバーの上限は 4）")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="リクエストの合計")
+    parser.add_argument("--path", action="append", help="GET するパス（複数指定可）")
+    parser.add_argument("--post", action="append", help="POST する パス=JSON（複数指定可）")
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.requests < args.concurrency:
+        parser.error("requests は concurrency 以上にしてください")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
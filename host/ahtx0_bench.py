@@ -0,0 +1,51 @@
+# AHT20 の読み取りがイベントループを止める時間のベンチマーク（仮想の時計）
+# BLE の接続間隔 (7.5 ms) ごとにコマンドが届くとして、届いてから処理が始まるまでの
+# 遅れを測る。センサーは 250 ms ごとに読む（Device.send_sensor_value と同じ）。
+#   blocking: aht.read()            変換の 80 ms の間ループが止まる
+#   async:    await aht.read_async() 変換を待つ間も他のタスクが動く
+# python host/ahtx0_bench.py
+import asyncio
+import fakes
+from fakes import FakeI2C, clock
+from ahtx0 import AHT20
+
+COMMAND_INTERVAL_MS = 7.5
+SENSOR_INTERVAL_MS = 250
+DURATION_MS = 10000
+
+
+async def command_task(latencies, stop):
+    """接続間隔ごとに届くコマンドを処理するタスク。届いた時刻からの遅れを記録する"""
+    due = clock.now()
+    while not stop.is_set():
+        due += COMMAND_INTERVAL_MS / 1000
+        await asyncio.sleep(max(0, due - clock.now()))
+        latencies.append((clock.now() - due) * 1000)
+
+
+async def sensor_task(aht, use_async, stop):
+    while not stop.is_set():
+        if use_async:
+            await aht.read_async()
+        else:
+            aht.read()
+        await asyncio.sleep_ms(SENSOR_INTERVAL_MS)
+
+
+async def bench(use_async):
+    aht = AHT20(FakeI2C())
+    latencies = []
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(command_task(latencies, stop)),
+             asyncio.create_task(sensor_task(aht, use_async, stop))]
+    await asyncio.sleep_ms(DURATION_MS)
+    stop.set()
+    await asyncio.gather(*tasks)
+    latencies.sort()
+    print("{:<9} commands={:5d} latency ms: avg={:6.2f} 99%={:6.2f} max={:6.2f}".format(
+        "async" if use_async else "blocking", len(latencies), sum(latencies) / len(latencies),
+        latencies[int(len(latencies) * 0.99)], latencies[-1]))
+
+
+for use_async in (False, True):
+    fakes.run(bench(use_async))
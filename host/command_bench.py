@@ -0,0 +1,145 @@
+# Device.do_command のマイクロベンチマーク（1 秒あたりのコマンド数と 1 コマンドあたりのメモリ確保）
+#   before: 以前の do_command（list(data) でコピーし、if/elif で分岐してスライスする）
+#   table:  今の do_command（コマンドID の表と memoryview + struct.unpack_from）
+# Hardware の出力は何もしない関数に置き換え、コマンドの解釈と分岐だけを測る。
+# do_command のコルーチン (async def ... return True) は前後で同じなので、その中身だけを比べる。
+#
+# PC:     python host/command_bench.py   （確保は tracemalloc で見た 1 コマンド中の最大の増加バイト数）
+# デバイス: このファイルを送って import する （確保は gc を止めて gc.mem_alloc() で数えたバイト数）
+import gc
+import sys
+import time
+import struct
+try:
+    import fakes    # PC のとき
+except ImportError:
+    pass
+from hardware import Hardware
+from iotdevice import Device
+
+COUNT = 20000
+COMMANDS = {
+    "digital": bytes((33, 19, 1)),
+    "analog": struct.pack("<BBH", 34, 19, 512),
+    "pixel": bytes((161, 0, 100, 0, 0)),
+    "tone": struct.pack("<BIB", 97, 2273, 255),
+    "stop": bytes((96,)),
+    "text": bytes((65, 0)) + b"Hello",
+    "icon": bytes((66,)) + bytes(15),
+}
+
+
+class NullLink:
+    connection = None
+
+    def send_notification(self, data):
+        pass
+
+    def state_write(self, buffer):
+        pass
+
+    def set_notify_format(self, version):
+        return False
+
+
+def _noop(*args):
+    pass
+
+
+hardware = Hardware()
+for name in ("digital_out", "analog_out", "pixcel", "play_tone", "stop_tone", "show_text", "draw_icon"):
+    setattr(hardware, name, _noop)
+device = Device(NullLink())
+
+
+def command_before(self, data):
+    """以前の Device.do_command の中身"""
+    data_list = list(data)
+    command_id = data_list[0]
+    if command_id == 65:
+        self.hardware.show_text(data[2:].decode('utf-8'), data[1])
+    elif command_id == 33:
+        pin = data[1]
+        val = data[2]
+        self.hardware.digital_out(pin, val)
+    elif command_id == 34:
+        pin = data[1]
+        uint16_value = struct.unpack('<H', data[2:4])[0]
+        self.hardware.analog_out(pin, uint16_value)
+    elif command_id == 96:
+        self.hardware.stop_tone()
+    elif command_id == 97:
+        four_bytes = data[1:5]
+        uint32_value = struct.unpack('<I', four_bytes)[0]
+        self.hardware.play_tone(1000000 / uint32_value, data[5]/255*100)
+    elif command_id == 130:
+        label = data[1:9].decode('utf-8')
+        value = data[9:].decode('utf-8')
+        print("label:", label, value)
+    elif command_id == 66:
+        self.hardware.draw_icon(data[1:], 0, 0)
+    elif command_id == 67:
+        self.hardware.draw_icon(data[1:], 0, 3)
+    elif command_id == 161:
+        n = data[1]
+        r = data[2]
+        g = data[3]
+        b = data[4]
+        self.hardware.pixcel(n, r, g, b)
+    else:
+        print("Command ID", command_id, "is not defined.")
+    return True
+
+
+def before(data):
+    command_before(device, data)
+
+
+def table(data):
+    device._dispatch(memoryview(data))     # 今の do_command の中身
+
+
+def commands_per_second(run, data):
+    start = time.ticks_us()
+    for _ in range(COUNT):
+        run(data)
+    return COUNT * 1000000 / max(1, time.ticks_diff(time.ticks_us(), start))
+
+
+if sys.implementation.name == "micropython":
+    def allocated_bytes(run, data, n=100):
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for _ in range(n):
+            run(data)
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used / n
+else:
+    import tracemalloc
+
+    def allocated_bytes(run, data, n=100):
+        run(data)
+        tracemalloc.start()
+        peak = 0
+        for _ in range(n):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            run(data)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+        return peak
+
+
+def main():
+    print("{:<8} {:>12} {:>12} {:>10} {:>10}".format("command", "before/s", "table/s", "before B", "table B"))
+    for name, data in COMMANDS.items():
+        print("{:<8} {:12.0f} {:12.0f} {:10.0f} {:10.0f}".format(
+            name, commands_per_second(before, data), commands_per_second(table, data),
+            allocated_bytes(before, data), allocated_bytes(table, data)))
+    if sys.implementation.name != "micropython":
+        print("（CPython では memoryview と unpack_from のタプルが大きく見える。デバイスの数字はデバイスで測る）")
+
+
+main()
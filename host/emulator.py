@@ -0,0 +1,130 @@
+# IoTServer を PC で動かすエミュレーター（偽の machine, network, bluetooth で src をそのまま動かす）
+# main1.py と同じように BLE、WebSocket、HTTP サーバーを 1 つのイベントループで動かすので、
+# apiload.py や wsclient.py をデバイスの代わりにこのサーバーに向けて試せる。
+#
+#   python host/emulator.py --port 8080
+#   python apiload.py 127.0.0.1 --port 8080 -c 4 -n 400
+#
+# --ble-interval-ms を指定すると、偽のセントラルが BLE で接続し、その間隔でコマンドを書き込む。
+# --jumper 19 は GPIO19 の出力を GPIO17（右ボタン）に線でつないだことにする。GPIO19 への
+# デジタル出力コマンドがピンのイベントの通知になって返るので、コマンドの往復を測れる。
+# SIGTERM で止めると、BLE のコマンドの統計 (command_stats) を JSON で 1 行表示する。
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import fakes
+from aioble.core import ble
+from ble_conn import BLEConnection
+from ws_conn import WebSocketConnection
+from iotdevice import Device, StatePublisher
+from hardware import Hardware
+from server import IoTServer
+
+# BLE のセントラルが順に書き込むコマンド（LED の点滅と NeoPixel の色）
+BLE_COMMANDS = (bytes((33, 15, 1)), bytes((161, 0, 100, 0, 0)),
+                bytes((33, 15, 0)), bytes((161, 0, 0, 0, 0)))
+
+
+class Emulator:
+    """main1.IoTManager と同じつなぎ方のデバイスと IoTServer（ループの中で作る）"""
+
+    def __init__(self, jumper=None):
+        self.hardware = Hardware()
+        if jumper is not None:
+            self._add_jumper(jumper)    # Device がコマンドを登録する前に差し替える
+        self.ble_conn = BLEConnection()
+        self.device = Device(self.ble_conn)
+        self.ws_conn = WebSocketConnection(self.queue_command)
+        self.device.add_link(self.ws_conn)
+        self.publisher = StatePublisher(self.device)
+        self.server = IoTServer()
+        self.ws_conn.register_routes(self.server)
+        self.ble_writes = 0
+        asyncio.create_task(self.hardware.sampler.run())
+        asyncio.create_task(self.hardware.display.run())
+        asyncio.create_task(self.hardware.pin_event_task())
+        asyncio.create_task(self.device.gestures.run())
+        asyncio.create_task(self.ble_conn.peripheral_task())
+        asyncio.create_task(self.ble_conn.notify_task())
+        asyncio.create_task(self.sensor_task())
+        asyncio.create_task(self.ble_conn.command_task(self.device.do_command, self.device.command_key))
+
+    def _add_jumper(self, out_pin):
+        """out_pin へのデジタル出力で GPIO17 の入力も変わる（割り込みも起きる）ようにする"""
+        hardware = self.hardware
+        digital_out = hardware.digital_out
+
+        def wired_digital_out(pin, n):
+            digital_out(pin, n)
+            if pin == out_pin:
+                hardware.PIN17.drive(n)
+        hardware.digital_out = wired_digital_out
+
+    async def sensor_task(self):
+        publisher = self.publisher
+        while True:
+            if self.ble_conn.connection or self.ws_conn.connection:
+                publisher.poll()
+            else:
+                publisher.reset()
+            await asyncio.sleep_ms(publisher.poll_ms)
+
+    async def queue_command(self, data):
+        if self.ble_conn.commands is not None:
+            await self.ble_conn.commands.put(data)
+        else:
+            await self.device.do_command(data)
+
+    async def connect_ble(self):
+        """偽のセントラルとして接続する"""
+        await asyncio.sleep_ms(100)     # peripheral_task が広告を始めるのを待つ
+        ble.connect()
+
+    async def ble_central(self, interval_ms):
+        """偽のセントラルとして接続し、interval_ms ごとにコマンドを書き込む"""
+        await self.connect_ble()
+        handle = self.ble_conn.command_characteristic._value_handle
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            due += interval_ms / 1000
+            await asyncio.sleep(max(0, due - loop.time()))
+            ble.write(handle, BLE_COMMANDS[self.ble_writes % len(BLE_COMMANDS)])
+            self.ble_writes += 1
+
+    async def start(self, host="127.0.0.1", port=8080, ble_interval_ms=None):
+        """HTTP サーバーを起動する（アクセスポイントは待たない）"""
+        self.server.get_wifi_config()
+        self.server.server = await asyncio.start_server(self.server.handle_client, host, port)
+        if ble_interval_ms:
+            asyncio.create_task(self.ble_central(ble_interval_ms))
+        print("エミュレーターを起動しました: http://%s:%d/" % (host, port), flush=True)
+
+
+async def serve(args):
+    emulator = Emulator(args.jumper)
+    await emulator.start(args.host, args.port, args.ble_interval_ms)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, emulator.server.stop_server)
+    except NotImplementedError:
+        pass    # Windows
+    await emulator.server.server.wait_closed()
+    print("BLE:", json.dumps(emulator.ble_conn.command_stats()), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IoTServer を PC で動かす")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ble-interval-ms", type=float, help="BLE のコマンドを書き込む間隔（接続間隔）")
+    parser.add_argument("--jumper", type=int, metavar="PIN", help="GPIO17（右ボタン）につなぐ出力ピン")
+    # asyncio.run() は終わるときに全部のタスクを取り消して待つが、aioble.advertise() は
+    # 取り消しを飲み込み peripheral_task が終わらない。デバイスと同じくタスクは止めずに終わる
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,827 @@
+# Pcratch IoT をホスト（PC の CPython）で動かすための MicroPython の代わり
+# machine, network, framebuf, bluetooth などの最小限の代わりを sys.modules に入れ、
+# src と src/lib のモジュールをそのまま import できるようにする。
+# テスト、ベンチマーク、エミュレーターの最初に import する。
+#
+#   import fakes
+#   from ahtx0 import AHT20
+#   i2c = fakes.FakeI2C()                 # AHT20, BH1750, OLED がつながったバス
+#   aht = AHT20(i2c)
+#   fakes.run(main())                     # 仮想の時計で asyncio を動かす（待たずに時刻だけ進む）
+#
+# 時計 (clock) は実時間で進むが、run() の間と clock.virtual = True のときは
+# sleep_ms() や I2C の転送時間の分だけ進む仮想の時計になる。
+import os
+import sys
+import time
+import types
+import struct
+import asyncio
+import selectors
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(ROOT, "src", "lib"), os.path.join(ROOT, "src")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+# ---------------------------------------------------------------------------
+# 時計
+
+class Clock:
+    """ticks_ms() などが使う時計。virtual のときは advance() でだけ進む"""
+
+    def __init__(self):
+        self.virtual = False
+        self._now = 0.0
+
+    def now(self):
+        return self._now if self.virtual else time.monotonic()
+
+    def advance(self, seconds):
+        if self.virtual:
+            self._now += seconds
+
+    def sleep(self, seconds):
+        """ブロックする sleep。仮想の時計ではその分だけ進める"""
+        if self.virtual:
+            self._now += seconds
+        elif seconds > 0:
+            time.sleep(seconds)
+
+
+clock = Clock()
+
+
+def ticks_ms():
+    return int(clock.now() * 1000)
+
+
+def ticks_us():
+    return int(clock.now() * 1000000)
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def ticks_add(a, b):
+    return a + b
+
+
+def sleep_ms(ms):
+    clock.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    clock.sleep(us / 1000000)
+
+
+# time にも MicroPython の関数を足す（utime は time と同じ）
+time.ticks_ms = ticks_ms
+time.ticks_us = ticks_us
+time.ticks_cpu = ticks_us
+time.ticks_diff = ticks_diff
+time.ticks_add = ticks_add
+time.sleep_ms = sleep_ms
+time.sleep_us = sleep_us
+sys.modules["utime"] = time
+
+
+# ---------------------------------------------------------------------------
+# asyncio
+
+class ThreadSafeFlag:
+    """asyncio.ThreadSafeFlag の代わり。wait() は戻るときにフラグを下ろす"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+def _sleep_ms(ms):
+    return asyncio.sleep(ms / 1000)
+
+
+def _wait_for_ms(aw, ms):
+    return asyncio.wait_for(aw, ms / 1000)
+
+
+class StreamReader(asyncio.StreamReader):
+    """asyncio.StreamReader の代わり。MicroPython と同じく StreamReader(stream) で
+    ファイル（pty など）を読める。stream を省略すると CPython と同じ（feed_data() で入れる）"""
+
+    def __init__(self, stream=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if stream is not None:
+            self._fd = stream.fileno()
+            os.set_blocking(self._fd, False)
+            self._reading_loop = asyncio.get_running_loop()
+            self._reading_loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""      # 相手が閉じた pty は EIO になる
+        if data:
+            self.feed_data(data)
+        else:
+            self._reading_loop.remove_reader(self._fd)
+            self.feed_eof()
+
+
+asyncio.ThreadSafeFlag = ThreadSafeFlag
+asyncio.StreamReader = StreamReader
+asyncio.sleep_ms = _sleep_ms
+asyncio.wait_for_ms = _wait_for_ms
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """待つ代わりに仮想の時計を進めるセレクター"""
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if not ready and timeout:
+            clock.advance(timeout)
+        return ready
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """仮想の時計で動くイベントループ。sleep は待たずに時計を進める"""
+
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self):
+        return clock.now()
+
+
+def run(main):
+    """仮想の時計で main を実行する（ソケットを使うものは asyncio.run で動かす）"""
+    virtual = clock.virtual
+    clock.virtual = True
+    try:
+        with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+            return runner.run(main)
+    finally:
+        clock.virtual = virtual
+
+
+# ---------------------------------------------------------------------------
+# micropython
+
+def _identity(f):
+    return f
+
+
+_module("micropython",
+        const=lambda value: value,
+        native=_identity,
+        viper=_identity,
+        alloc_emergency_exception_buf=lambda size: None,
+        schedule=lambda func, arg: func(arg),
+        kbd_intr=lambda chr: None,
+        mem_info=lambda *args: None,
+        opt_level=lambda *args: 0)
+
+
+# ---------------------------------------------------------------------------
+# machine
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._value = 0 if value is None else value
+        self._handler = None
+        self._trigger = 0
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            self._value = value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    def drive(self, v):
+        """外から入力を変える（ボタンを押すなど）。エッジに合えば割り込みを呼ぶ"""
+        old = self._value
+        self._value = 1 if v else 0
+        edge = Pin.IRQ_RISING if self._value > old else Pin.IRQ_FALLING if self._value < old else 0
+        if self._handler and edge & self._trigger:
+            self._handler(self)
+
+
+class PWM:
+    def __init__(self, pin, freq=0, duty=0, duty_u16=None):
+        self.pin = pin
+        self._freq = freq
+        self._duty_u16 = duty * 64 if duty_u16 is None else duty_u16
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty(self, d=None):
+        if d is None:
+            return self._duty_u16 // 64
+        self._duty_u16 = d * 64
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty_u16
+        self._duty_u16 = d
+
+    def deinit(self):
+        self._duty_u16 = 0
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=None):
+        self.pin = pin
+        self.raw = 2048     # read() が返す値（0〜4095）
+
+    def atten(self, atten):
+        pass
+
+    def width(self, width):
+        pass
+
+    def read(self):
+        return self.raw
+
+    def read_u16(self):
+        return self.raw * 16
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+
+    def feed(self):
+        pass
+
+
+def _reset():
+    print("[fakes] machine.reset()")
+
+
+_module("machine", Pin=Pin, PWM=PWM, ADC=ADC, WDT=WDT,
+        reset=_reset, soft_reset=_reset,
+        unique_id=lambda: b"\x30\xae\xa4\x12\x34\x56",
+        freq=lambda *args: 160000000)
+
+
+# ---------------------------------------------------------------------------
+# I2C とデバイス
+
+class I2CDevice:
+    """FakeI2C につなぐデバイスの基本クラス。error を入れると次の転送で例外になる"""
+    error = None
+
+    def write(self, data):
+        pass
+
+    def read(self, n):
+        return bytes(n)
+
+
+class AHT20Sensor(I2CDevice):
+    """AHT20: 0xAC で変換を始め、conversion_ms の間は BUSY を返す"""
+
+    def __init__(self, temperature=25.0, humidity=50.0, conversion_ms=80):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.conversion_ms = conversion_ms
+        self.triggers = 0
+        self._ready_at = 0.0
+
+    def write(self, data):
+        if data[0] == 0xAC:
+            self.triggers += 1
+            self._ready_at = clock.now() + self.conversion_ms / 1000
+
+    def read(self, n):
+        status = 0x08   # 校正済み
+        if clock.now() < self._ready_at:
+            status |= 0x80
+        humidity = int(self.humidity * 0x100000 / 100) & 0xFFFFF
+        temp = int((self.temperature + 50) * 0x100000 / 200) & 0xFFFFF
+        raw = bytes((status, humidity >> 12, (humidity >> 4) & 0xFF,
+                     ((humidity & 0xF) << 4) | (temp >> 16), (temp >> 8) & 0xFF, temp & 0xFF))
+        return raw[:n]
+
+
+class BH1750Sensor(I2CDevice):
+    def __init__(self, lux=300.0):
+        self.lux = lux
+        self.mode_writes = 0
+
+    def write(self, data):
+        if data[0] & 0xF0 in (0x10, 0x20):
+            self.mode_writes += 1
+
+    def read(self, n):
+        return struct.pack(">H", min(0xFFFF, int(self.lux * 1.2)))[:n]
+
+
+class SSD1306Panel(I2CDevice):
+    """OLED。受け取ったコマンドとデータのバイト数を数えるだけ"""
+
+    def __init__(self):
+        self.data_bytes = 0
+
+    def write(self, data):
+        if data[:1] == b"\x40":
+            self.data_bytes += len(data) - 1
+
+
+def default_devices():
+    """Pcratch IoT のボードにつながっている I2C デバイス"""
+    return {0x38: AHT20Sensor(), 0x23: BH1750Sensor(), 0x3C: SSD1306Panel()}
+
+
+class FakeI2C:
+    """machine.I2C の代わり。転送をデバイスに渡し、回数とバイト数を数える
+
+    転送のたびに (バイト数 + アドレス) x 9 ビットの時間だけ時計を進める。
+    """
+
+    def __init__(self, *args, devices=None, freq=400000, **kwargs):
+        self.devices = default_devices() if devices is None else devices
+        self.freq = freq
+        self.reset_counts()
+
+    def reset_counts(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.per_address = {}   # アドレス -> [転送数, バイト数]
+
+    def _device(self, addr, n):
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(19)   # ENODEV
+        if device.error:
+            raise device.error
+        self.transfers += 1
+        self.bytes += n
+        counts = self.per_address.setdefault(addr, [0, 0])
+        counts[0] += 1
+        counts[1] += n
+        clock.advance((n + 1) * 9 / self.freq)
+        return device
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        data = bytes(buf)
+        self._device(addr, len(data)).write(data)
+        return len(data)
+
+    def writevto(self, addr, bufs, stop=True):
+        data = b"".join(bytes(buf) for buf in bufs)
+        self._device(addr, len(data)).write(data)
+        return len(data)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self._device(addr, len(buf)).read(len(buf))
+
+    def readfrom(self, addr, n, stop=True):
+        return self._device(addr, n).read(n)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.writeto(addr, bytes((memaddr,)) + bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, n):
+        self.writeto(addr, bytes((memaddr,)))
+        return self.readfrom(addr, n)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+
+sys.modules["machine"].I2C = FakeI2C
+
+
+# ---------------------------------------------------------------------------
+# framebuf（MONO_VLSB と MONO_HLSB だけ）
+
+MONO_VLSB = 0
+RGB565 = 1
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+def _glyph(ch):
+    """text() の代わりの字形。本物のフォントではないが、文字ごとに違う 8x8 の模様"""
+    if ch == " ":
+        return bytes(8)
+    code = ord(ch) * 0x9E3779B1
+    return bytes([((code >> (i * 4)) & 0x7E) | 0x01 for i in range(7)] + [0])
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError("unsupported format")
+        self._buf = buffer
+        self._w = width
+        self._h = height
+        self._format = format
+        self._stride = width if stride is None else stride
+
+    def _index(self, x, y):
+        if self._format == MONO_VLSB:
+            return (y >> 3) * self._stride + x, y & 7
+        index = y * ((self._stride + 7) >> 3) + (x >> 3)
+        return index, (7 - (x & 7)) if self._format == MONO_HLSB else (x & 7)
+
+    def _get(self, x, y):
+        index, bit = self._index(x, y)
+        return (self._buf[index] >> bit) & 1
+
+    def _set(self, x, y, c):
+        if 0 <= x < self._w and 0 <= y < self._h:
+            index, bit = self._index(x, y)
+            if c:
+                self._buf[index] |= 1 << bit
+            else:
+                self._buf[index] &= ~(1 << bit) & 0xFF
+
+    def fill(self, c):
+        if self._format == MONO_VLSB and self._stride == self._w:
+            value = 0xFF if c else 0
+            for i in range(self._w * ((self._h + 7) >> 3)):
+                self._buf[i] = value
+        else:
+            self.fill_rect(0, 0, self._w, self._h, c)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._w and 0 <= y < self._h):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(0, y), min(self._h, y + h)):
+            for xx in range(max(0, x), min(self._w, x + w)):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=15):
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                d = (xx * xx) / max(1, xr * xr) + (yy * yy) / max(1, yr * yr)
+                if d <= 1 and (f or d > 1 - 2 / max(1, min(xr, yr) + 1)):
+                    self._set(x + xx, y + yy, c)
+
+    def poly(self, x, y, coords, c, f=False):
+        points = [(coords[i], coords[i + 1]) for i in range(0, len(coords), 2)]
+        for i in range(len(points)):
+            x1, y1 = points[i]
+            x2, y2 = points[(i + 1) % len(points)]
+            self.line(x + x1, y + y1, x + x2, y + y2, c)
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            for dx, column in enumerate(_glyph(ch)):
+                for dy in range(8):
+                    if column >> dy & 1:
+                        self._set(x + dx, y + dy, c)
+            x += 8
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for sy in range(fbuf._h):
+            for sx in range(fbuf._w):
+                c = fbuf._get(sx, sy)
+                if c != key:
+                    self._set(x + sx, y + sy, c)
+
+    def scroll(self, xstep, ystep):
+        w, h = self._w, self._h
+        pixels = [[self._get(x, y) for x in range(w)] for y in range(h)]
+        for y in range(h):
+            for x in range(w):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < w and 0 <= sy < h:
+                    self._set(x, y, pixels[sy][sx])
+
+
+_module("framebuf", FrameBuffer=FrameBuffer, MONO_VLSB=MONO_VLSB, MONO_HLSB=MONO_HLSB,
+        MONO_HMSB=MONO_HMSB, RGB565=RGB565)
+
+
+# ---------------------------------------------------------------------------
+# neopixel
+
+class NeoPixel:
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.pixels = [(0, 0, 0)] * n
+        self.writes = 0
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, i, color):
+        self.pixels[i] = tuple(color)
+
+    def __getitem__(self, i):
+        return self.pixels[i]
+
+    def fill(self, color):
+        self.pixels = [tuple(color)] * self.n
+
+    def write(self):
+        self.writes += 1
+
+
+_module("neopixel", NeoPixel=NeoPixel)
+
+
+# ---------------------------------------------------------------------------
+# network
+
+# WLAN.scan() が返すネットワーク (ssid, bssid, channel, RSSI, security, hidden)
+NETWORKS = [
+    (b"PcratchLab", b"\x00\x11\x22\x33\x44\x55", 1, -48, 3, False),
+    (b"Guest", b"\x00\x11\x22\x33\x44\x66", 6, -71, 0, False),
+]
+
+
+class WLAN:
+    def __init__(self, interface=0):
+        self.interface = interface
+        self._active = False
+        self._config = {"mac": b"\x30\xae\xa4\x12\x34\x56", "essid": ""}
+        self.scans = 0
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+
+    def isconnected(self):
+        return True
+
+    def ifconfig(self, *args):
+        return ("127.0.0.1", "255.255.255.0", "127.0.0.1", "127.0.0.1")
+
+    def connect(self, ssid=None, password=None):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def status(self, *args):
+        return 1010
+
+    def scan(self):
+        self.scans += 1
+        return list(NETWORKS)
+
+
+_module("network", WLAN=WLAN, STA_IF=0, AP_IF=1, STAT_GOT_IP=1010)
+
+
+# ---------------------------------------------------------------------------
+# bluetooth（aioble が使う BLE の代わり）
+
+_IRQ_CENTRAL_CONNECT = 1
+_IRQ_CENTRAL_DISCONNECT = 2
+_IRQ_GATTS_WRITE = 3
+_IRQ_MTU_EXCHANGED = 21
+
+
+class UUID:
+    def __init__(self, value):
+        if isinstance(value, int):
+            self._bytes = struct.pack("<H", value)
+        elif isinstance(value, str):
+            self._bytes = bytes.fromhex(value.replace("-", ""))[::-1]
+        else:
+            self._bytes = bytes(value)
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+    def __repr__(self):
+        return "UUID(%s)" % self._bytes[::-1].hex()
+
+
+class BLE:
+    """bluetooth.BLE の代わり。セントラル側の操作は connect() などで行う
+
+    notify_credits に数を入れると、gatts_notify() はその回数だけ成功し、
+    その後は送信バッファが一杯のときと同じように OSError になる（refill() で戻る）。
+    """
+
+    def __init__(self):
+        self._active = False
+        self._irq = None
+        self._config = {"mac": (0, b"\x30\xae\xa4\x12\x34\x56"), "mtu": 23}
+        self._values = {}
+        self.central_mtu = 23       # セントラルが受け付ける MTU（None なら MTU 交換に答えない）
+        self.mtu_delay_ms = 30      # MTU 交換の応答までの時間
+        self.notify_credits = None
+        self.on_notify = None       # on_notify(conn_handle, value_handle, data)
+        self.notified = []          # (value_handle, data)
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def irq(self, handler):
+        self._irq = handler
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
+
+    def gatts_register_services(self, services):
+        handles = []
+        handle = 1
+        for _, characteristics in services:
+            service_handles = []
+            for characteristic in characteristics:
+                handle += 1
+                service_handles.append(handle)
+                for _ in characteristic[2] if len(characteristic) > 2 else ():
+                    handle += 1
+                    service_handles.append(handle)
+            handles.append(tuple(service_handles))
+            handle += 1
+        return tuple(handles)
+
+    def gatts_set_buffer(self, value_handle, length, append=False):
+        pass
+
+    def gatts_read(self, value_handle):
+        return self._values.get(value_handle, b"")
+
+    def gatts_write(self, value_handle, data, send_update=False):
+        self._values[value_handle] = bytes(data)
+
+    def gatts_notify(self, conn_handle, value_handle, data=None):
+        if self.notify_credits is not None:
+            if self.notify_credits <= 0:
+                raise OSError(12)   # ENOMEM: 送信バッファが一杯
+            self.notify_credits -= 1
+        data = bytes(self._values.get(value_handle, b"") if data is None else data)
+        self.notified.append((value_handle, data))
+        if self.on_notify:
+            self.on_notify(conn_handle, value_handle, data)
+
+    def gatts_indicate(self, conn_handle, value_handle, data=None):
+        self.gatts_notify(conn_handle, value_handle, data)
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        pass
+
+    def gap_disconnect(self, conn_handle):
+        self.disconnect(conn_handle)
+
+    def gattc_exchange_mtu(self, conn_handle):
+        if self.central_mtu is None:
+            return
+        mtu = min(self._config["mtu"], self.central_mtu)
+        asyncio.get_running_loop().call_later(
+            self.mtu_delay_ms / 1000, self._irq, _IRQ_MTU_EXCHANGED, (conn_handle, mtu))
+
+    # セントラル側の操作
+    def connect(self, conn_handle=1, addr=b"\x11\x22\x33\x44\x55\x66"):
+        self._irq(_IRQ_CENTRAL_CONNECT, (conn_handle, 0, addr))
+
+    def disconnect(self, conn_handle=1):
+        self._irq(_IRQ_CENTRAL_DISCONNECT, (conn_handle, 0, b"\x11\x22\x33\x44\x55\x66"))
+
+    def write(self, value_handle, data, conn_handle=1):
+        """セントラルから characteristic に書き込む"""
+        self._values[value_handle] = bytes(data)
+        self._irq(_IRQ_GATTS_WRITE, (conn_handle, value_handle))
+
+    def refill(self, credits):
+        self.notify_credits = credits
+
+
+_module("bluetooth", BLE=BLE, UUID=UUID,
+        FLAG_READ=0x0002, FLAG_WRITE_NO_RESPONSE=0x0004, FLAG_WRITE=0x0008,
+        FLAG_NOTIFY=0x0010, FLAG_INDICATE=0x0020)
+
+# MicroPython では str もバッファなので bytes + str ができる。aioble は広告の名前をそのまま足す
+import aioble.peripheral as _peripheral
+_append_adv = _peripheral._append
+
+
+def _append_adv_str(adv_data, resp_data, adv_type, value):
+    return _append_adv(adv_data, resp_data, adv_type, value.encode() if isinstance(value, str) else value)
+
+
+_peripheral._append = _append_adv_str
+
+
+def run_tests(namespace):
+    """python test_xxx.py で直接動かしたとき、test_ で始まる関数を順に実行する"""
+    failed = 0
+    for name, test in list(namespace.items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print("ok  ", name)
+            except Exception as e:
+                failed += 1
+                print("FAIL", name, type(e).__name__, e)
+    return 1 if failed else 0
@@ -0,0 +1,64 @@
+# SSD1306 の show() の 1 フレームあたりの I2C 転送のベンチマーク（偽の I2C バスで数える）
+#   full:    毎回画面全体を送る（以前の show()）
+#   partial: 変更されたページと列の範囲だけを送る
+# データは SSD1306Panel が数えた表示データ、I2C はコマンドも含めた OLED への転送。
+# 時間は仮想の時計で、I2C の転送時間 (400 kHz) の合計。
+# python host/oled_bench.py
+import fakes
+from fakes import FakeI2C, clock
+from ssd1306 import SSD1306_I2C
+
+FRAMES = 200
+OLED_ADDR = 0x3C
+
+
+ball = [10, 10, 2, 2]
+
+
+def ball_frame(oled, i):
+    """sample/oled_ball.py と同じ描画"""
+    x, y, dx, dy = ball
+    oled.fill(0)
+    oled.fill_rect(x, y, 6, 6, 1)
+    x += dx
+    y += dy
+    if x <= 0 or x >= 122:
+        dx = -dx
+    if y <= 0 or y >= 58:
+        dy = -dy
+    ball[:] = [x, y, dx, dy]
+
+
+def sensor_frame(oled, i):
+    """IoTManager.disp_sensor_value と同じ描画"""
+    t = 6
+    oled.fill_rect(0, 10, oled.width, oled.height - 10, 0)
+    oled.text("Temp: {:.1f}C".format(25 + (i % 10) / 10), 0, t + 10)
+    oled.text("Humi: {:.1f}%".format(50 + (i % 4)), 0, t + 20)
+    oled.text("Ligh: {:.1f}".format(i % 100), 0, t + 30)
+    oled.text("A0  : {:.1f}".format(i % 2), 0, t + 40)
+    oled.text("  v2.0.1.0-2.0", 0, t + 50)
+
+
+def bench(name, frame, full):
+    i2c = FakeI2C()
+    panel = i2c.devices[OLED_ADDR]
+    oled = SSD1306_I2C(128, 64, i2c)
+    oled.show(full=True)    # 初期化と最初の全体の転送は数えない
+    i2c.reset_counts()
+    panel.data_bytes = 0
+    start = clock.now()
+    for i in range(FRAMES):
+        frame(oled, i)
+        oled.show(full=full)
+    elapsed_ms = (clock.now() - start) * 1000
+    transfers, total = i2c.per_address[OLED_ADDR]
+    print("{:<7} {:<8} {:7.1f} data bytes/frame {:7.1f} I2C bytes/frame {:5.1f} transfers/frame {:6.1f} frames/s".format(
+        name, "full" if full else "partial", panel.data_bytes / FRAMES, total / FRAMES,
+        transfers / FRAMES, FRAMES * 1000 / elapsed_ms))
+
+
+clock.virtual = True
+for full in (True, False):
+    bench("ball", ball_frame, full)
+    bench("sensor", sensor_frame, full)
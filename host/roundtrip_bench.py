@@ -0,0 +1,79 @@
+# コマンドの往復のベンチマーク: WebSocket と、接続間隔の遅れを入れた BLE のシミュレーション
+# エミュレーター (host/emulator.py --jumper 19 と同じ配線) を同じプロセスで動かし、GPIO19 への
+# デジタル出力コマンドが GPIO17 のピンのイベントの通知として返るまでを測る。どちらの経路も
+# コマンドキュー、do_command、割り込み、ピンのイベントの通知を通る。
+#   WebSocket: wsclient.py の bench() で TCP 越しに測る
+#   BLE:       偽のセントラルの書き込みとデバイスからの通知を、次の接続イベント（接続間隔ごと）
+#              まで遅らせて届ける。コマンドは接続イベントとずれた時刻にランダムに出す
+# python host/roundtrip_bench.py
+import os
+import sys
+import math
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fakes
+from aioble.core import ble
+from wsclient import WebSocketClient, bench, print_times, is_echo, CMD_DIGITAL_OUT, BENCH_OUTPUT_PIN
+from emulator import Emulator
+
+PORT = 8091
+COUNT = 200
+BLE_INTERVALS_MS = (7.5, 15, 30)
+
+
+class BleCentral:
+    """接続イベントのときだけ書き込みと通知が届く BLE のセントラル"""
+
+    def __init__(self, emulator, interval_ms):
+        self.handle = emulator.ble_conn.command_characteristic._value_handle
+        self.interval = interval_ms / 1000
+        self.loop = asyncio.get_running_loop()
+        self.origin = self.loop.time()
+        self.received = asyncio.Queue()
+        ble.on_notify = self.on_notify
+
+    def next_event(self, t):
+        """t より後の最初の接続イベントの時刻"""
+        return self.origin + (math.floor((t - self.origin) / self.interval) + 1) * self.interval
+
+    def write(self, data):
+        self.loop.call_at(self.next_event(self.loop.time()), ble.write, self.handle, data)
+
+    def on_notify(self, conn_handle, value_handle, data):
+        self.loop.call_at(self.next_event(self.loop.time()), self.received.put_nowait, data)
+
+
+async def ble_bench(emulator, interval_ms, count):
+    central = BleCentral(emulator, interval_ms)
+    loop = central.loop
+    times = []
+    for i in range(count):
+        await asyncio.sleep(random.uniform(0, central.interval))    # 接続イベントとの位相をばらす
+        value = (i + 1) & 1
+        start = loop.time()
+        central.write(bytes((CMD_DIGITAL_OUT, BENCH_OUTPUT_PIN, value)))
+        while not is_echo(await central.received.get(), value):
+            pass
+        times.append((loop.time() - start) * 1000)
+    ble.on_notify = None
+    return times
+
+
+async def main():
+    emulator = Emulator(jumper=BENCH_OUTPUT_PIN)
+    await emulator.start(port=PORT)
+    await emulator.connect_ble()
+    ws = await WebSocketClient.connect("127.0.0.1", PORT)
+    print_times("WebSocket", await bench(ws, COUNT))
+    await ws.close()
+    for interval_ms in BLE_INTERVALS_MS:
+        print_times("BLE %4.1f ms" % interval_ms, await ble_bench(emulator, interval_ms, COUNT))
+    stats = emulator.ble_conn.command_stats()["pipeline"]
+    print("コマンドキュー: 実行 {} 件、待ち ms: 平均={} 最大={}".format(
+        stats["executed"], stats["latency_avg_ms"], stats["latency_max_ms"]))
+
+
+# emulator.py と同じく、aioble のタスクは取り消さずに終わる
+asyncio.new_event_loop().run_until_complete(main())
@@ -0,0 +1,44 @@
+# read_sensors() の 1 回あたりの I2C 転送と時間のベンチマーク（偽の I2C バスで数える）
+#   before:   毎回 AHT20(i2c) と BH1750(i2c) を作る（以前の growlog.read_sensors）
+#   registry: sensors.get_registry(i2c) のドライバを使い回す
+# 時間は仮想の時計で、sleep_ms() と I2C の転送時間 (400 kHz) の合計。
+# python host/sensors_bench.py
+import fakes
+from fakes import FakeI2C, clock
+from ahtx0 import AHT20
+from bh1750 import BH1750
+from sensors import get_registry
+
+CYCLES = 50
+
+
+def read_sensors_before(i2c):
+    temperature, humidity = AHT20(i2c).read()
+    illuminance = BH1750(i2c).measurement
+    return temperature, humidity, illuminance
+
+
+def read_sensors_registry(i2c):
+    sensors = get_registry(i2c)
+    temperature, humidity = sensors.read_temp_humi()
+    illuminance = sensors.read_illuminance()
+    return temperature, humidity, illuminance
+
+
+def bench(name, read_sensors):
+    i2c = FakeI2C()
+    read_sensors(i2c)   # 最初の 1 回（レジストリの作成）は数えない
+    i2c.reset_counts()
+    start = clock.now()
+    for _ in range(CYCLES):
+        read_sensors(i2c)
+    elapsed_ms = (clock.now() - start) * 1000
+    counts = ", ".join("0x%02X: %.1f" % (addr, n[0] / CYCLES) for addr, n in sorted(i2c.per_address.items()))
+    print("{:<9} {:6.1f} transfers/cycle ({}) {:6.1f} bytes/cycle {:7.1f} ms/cycle".format(
+        name, i2c.transfers / CYCLES, counts, i2c.bytes / CYCLES, elapsed_ms / CYCLES))
+
+
+fakes.clock.virtual = True
+bench("before", read_sensors_before)
+bench("registry", read_sensors_registry)
+print("（registry の残りは AHT20 の変換時間 80 ms。read_temp_humi_async() と SensorSampler はこの間ループを止めない）")
@@ -0,0 +1,54 @@
+# HTTP サーバーのベンチマーク（BLE のコマンドが流れている間の req/s と応答時間）
+# エミュレーター (host/emulator.py) を別のプロセスで動かし、apiload.py で負荷をかける。
+#   idle: BLE のコマンドなし
+#   ble:  偽のセントラルが接続間隔 7.5 ms でコマンドを書き込む
+# BLE のコマンドがキューで待った時間（受信から実行まで）も表示する。HTTP が BLE を止めていなければ小さい。
+# python host/server_bench.py
+import os
+import sys
+import json
+import asyncio
+import argparse
+import subprocess
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HOST))
+import apiload
+
+PORT = 8090
+BLE_INTERVAL_MS = 7.5
+LOAD = argparse.Namespace(host="127.0.0.1", port=PORT, concurrency=4, requests=10000,
+                          path=["/api/sensors", "/api/state"],
+                          post=['/api/pixel={"n":1,"r":0,"g":50,"b":0}'])
+
+
+def bench(name, ble_interval_ms=None):
+    command = [sys.executable, os.path.join(HOST, "emulator.py"), "--port", str(PORT)]
+    if ble_interval_ms:
+        command += ["--ble-interval-ms", str(ble_interval_ms)]
+    emulator = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        for line in emulator.stdout:
+            if line.startswith("エミュレーターを起動"):
+                break
+        print("---", name)
+        rate, latencies, statuses = asyncio.run(apiload.run(LOAD))
+    finally:
+        emulator.terminate()
+    stats = None
+    for line in emulator.stdout:
+        if line.startswith("BLE:"):
+            stats = json.loads(line[4:])
+    emulator.wait()
+    if ble_interval_ms and stats:
+        pipeline = stats["pipeline"]
+        print("BLE: 受信 {} 件、実行 {} 件、取りこぼし {} 件、キューの待ち ms: 平均={} 最大={}".format(
+            stats["received"], pipeline["executed"], stats["capture"]["dropped"],
+            pipeline["latency_avg_ms"], pipeline["latency_max_ms"]))
+    return rate, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+results = [bench("idle"), bench("ble %.1f ms" % BLE_INTERVAL_MS, BLE_INTERVAL_MS)]
+print("\n{:<8} {:>10} {:>10}".format("", "req/s", "99% ms"))
+for name, (rate, p99) in zip(("idle", "ble"), results):
+    print("{:<8} {:10.0f} {:10.1f}".format(name, rate, p99))
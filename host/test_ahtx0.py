@@ -0,0 +1,87 @@
+# AHT20 ドライバのテスト（偽の I2C バスで転送を数える）
+# python host/test_ahtx0.py または python -m pytest host
+import sys
+import asyncio
+import fakes
+from fakes import FakeI2C, AHT20Sensor
+from ahtx0 import AHT20
+
+fakes.clock.virtual = True
+
+
+def make_sensor(temperature=21.5, humidity=40.0):
+    sensor = AHT20Sensor(temperature, humidity)
+    i2c = FakeI2C(devices={0x38: sensor})
+    aht = AHT20(i2c)
+    i2c.reset_counts()
+    return aht, sensor, i2c
+
+
+def test_read_is_one_transaction():
+    aht, sensor, i2c = make_sensor()
+    temperature, humidity = aht.read()
+    assert abs(temperature - 21.5) < 0.01 and abs(humidity - 40.0) < 0.01
+    # 変換の開始 (0xAC) を 1 回書き、状態とデータを 1 回で読む
+    assert sensor.triggers == 1
+    assert i2c.transfers == 2
+    assert i2c.bytes == 3 + 6
+
+
+def test_properties_use_last_conversion():
+    aht, sensor, i2c = make_sensor()
+    aht.read()
+    i2c.reset_counts()
+    assert abs(aht.temperature - 21.5) < 0.01
+    assert abs(aht.relative_humidity - 40.0) < 0.01
+    assert i2c.transfers == 0
+
+
+def test_property_measures_once_when_empty():
+    aht, sensor, i2c = make_sensor()
+    aht.relative_humidity
+    aht.temperature
+    assert sensor.triggers == 1
+
+
+def test_read_polls_while_busy():
+    aht, sensor, i2c = make_sensor()
+    sensor.conversion_ms = 90   # データシートの 80 ms より遅いセンサー
+    aht.read()
+    assert sensor.triggers == 1
+    assert i2c.transfers == 2 + 2   # 5 ms ごとにもう 2 回読む
+
+
+def test_read_async_shares_conversion():
+    aht, sensor, i2c = make_sensor()
+
+    async def main():
+        return await asyncio.gather(aht.read_async(), aht.read_async())
+
+    first, second = fakes.run(main())
+    assert first == second
+    assert sensor.triggers == 1
+    assert i2c.transfers == 2
+
+
+def test_read_async_shares_error():
+    aht, sensor, i2c = make_sensor()
+
+    async def fail_during_conversion():
+        await asyncio.sleep_ms(10)
+        sensor.error = OSError(5)   # 変換中にバスのエラー
+
+    async def main():
+        results = await asyncio.gather(aht.read_async(), aht.read_async(), fail_during_conversion(),
+                                       return_exceptions=True)
+        sensor.error = None
+        return results[:2], await aht.read_async()
+
+    (first, second), retry = fakes.run(main())
+    # 待っていたほうも古い値や None ではなく同じエラーを受け取る
+    assert isinstance(first, OSError) and second is first
+    assert abs(retry[0] - 21.5) < 0.01
+    assert sensor.triggers == 2
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
@@ -0,0 +1,251 @@
+# BLEConnection のテスト（偽の bluetooth をセントラルとして書き込む）
+# python host/test_ble_conn.py または python -m pytest host
+import sys
+import asyncio
+import fakes
+import aioble
+from aioble.core import ble
+from ble_conn import BLEConnection, CommandQueue, NOTIFY_RETRY_MS, NOTIFY_MAX_RETRIES
+from iotdevice import Device
+
+
+def new_connection():
+    """BLEConnection を作る。前のテストの aioble の状態は捨てる（ループの中で呼ぶ）"""
+    aioble.stop()
+    return BLEConnection()
+
+
+async def start_commands():
+    """command_task を動かし、(接続, 実行したコマンドのリスト) を返す"""
+    conn = new_connection()
+    device = Device(conn)
+    executed = []
+
+    async def callback(data):
+        executed.append(bytes(data))
+        await device.do_command(data)
+
+    asyncio.create_task(conn.command_task(callback, key=device.command_key))
+    await asyncio.sleep_ms(10)
+    return conn, executed
+
+
+def write_command(conn, data):
+    ble.write(conn.command_characteristic._value_handle, data)
+
+
+def test_empty_write_keeps_command_task():
+    async def main():
+        conn, executed = await start_commands()
+        write_command(conn, b"")
+        await asyncio.sleep_ms(10)
+        write_command(conn, bytes((33, 19, 1)))
+        await asyncio.sleep_ms(10)
+        # 空の書き込みのあとのコマンドも受け取って実行する
+        assert conn.recvnum == 2
+        assert executed == [b"", bytes((33, 19, 1))]
+        assert conn.commands.executed == 2
+    fakes.run(main())
+
+
+def test_stats_include_empty_pipeline():
+    async def main():
+        conn, executed = await start_commands()
+        write_command(conn, bytes((33, 19, 1)))
+        await asyncio.sleep_ms(10)
+        # キューが空になっても（len が 0 でも）統計に出す
+        assert conn.command_stats()["pipeline"]["executed"] == 1
+    fakes.run(main())
+
+
+async def connect(conn, central_mtu=247):
+    """peripheral_task を動かし、偽のセントラルから接続する"""
+    ble.central_mtu = central_mtu
+    ble.notify_credits = None
+    ble.notified = []
+    asyncio.create_task(conn.peripheral_task())
+    await asyncio.sleep_ms(10)
+    ble.connect()
+    await asyncio.sleep_ms(ble.mtu_delay_ms + 10)  # MTU の交換が終わるまで
+
+
+def test_hello_before_mtu_exchange():
+    async def main():
+        conn = new_connection()
+        await connect(conn, central_mtu=None)   # MTU 交換に答えないセントラル
+        assert conn.connection and conn.mtu == 23
+        assert ble.gatts_read(conn.command_characteristic._value_handle) == bytes((2, 0, 0))
+    fakes.run(main())
+
+
+def container_records(notified, conn):
+    """actionevent に届いたコンテナのレコードを順に返す"""
+    records = []
+    for value_handle, data in notified:
+        if value_handle == conn.actionevent_characteristic._value_handle and data[0] == 0x15:
+            offset = 3
+            for _ in range(data[2]):
+                records.append(data[offset + 1:offset + 1 + data[offset]])
+                offset += 1 + data[offset]
+    return records
+
+
+async def start_containers(conn):
+    await connect(conn)
+    asyncio.create_task(conn.notify_task())
+    assert conn.mtu == 247 and conn.set_notify_format(1)
+
+
+def event(i):
+    return bytes((i,)) + bytes(18) + b"\x11"
+
+
+def test_notify_keeps_records_when_buffer_full():
+    async def main():
+        conn = new_connection()
+        await start_containers(conn)
+        ble.notify_credits = 0      # 送信バッファが一杯
+        for i in range(5):
+            conn.send_notification(event(i))
+        await asyncio.sleep_ms(50)
+        assert conn.packer.retries > 0 and len(conn.packer) == 5
+        ble.refill(10)
+        await asyncio.sleep_ms(50)
+        # 一杯の間に失ったイベントはなく、順番どおりに届く
+        assert container_records(ble.notified, conn) == [event(i) for i in range(5)]
+        assert len(conn.packer) == 0 and conn.packer.dropped == 0
+    fakes.run(main())
+
+
+def test_notify_yields_between_packets():
+    async def main():
+        conn = new_connection()
+        await start_containers(conn)
+        log = []
+        started = asyncio.Event()
+
+        def on_notify(conn_handle, value_handle, data):
+            log.append("notify")
+            started.set()
+        ble.on_notify = on_notify
+
+        async def other_task():
+            # 最初の通知からずっと実行できるタスク。回数を区切らないと仮想の時計が進まない
+            await started.wait()
+            for _ in range(100):
+                log.append("other")
+                await asyncio.sleep(0)
+        asyncio.create_task(other_task())
+        for i in range(30):         # 1 つのコンテナには 11 個までなので 3 回に分けて送る
+            conn.send_notification(event(i))
+        await asyncio.sleep_ms(20)
+        ble.on_notify = None
+        assert container_records(ble.notified, conn) == [event(i) for i in range(30)]
+        sends = [i for i, name in enumerate(log) if name == "notify"]
+        assert len(sends) == 3
+        # 続けて送る間にもほかのタスクが動く
+        assert all("other" in log[a:b] for a, b in zip(sends, sends[1:]))
+    fakes.run(main())
+
+
+def test_notify_gives_up_after_retries():
+    async def main():
+        conn = new_connection()
+        await start_containers(conn)
+        ble.notify_credits = 0      # ずっと一杯のまま
+        for i in range(3):
+            conn.send_notification(event(i))
+        await asyncio.sleep_ms(NOTIFY_RETRY_MS * (NOTIFY_MAX_RETRIES + 5))
+        assert conn.packer.retries == NOTIFY_MAX_RETRIES
+        assert len(conn.packer) == 0 and conn.packer.dropped == 3
+        # 次のイベントはまた送れる
+        ble.refill(10)
+        conn.send_notification(event(9))
+        await asyncio.sleep_ms(20)
+        assert container_records(ble.notified, conn) == [event(9)]
+    fakes.run(main())
+
+
+def test_notify_drops_packet_on_other_errors():
+    async def main():
+        conn = new_connection()
+        await start_containers(conn)
+        notify = conn.actionevent_characteristic.notify
+        calls = []
+
+        def broken_notify(connection, data):
+            calls.append(data)
+            raise TypeError("broken")
+        conn.actionevent_characteristic.notify = broken_notify
+        conn.send_notification(event(1))
+        await asyncio.sleep_ms(50)
+        # 送り直さずに捨てる（止まらないループにしない）
+        assert len(calls) == 1 and conn.packer.retries == 0 and conn.packer.dropped == 1
+        conn.actionevent_characteristic.notify = notify
+    fakes.run(main())
+
+
+def test_notify_format_stays_legacy_without_ack():
+    async def main():
+        conn = new_connection()
+        await connect(conn)
+        ble.notify_credits = 0      # 切り替えの知らせを送れない
+        assert conn.set_notify_format(1) is False
+        assert conn.container is False
+        ble.refill(1)
+        assert conn.set_notify_format(1) is True
+        assert ble.notified[-1][1] == bytes((0x15, 1, 0))
+    fakes.run(main())
+
+
+def test_command_key_of_empty_data():
+    async def main():
+        conn = new_connection()
+        assert Device(conn).command_key(b"") is None
+    fakes.run(main())
+
+
+def queue_key(data):
+    """テスト用の置き換えキー。100 以上のコマンドIDだけ置き換える"""
+    return data[0] if data[0] >= 100 else None
+
+
+def test_coalesced_command_keeps_position():
+    async def main():
+        queue = CommandQueue(key=queue_key)
+        for data in (b"\x64\x01", b"\x01", b"\x64\x02", b"\x02"):
+            await queue.put(data)
+        # 置き換えた 100 は前と同じ位置のまま、1 より先に実行する
+        assert [await queue.get() for _ in range(3)] == [b"\x64\x02", b"\x01", b"\x02"]
+        assert queue.stats()["coalesced"] == 1 and queue.stats()["enqueued"] == 4
+    fakes.run(main())
+
+
+def test_coalesce_after_waiting_for_space():
+    async def main():
+        queue = CommandQueue(limit=2, key=queue_key)
+        await queue.put(b"\x64\x01")
+        await queue.put(b"\x01")
+        put = asyncio.create_task(queue.put(b"\x64\x02"))
+        await asyncio.sleep_ms(10)
+        assert not put.done()       # 一杯の間は置き換えずに待つ
+        assert await queue.get() == b"\x64\x01"
+        await put
+        # 前の 100 は待っている間に実行したので、新しいものは最後に積む
+        assert [await queue.get() for _ in range(2)] == [b"\x01", b"\x64\x02"]
+        assert queue.coalesced == 0
+    fakes.run(main())
+
+
+def test_digital_out_is_not_coalesced():
+    async def main():
+        device = Device(new_connection())
+        # パルス（1 のあとの 0）をまとめないように、デジタル出力は置き換えない
+        assert device.command_key(bytes((33, 19, 1))) is None
+        assert device.command_key(bytes((34, 19, 0, 2))) == device.command_key(bytes((34, 19, 0, 4)))
+        assert device.command_key(bytes((34, 19, 0, 2))) != device.command_key(bytes((34, 18, 0, 2)))
+    fakes.run(main())
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
@@ -0,0 +1,65 @@
+# Hardware.oled_bitmap() のテスト（OLED に描いた模様を BMP から読み戻して比べる）
+# python host/test_bmp.py または python -m pytest host
+import sys
+import struct
+import fakes
+from hardware import Hardware
+
+hardware = Hardware()
+
+
+def expected(x, y):
+    """テストで描く模様: 枠、左上の市松模様、右下の 1 点"""
+    if x in (0, 127) or y in (0, 63):
+        return 1
+    if 8 <= x < 24 and 8 <= y < 24:
+        return (x + y) & 1
+    return 1 if (x, y) == (100, 50) else 0
+
+
+def draw_pattern(oled):
+    oled.fill(0)
+    oled.rect(0, 0, 128, 64, 1)
+    for y in range(8, 24):
+        for x in range(8, 24):
+            oled.pixel(x, y, (x + y) & 1)
+    oled.pixel(100, 50, 1)
+
+
+def decode(bmp):
+    """1 ビット BMP を (幅, 高さ, pixel(x, y)) にする"""
+    signature, size, _, _, offset = struct.unpack_from('<2sIHHI', bmp, 0)
+    assert signature == b'BM' and size == len(bmp)
+    header, width, height, planes, bits, compression = struct.unpack_from('<IiiHHI', bmp, 14)
+    assert (header, planes, bits, compression) == (40, 1, 1, 0)
+    palette = [bmp[54 + i * 4:57 + i * 4] for i in range(2)]
+    row_size = (width + 31) // 32 * 4
+    assert len(bmp) == offset + row_size * abs(height)
+
+    def pixel(x, y):
+        row = y if height < 0 else abs(height) - 1 - y  # 高さが負なら上の行から並ぶ
+        byte = bmp[offset + row * row_size + (x >> 3)]
+        index = byte >> (7 - (x & 7)) & 1
+        return 1 if palette[index] == b'\xff\xff\xff' else 0
+    return width, abs(height), pixel
+
+
+def test_bitmap_matches_oled():
+    draw_pattern(hardware.oled)
+    width, height, pixel = decode(bytes(hardware.oled_bitmap()))
+    assert (width, height) == (128, 64)
+    wrong = [(x, y) for y in range(height) for x in range(width) if pixel(x, y) != expected(x, y)]
+    assert wrong == []
+
+
+def test_bitmap_follows_changes():
+    draw_pattern(hardware.oled)
+    hardware.oled_bitmap()
+    hardware.oled.pixel(100, 50, 0)     # 同じバッファを使い回しても新しい内容になる
+    hardware.oled.pixel(3, 60, 1)
+    _, _, pixel = decode(bytes(hardware.oled_bitmap()))
+    assert pixel(100, 50) == 0 and pixel(3, 60) == 1 and pixel(9, 8) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
@@ -0,0 +1,48 @@
+# HTTP リクエストの読み取りのテスト
+# python host/test_httpreq.py または python -m pytest host
+import sys
+import asyncio
+import fakes
+from httpreq import read_request, url_decode, parse_query_string, HttpError
+
+
+def request(raw):
+    """raw を受け取ったとして read_request() を実行する。HttpError は返り値にする"""
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        try:
+            return await read_request(reader)
+        except HttpError as e:
+            return e
+    return fakes.run(main())
+
+
+def test_content_length():
+    req = request(b"POST /api/tone HTTP/1.1\r\nContent-Length: 12\r\n\r\n")
+    assert req.content_length == 12 and req.remaining == 12
+
+
+def test_bad_content_length_is_400():
+    for value in (b"abc", b"-1", b"", b"1.5"):
+        e = request(b"POST / HTTP/1.1\r\nContent-Length: " + value + b"\r\n\r\n")
+        assert isinstance(e, HttpError) and e.status == "400 Bad Request", value
+
+
+def test_url_decode():
+    assert url_decode("a+b%20c") == "a b c"
+    assert url_decode("%E3%81%82") == "あ"
+    assert url_decode("100%") == "100%"
+
+
+def test_url_decode_invalid_utf8():
+    # UTF-8 にならない %xx は残す（例外にしない）
+    assert url_decode("%FF%FE") == "%FF%FE"
+    assert parse_query_string("name=%C3&x=1") == {"name": "%C3", "x": "1"}
+    req = request(b"GET /files/%FF?x=%80 HTTP/1.1\r\n\r\n")
+    assert req.path == "/files/%FF" and req.query == {"x": "%80"}
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
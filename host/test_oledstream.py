@@ -0,0 +1,101 @@
+# OledStream のテスト（偽の I2C の SSD1306 に描いて、フレームごとのバイト数を見る）
+# python host/test_oledstream.py または python -m pytest host
+import sys
+import binascii
+import fakes
+from fakes import FakeI2C, clock
+from ssd1306 import SSD1306_I2C
+from oledstream import OledStream, KEEPALIVE_MS
+
+clock.virtual = True
+
+
+def make_stream():
+    oled = SSD1306_I2C(128, 64, FakeI2C())
+    oled.fill(0)
+    oled.show(True)
+    return oled, OledStream(oled)
+
+
+def apply(event, screen):
+    """ブラウザと同じようにイベントを画面 (MONO_VLSB) に書き込み、送ったデータのバイト数を返す"""
+    assert event.endswith(b"\n\n")
+    total = 0
+    for line in event.split(b"\n"):
+        if not line:
+            continue
+        assert line.startswith(b"data: ")
+        page, x0, data = line[6:].split(b" ")
+        data = binascii.a2b_base64(data)
+        start = int(page) * 128 + int(x0)
+        screen[start:start + len(data)] = data
+        total += len(data)
+    return total
+
+
+def test_first_frame_sends_every_page():
+    oled, stream = make_stream()
+    screen = bytearray(len(oled.buffer))
+    event = stream.frame()
+    assert event.count(b"data: ") == 8
+    assert apply(event, screen) == 1024
+    assert len(event) == 8 * (len(b"data: 0 0 ") + 172 + 1) + 1     # base64 で 128 バイトは 172 文字
+    assert screen == oled.buffer
+
+
+def test_unchanged_screen_sends_nothing():
+    oled, stream = make_stream()
+    stream.frame()
+    assert stream.frame() is None
+    oled.show()         # 変化がなければ何も書かない
+    assert stream.frame() is None
+
+
+def test_small_change_sends_only_that_page():
+    oled, stream = make_stream()
+    screen = bytearray(len(oled.buffer))
+    apply(stream.frame(), screen)
+    oled.pixel(10, 20, 1)
+    assert stream.frame() is None   # show() するまでは送らない
+    oled.show()
+    event = stream.frame()
+    assert event.startswith(b"data: 2 10 ")
+    assert apply(event, screen) == 1
+    assert len(event) == len(b"data: 2 10 AQ==\n\n")
+    assert screen == oled.buffer
+
+
+def test_change_sends_column_range():
+    oled, stream = make_stream()
+    screen = bytearray(len(oled.buffer))
+    apply(stream.frame(), screen)
+    oled.text("Hi", 40, 0)
+    oled.pixel(5, 63, 1)
+    oled.show()
+    event = stream.frame()
+    assert event.count(b"data: ") == 2
+    # ページ 0 は文字の列だけ、ページ 7 は 1 列だけ
+    assert apply(event, screen) <= 16 + 1
+    assert screen == oled.buffer
+
+
+def test_keepalive_after_idle():
+    oled, stream = make_stream()
+    stream.frame()
+    assert stream.next_event() is None
+    clock.advance(KEEPALIVE_MS / 1000)
+    assert stream.next_event() == b": ping\n\n"
+    assert stream.next_event() is None
+
+
+def test_interval_follows_send_time():
+    oled, stream = make_stream()
+    stream.sent(1000, 100)
+    assert stream.interval_ms == 400
+    stream.sent(30, 0)
+    assert stream.interval_ms == 300
+    assert (stream.frames, stream.bytes) == (2, 1030)
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
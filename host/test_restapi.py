@@ -0,0 +1,72 @@
+# RestApi のテスト（出力は記録するだけの Hardware の代わりに書く）
+# python host/test_restapi.py または python -m pytest host
+import sys
+import json
+import asyncio
+import fakes
+from httpreq import read_request, HttpError
+from restapi import RestApi
+
+
+class ToneHardware:
+    def __init__(self):
+        self.calls = []
+
+    def play_tone(self, freq):
+        self.calls.append(("play", freq))
+
+    def stop_tone(self):
+        self.calls.append(("stop",))
+
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+async def post(route, params):
+    """params を JSON で POST したとして route を呼ぶ。ステータスを返す"""
+    body = json.dumps(params).encode()
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+    writer = Writer()
+    try:
+        await route(writer, await read_request(reader))
+    except HttpError as e:
+        return e.status
+    return writer.data.split(b"\r\n")[0].decode()[9:]
+
+
+def test_tone_stops_after_ms():
+    async def main():
+        hardware = ToneHardware()
+        api = RestApi(hardware)
+        assert await post(api.route_tone, {"freq": 440, "ms": 50}) == "200 OK"
+        assert api.tone == 440
+        await asyncio.sleep_ms(60)
+        assert hardware.calls == [("play", 440), ("stop",)]
+        assert api.tone == 0
+    fakes.run(main())
+
+
+def test_bad_tone_keeps_current_tone():
+    async def main():
+        hardware = ToneHardware()
+        api = RestApi(hardware)
+        await post(api.route_tone, {"freq": 440, "ms": 500})
+        for params in ({"freq": 880, "ms": 0}, {"freq": 880, "ms": "x"}, {"freq": 30000}):
+            assert await post(api.route_tone, params) == "400 Bad Request"
+        # 不正なリクエストでは出力も停止タイマーも変えない
+        assert hardware.calls == [("play", 440)]
+        assert api.tone == 440
+        await asyncio.sleep_ms(510)
+        assert hardware.calls == [("play", 440), ("stop",)]
+        assert api.tone == 0
+    fakes.run(main())
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
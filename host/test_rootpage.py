@@ -0,0 +1,72 @@
+# RootPage のテスト（一時ファイルの root.html に値を差し込んで送る）
+# python host/test_rootpage.py または python -m pytest host
+import os
+import sys
+import tempfile
+import fakes
+from rootpage import RootPage
+
+TEMPLATE = b"<html>\n<select>@@ssid_options@@</select>\n<p>@@password@@</p>\n</html>\n"
+
+
+class Writer:
+    """send() が書き込んだバイト列をためる"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def make_page(template=TEMPLATE):
+    fd, path = tempfile.mkstemp(suffix=".html")
+    os.write(fd, template)
+    os.close(fd)
+    return RootPage(path)
+
+
+def replace_template(page, template):
+    with open(page.template, "wb") as f:
+        f.write(template)
+    page.reload()
+
+
+def test_send_fills_values():
+    page = make_page()
+    page.set(ssid_options=b"<option>a</option>", password=b"pw")
+    writer = Writer()
+    fakes.run(page.send(writer))
+    head, body = bytes(writer.data).split(b"\r\n\r\n", 1)
+    assert body == TEMPLATE.replace(b"@@ssid_options@@", b"<option>a</option>").replace(b"@@password@@", b"pw")
+    assert b"Content-Length: %d" % len(body) in head and page.length == len(body)
+    os.remove(page.template)
+
+
+def test_etag_follows_values():
+    page = make_page()
+    page.set(ssid_options=b"a", password=b"pw")
+    etag = page.etag
+    page.set(ssid_options=b"a", password=b"pw")
+    assert page.etag == etag
+    page.set(ssid_options=b"b", password=b"pw")
+    assert page.etag != etag
+    os.remove(page.template)
+
+
+def test_etag_changes_with_same_length_template():
+    page = make_page()
+    page.set(ssid_options=b"a", password=b"pw")
+    etag, length = page.etag, page.length
+    # 長さの同じ root.html に置き換えても、キャッシュした古いページを使わせない
+    replace_template(page, TEMPLATE.replace(b"<p>", b"<b>"))
+    page.set(ssid_options=b"a", password=b"pw")
+    assert page.length == length and page.etag != etag
+    os.remove(page.template)
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
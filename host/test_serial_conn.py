@@ -0,0 +1,138 @@
+# SerialConnection のテスト（pty の片側をデバイスの USB シリアル、もう片側をホストにする）
+# python host/test_serial_conn.py または python -m pytest host
+import os
+import sys
+import tty
+import asyncio
+import fakes
+from fakes import clock
+import micropython
+import serial_conn
+from serial_conn import SerialConnection
+from framing import FrameDecoder, encode_frame
+
+HELLO = bytes((2, 0, 1))
+COMMAND = bytes((33, 19, 1))
+
+
+class Host:
+    """pty のホスト側。フレームを送り、届いたフレームを順に返す"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.reader = asyncio.StreamReader(open(fd, "rb", buffering=0, closefd=False))
+        self.decoder = FrameDecoder()
+        self.frames = []
+
+    def send(self, data):
+        os.write(self.fd, encode_frame(data))
+
+    def send_raw(self, data):
+        os.write(self.fd, data)
+
+    async def receive(self, timeout_ms=1000):
+        while not self.frames:
+            chunk = await asyncio.wait_for_ms(self.reader.read(64), timeout_ms)
+            self.frames.extend(self.decoder.feed(chunk))
+        return self.frames.pop(0)
+
+
+def run_serial(test, timeout_ms=serial_conn.SESSION_TIMEOUT_MS):
+    """pty で SerialConnection を動かし、test(conn, host, executed, kbd_intr) を実行する"""
+    kbd_intr = []
+    executed = []
+
+    async def on_command(data):
+        executed.append(bytes(data))
+
+    async def main():
+        conn = SerialConnection(on_command, open(slave, "rb", buffering=0, closefd=False),
+                                open(slave, "wb", buffering=0, closefd=False))
+        task = asyncio.create_task(conn.serial_task())
+        try:
+            await test(conn, Host(master), executed, kbd_intr)
+        finally:
+            task.cancel()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)       # 改行の変換やエコーをしない
+    saved = micropython.kbd_intr, serial_conn.SESSION_TIMEOUT_MS, clock.virtual
+    micropython.kbd_intr = kbd_intr.append
+    serial_conn.SESSION_TIMEOUT_MS = timeout_ms
+    clock.virtual = False   # pty は実時間で動くので、ticks_ms() も実時間にする
+    try:
+        asyncio.run(main())
+    finally:
+        micropython.kbd_intr, serial_conn.SESSION_TIMEOUT_MS, clock.virtual = saved
+        os.close(master)
+        os.close(slave)
+
+
+async def handshake(host):
+    host.send(b"")
+    assert await host.receive() == HELLO
+
+
+async def wait_executed(executed, n):
+    while len(executed) < n:
+        await asyncio.sleep_ms(1)
+
+
+def test_handshake_sends_hello():
+    async def test(conn, host, executed, kbd_intr):
+        host.send(COMMAND)      # セッションの前のコマンドは実行しない
+        await handshake(host)
+        assert conn.connection and kbd_intr == [-1]
+        assert executed == []
+    run_serial(test)
+
+
+def test_command_is_executed():
+    async def test(conn, host, executed, kbd_intr):
+        await handshake(host)
+        host.send(COMMAND)
+        host.send(bytes((3, 0)))    # Ctrl-C が入ったコマンドも止めずに渡す
+        await asyncio.wait_for_ms(wait_executed(executed, 2), 1000)
+        assert executed == [COMMAND, bytes((3, 0))]
+        assert conn.received == 2
+    run_serial(test)
+
+
+def test_keepalive_is_echoed():
+    async def test(conn, host, executed, kbd_intr):
+        await handshake(host)
+        for _ in range(3):
+            host.send(b"")
+            assert await host.receive() == b""
+        assert conn.received == 0 and executed == []
+    run_serial(test)
+
+
+def test_corrupt_frame_is_counted():
+    async def test(conn, host, executed, kbd_intr):
+        await handshake(host)
+        frame = bytearray(encode_frame(COMMAND))
+        frame[2] ^= 0x01        # COBS の符号の次のバイト（コマンドの番号）を壊す
+        host.send_raw(frame)
+        host.send(b"")          # 空のフレームの返事で、壊れたフレームを読み終えたことがわかる
+        assert await host.receive() == b""
+        assert conn.decoder.errors == 1
+        assert executed == [] and conn.connection
+    run_serial(test)
+
+
+def test_session_timeout_restores_kbd_intr():
+    async def test(conn, host, executed, kbd_intr):
+        await handshake(host)
+        await asyncio.sleep_ms(100)
+        assert conn.connection
+        await asyncio.sleep_ms(400)     # 150 ms の読み込みの待ち時間を 2 回過ぎる
+        assert not conn.connection and kbd_intr == [-1, 3]
+        # 次の空のフレームで新しいセッションになる
+        await handshake(host)
+        assert kbd_intr == [-1, 3, -1]
+    run_serial(test, timeout_ms=150)
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
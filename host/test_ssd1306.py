@@ -0,0 +1,77 @@
+# SSD1306 の show() のテスト（偽の I2C の SSD1306Panel が受け取ったバイト数を見る）
+# python host/test_ssd1306.py または python -m pytest host
+import sys
+import fakes
+from fakes import FakeI2C
+from ssd1306 import SSD1306_I2C
+
+OLED_ADDR = 0x3C
+WINDOW_COMMANDS = 6     # 列とページの範囲を決める write_cmd() の回数
+
+
+def make_oled():
+    """全体を 1 回送ったあとの (OLED, バス, パネル) を返す"""
+    i2c = FakeI2C()
+    oled = SSD1306_I2C(128, 64, i2c)
+    i2c.reset_counts()
+    panel = i2c.devices[OLED_ADDR]
+    panel.data_bytes = 0
+    return oled, i2c, panel
+
+
+def test_init_sends_whole_screen():
+    i2c = FakeI2C()
+    oled = SSD1306_I2C(128, 64, i2c)
+    panel = i2c.devices[OLED_ADDR]
+    # 表示側の RAM の内容がわからないので、init_display() の show() で全体を送る
+    assert panel.data_bytes == 1024 and oled.bytes_sent == 1024
+    oled.pixel(0, 0, 1)
+    oled.show()
+    assert panel.data_bytes == 1024 + 1
+
+
+def test_unchanged_screen_sends_nothing():
+    oled, i2c, panel = make_oled()
+    oled.show()
+    oled.fill_rect(0, 0, 10, 10, 0)     # 描いても内容が同じなら送らない
+    oled.show()
+    assert panel.data_bytes == 0 and i2c.transfers == 0
+
+
+def test_pixel_sends_one_byte():
+    oled, i2c, panel = make_oled()
+    oled.pixel(10, 20, 1)
+    oled.show()
+    assert panel.data_bytes == 1
+    assert i2c.per_address[OLED_ADDR] == [WINDOW_COMMANDS + 1, WINDOW_COMMANDS * 2 + 2]
+
+
+def test_text_sends_changed_columns():
+    oled, i2c, panel = make_oled()
+    oled.text("Hi", 40, 0)
+    oled.show()
+    # ページ 0 の文字の列（16 列まで）だけ
+    assert 0 < panel.data_bytes <= 16
+    assert i2c.transfers == WINDOW_COMMANDS + 1
+
+
+def test_adjacent_pages_share_window():
+    oled, i2c, panel = make_oled()
+    oled.fill_rect(10, 6, 4, 4, 1)      # ページ 0 と 1 にまたがる
+    oled.pixel(100, 63, 1)              # 離れたページ 7
+    oled.show()
+    # ページ 0〜1 の 4 列を 1 回、ページ 7 の 1 列を 1 回で送る
+    assert panel.data_bytes == 4 * 2 + 1
+    assert i2c.transfers == (WINDOW_COMMANDS + 1) * 2
+
+
+def test_large_change_sends_whole_screen():
+    oled, i2c, panel = make_oled()
+    oled.fill_rect(0, 0, 128, 56, 1)    # FULL_FLUSH_PERCENT を超える
+    oled.show()
+    assert panel.data_bytes == 1024
+    assert i2c.transfers == WINDOW_COMMANDS + 1
+
+
+if __name__ == "__main__":
+    sys.exit(fakes.run_tests(globals()))
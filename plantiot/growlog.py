@@ -10,10 +10,10 @@ import time
 import urequests
 from machine import ADC, I2C, PWM, Pin, RTC
 
-from ahtx0 import AHT20
-from bh1750 import BH1750
 from config import Config
 import ntptime
+from sensors import get_sampler
+from wifiscan import get_scanner
 from ssd1306 import SSD1306_I2C
 
 
@@ -83,7 +83,7 @@ class MenuState:
     """階層的なメニュー状態を管理するクラス。"""
 
     MAIN_MENUS = ["Sensor", "Network", "Manual", "Timer", "Config"]
-    NETWORK_MENUS = ["WiFi", "Send Now", "Auto Send"]
+    NETWORK_MENUS = ["WiFi", "Send Now", "Auto Send", "Scan"]
     SEND_INTERVALS = [0, 30, 60]  # 0=無効, 30=30分, 60=60分
     MANUAL_MENUS = ["Pump ON/OFF", "LED ON/OFF"]
     TIMER_MENUS = ["LED Start", "LED Hours", "Pump Start", "Pump Run"]
@@ -416,6 +416,10 @@ def execute_menu_action():
             menu.next_send_interval()
             iv = menu.get_send_interval_min()
             print("Auto Send interval:", "OFF" if iv == 0 else str(iv) + "min")
+        elif menu.sub_idx == 3:  # 周りの Wi-Fi をスキャン（接続中でも切れない）
+            print("Executing: WiFi Scan")
+            for net in get_scanner().scan_now(force=True):
+                print(net[0], net[3])
 
     elif menu.main_idx == 2:  # Manual
         if menu.sub_idx == 0:  # Pump ON/OFF
@@ -561,6 +565,10 @@ def disp_menu(hw, menu):
             elif menu.sub_idx == 2:  # Auto Send
                 iv = menu.get_send_interval_min()
                 status_line = "Auto:" + ("OFF" if iv == 0 else str(iv) + "min")
+            elif menu.sub_idx == 3:  # Scan（件数と一番強い SSID）
+                networks = get_scanner().networks
+                if networks:
+                    status_line = "%d %s %d" % (len(networks), networks[0][0].decode()[:8], networks[0][3])
         elif menu.main_idx == 3:
             if menu.sub_idx == 0:  # LED Start
                 h = menu.LED_START_HOURS[menu.led_start_idx]
@@ -654,7 +662,9 @@ def read_sensors(hw):
     """センサーから値を読み取り、ログ送信用の辞書を返す。
 
     学習メモ:
-    - ADC（土壌水分）、AHT20（温湿度）、BH1750（照度）を順に初期化して読み取ります。
+    - ADC（土壌水分）、AHT20（温湿度）、BH1750（照度）を読み取ります。
+    - I2C センサーは `sensors` モジュールのサンプラーが変換を重ねて読み取ります。
+      ここでは待たずに 1 ステップ進め、最新値（snapshot）を使います。
     - センサーは接続状態や読み取りエラーが起きるため例外処理を行い、安全に動作させます。
     - 戻り値は `temperature`, `humidity`, `soil_moisture`, `illuminance` などを含む辞書です。
     """
@@ -675,21 +685,13 @@ def read_sensors(hw):
     init_oled_if_needed(hw)
 
     if hw.has_i2c():
-        try:
-            aht20 = AHT20(hw.i2c)
-            temperature = round(aht20.temperature, 1)
-            humidity = round(aht20.relative_humidity, 1)
-        except Exception as e:
-            print("AHT20 sensor error:", e)
-
-        for _ in range(2):
-            try:
-                bh1750 = BH1750(hw.i2c)
-                illuminance = round(bh1750.measurement, 1)
-                break
-            except Exception as e:
-                print("BH1750 sensor error:", e)
-            time.sleep(1)
+        sampler = get_sampler(hw.i2c)
+        sampler.poll()
+        snapshot = sampler.snapshot
+        temperature = round(snapshot["temperature"], 1)
+        humidity = round(snapshot["humidity"], 1)
+        illuminance = round(snapshot["illuminance"], 1)
+        pressure = round(snapshot["pressure"], 1)
 
     log_data = {
         "timestamp": time.time(),
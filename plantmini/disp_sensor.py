@@ -37,8 +37,9 @@ def read_sensors():
 
     try:
         aht20 = AHT20(i2c)
-        temperature = round(aht20.temperature, 1)
-        humidity = round(aht20.relative_humidity, 1)
+        temperature, humidity = aht20.read()
+        temperature = round(temperature, 1)
+        humidity = round(humidity, 1)
     except Exception as e:
         print("AHT20 error:", e)
 
@@ -12,8 +12,8 @@ import time
 import urequests
 from machine import ADC, I2C, Pin
 
-from ahtx0 import AHT20
 import ntptime
+from sensors import get_registry
 from ssd1306 import SSD1306_I2C
 
 
@@ -264,13 +264,12 @@ def read_sensors():
             print("CdS センサ 読み取りエラー:", e)
 
     # AHT20 温湿度センサ（I2C）
+    # ドライバは最初の 1 回だけ作り、読み取りエラーのときだけ作り直す
     if i2c is not None:
-        try:
-            aht20 = AHT20(i2c)
-            temperature = round(aht20.temperature, 1)
-            humidity    = round(aht20.relative_humidity, 1)
-        except Exception as e:
-            print("AHT20 センサ 読み取りエラー:", e)
+        values = get_registry(i2c).read_temp_humi()  # 1回の変換で温度と湿度を読む
+        if values:
+            temperature = round(values[0], 1)
+            humidity    = round(values[1], 1)
 
     return {
         "timestamp":   time.time(),   # Unix 時刻（UTC 秒）
@@ -8,7 +8,6 @@ i2c = I2C(0, scl=Pin(23), sda=Pin(22))
 aht20 = AHT20(i2c)
 
 while True:
-    temp = aht20.temperature
-    humi = aht20.relative_humidity
+    temp, humi = aht20.read()
     print("温度: {:.1f} ℃  湿度: {:.1f} %".format(temp, humi))
     time.sleep(2)
@@ -49,8 +49,7 @@ P17.irq(trigger=Pin.IRQ_RISING, handler=change_fan_speed)
 # メインループ（ずっとくりかえす）
 while True:
     if MODES[current_mode] == "自動":
-        temperature = aht20.temperature
-        humidity = aht20.relative_humidity
+        temperature, humidity = aht20.read()
         print(f"温度: {temperature:.1f}C, 湿度: {humidity:.1f}%")
 
         # 温度に応じて風量を自動調整
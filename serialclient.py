@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import struct
+import argparse
+import serial
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "lib"))
+from framing import FrameDecoder, encode_frame
+# PC から USB シリアルでデバイスにつなぎ、BLE と同じバイナリのコマンドを送って通知を表示する
+# 例: python serialclient.py COM5 --text "Hello"      # 文字を表示して、通知を 10 秒表示
+#     python serialclient.py /dev/ttyACM0 --bench 200  # 往復の時間を測る
+# ポートに擬似端末（pty）のパスを渡せば、デバイスなしでも試せる。
+
+CMD_SHOW_TEXT = 65
+CMD_STOP_TONE = 96
+CMD_PLAY_TONE = 97
+CMD_NEOPIXEL = 161
+KEEPALIVE_S = 2     # デバイスの SESSION_TIMEOUT_MS より短くする
+
+
+class SerialClient:
+    def __init__(self, port, baudrate=115200):
+        self.port = serial.Serial(port, baudrate, timeout=0.05)
+        self.decoder = FrameDecoder()
+        self.frames = []
+        self.last_sent = 0
+
+    def send(self, data):
+        self.port.write(encode_frame(data))
+        self.last_sent = time.monotonic()
+
+    def receive(self, timeout):
+        """フレームを 1 つ返す。timeout 秒で届かなければ None"""
+        end = time.monotonic() + timeout
+        while not self.frames:
+            if time.monotonic() > end:
+                return None
+            if time.monotonic() - self.last_sent > KEEPALIVE_S:
+                self.send(b"")
+            self.frames.extend(self.decoder.feed(self.port.read(self.port.in_waiting or 1)))
+        return self.frames.pop(0)
+
+    def open(self, timeout=3):
+        """空のフレームでセッションを始め、hello を待つ
+
+        セッションが続いていれば（前のクライアントから SESSION_TIMEOUT_MS 以内）
+        hello の代わりに空のフレームが返る。
+        """
+        self.port.reset_input_buffer()
+        self.send(b"")
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            frame = self.receive(0.5)
+            if frame is not None and len(frame) in (0, 3):
+                return frame
+            self.send(b"")
+        raise TimeoutError("no hello from the device")
+
+
+def describe(data):
+    """デバイスからのフレームを読める形にする"""
+    if len(data) == 0:
+        return "keepalive (session already open)"
+    if len(data) == 3:
+        return "hello hardware=%d protocol=%d route=%d" % tuple(data)
+    if len(data) == 7:
+        gpio, light, temperature, humidity = struct.unpack("<I3B", data)
+        return f"state gpio={gpio:#010x} light={light} temp={temperature - 128} humi={humidity * 100 // 255}%"
+    if len(data) == 20 and data[19] == 0x11:
+        pin, event, timestamp = struct.unpack_from("<BBI", data)
+        return f"pin {pin} event={event} t={timestamp}"
+    if len(data) == 20 and data[19] == 0x12:
+        action, button, event, timestamp = struct.unpack_from("<BHBI", data)
+        return f"button {button} event={event} t={timestamp}"
+    return data.hex()
+
+
+def bench(client, count):
+    """空のフレームの往復を count 回測る（状態などの通知は読み飛ばす）"""
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.send(b"")
+        while True:
+            frame = client.receive(1)
+            if frame is None:
+                raise TimeoutError("no reply")
+            if frame == b"":
+                break
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    print(f"シリアル往復 {count} 回: 最小={times[0]:.1f} 50%={times[len(times) // 2]:.1f} "
+          f"95%={times[int(len(times) * 0.95)]:.1f} 最大={times[-1]:.1f} ms")
+    print("受信エラー:", client.decoder.errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="デバイスの USB シリアル (route=1) クライアント")
+    parser.add_argument("port", help="シリアルポート（COM5, /dev/ttyACM0 など）")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--text", help="OLED に表示する文字")
+    parser.add_argument("--tone", type=int, help="鳴らす音の周波数 (Hz)")
+    parser.add_argument("--pixel", type=int, nargs=4, metavar=("N", "R", "G", "B"), help="NeoPixel の色 (0〜100)")
+    parser.add_argument("--listen", type=float, default=10, help="通知を表示する秒数")
+    parser.add_argument("--bench", type=int, help="往復の時間を測る回数")
+    args = parser.parse_args()
+
+    client = SerialClient(args.port, args.baudrate)
+    print(describe(client.open()))
+    if args.text is not None:
+        client.send(bytes((CMD_SHOW_TEXT, 0)) + args.text.encode())
+    if args.tone:
+        client.send(struct.pack("<BIB", CMD_PLAY_TONE, 1000000 // args.tone, 255))
+    if args.pixel:
+        client.send(bytes([CMD_NEOPIXEL] + args.pixel))
+    if args.bench:
+        bench(client, args.bench)
+    else:
+        end = time.monotonic() + args.listen
+        while time.monotonic() < end:
+            frame = client.receive(end - time.monotonic())
+            if frame:
+                print(describe(frame))
+    if args.tone:
+        client.send(bytes((CMD_STOP_TONE,)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,15 +8,185 @@ import network
 from micropython import const
 from hardware import Hardware
 
+# 書き込みキャプチャキューの深さ（連続して届いたコマンドを取りこぼさないため）
+COMMAND_QUEUE_LIMIT = 32
+# コマンド characteristic のバッファ長（バッチコマンドは 20 バイトを超える）
+COMMAND_MAX_LEN = 240
+# 実行待ちコマンドの上限（これを超えると受信側が空きを待つ）
+COMMAND_PIPELINE_LIMIT = 16
+# 接続後に申し出る ATT MTU（ESP32 の上限は 512 だが、1 パケットに収まる 247 にする）
+PREFERRED_MTU = 247
+# 従来の 20 バイトの通知（ATT MTU 23）
+LEGACY_PAYLOAD = 20
+
+# まとめた通知（コンテナ）のフォーマット
+#   [CONTAINER_FORMAT, バージョン, レコード数, (長さ, レコード)...]
+# レコードは従来の通知と同じバイト列で、長さで種類がわかる（7: 状態, 20: イベント）。
+# ホストがコマンド CMD_NOTIFY_FORMAT で選んだときだけ使い、選んでいなければ従来の 20 バイトで送る。
+CONTAINER_FORMAT = 0x15
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = 3
+CONTAINER_WINDOW_MS = 5     # 最初のイベントからこの間に届いたものを 1 つの通知にまとめる
+CONTAINER_QUEUE_LIMIT = 32  # 送れていないレコードの上限（超えたら古いものを捨てる）
+NOTIFY_RETRY_MS = 10        # 送信バッファが一杯で通知できなかったときに待つ時間
+NOTIFY_MAX_RETRIES = 20     # 続けて失敗したらそのコンテナのレコードを捨てる回数
+
+class CommandQueue:
+    """実行待ちコマンドの上限付きキュー
+
+    key(data) が同じ値を返すコマンドは後から来たものが前のものを同じ位置で置き換える
+    （まだ実行していない古い状態は適用せず、ほかのコマンドとの順番は変えない）。
+    key が None のコマンドは置き換えない。
+    """
+    def __init__(self, limit=COMMAND_PIPELINE_LIMIT, key=None):
+        self.limit = limit
+        self.key = key
+        self._items = []    # (key, data, 受信時刻 ticks_ms)
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self.enqueued = 0
+        self.coalesced = 0
+        self.executed = 0
+        self.max_depth = 0
+        self.latency_total_ms = 0
+        self.latency_max_ms = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, data):
+        key = self.key(data) if self.key else None
+        items = self._items
+        while len(items) >= self.limit:
+            self._space.clear()
+            await self._space.wait()
+        self.enqueued += 1
+        # 待っている間に前のコマンドが実行されたかもしれないので、待ったあとで探す
+        if key is not None:
+            for i in range(len(items)):
+                if items[i][0] == key:
+                    items[i] = (key, data, time.ticks_ms())
+                    self.coalesced += 1
+                    return
+        items.append((key, data, time.ticks_ms()))
+        if len(items) > self.max_depth:
+            self.max_depth = len(items)
+        self._ready.set()
+
+    async def get(self):
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        _, data, received = self._items.pop(0)
+        latency = time.ticks_diff(time.ticks_ms(), received)
+        self.executed += 1
+        self.latency_total_ms += latency
+        if latency > self.latency_max_ms:
+            self.latency_max_ms = latency
+        self._space.set()
+        return data
+
+    def stats(self):
+        return {
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "executed": self.executed,
+            "latency_avg_ms": self.latency_total_ms // self.executed if self.executed else 0,
+            "latency_max_ms": self.latency_max_ms,
+        }
+
+class NotificationPacker:
+    """通知のレコードをためて、MTU に収まるだけ 1 つのコンテナにまとめるクラス"""
+    def __init__(self, limit=CONTAINER_QUEUE_LIMIT):
+        self.limit = limit
+        self._records = []
+        self._state = None      # 状態は最新の 1 つだけ送る
+        self._packed = 0        # 最後の pack() に入れたレコードの数（状態は含まない）
+        self._packed_state = False
+        self.records = 0
+        self.packets = 0
+        self.dropped = 0
+        self.retries = 0
+
+    def __len__(self):
+        return len(self._records) + (1 if self._state else 0)
+
+    def add(self, data):
+        if len(self._records) >= self.limit:
+            del self._records[0]
+            self.dropped += 1
+        self._records.append(bytes(data))  # 呼び出し元はバッファを使い回すのでコピーする
+
+    def set_state(self, data):
+        self._state = bytes(data)
+
+    def clear(self):
+        self._records = []
+        self._state = None
+
+    def pack(self, max_payload):
+        """max_payload バイトに収まるだけのレコードをコンテナにする
+
+        レコードは sent() を呼ぶまで取り除かないので、通知できなかったときは次の pack() で送り直せる。
+        """
+        out = bytearray(CONTAINER_HEADER)
+        count = 0
+        for record in self._records:
+            if len(out) + 1 + len(record) > max_payload or count == 255:
+                break
+            out.append(len(record))
+            out.extend(record)
+            count += 1
+        self._packed = count
+        state = self._state
+        self._packed_state = (state is not None and count == len(self._records) and
+                              len(out) + 1 + len(state) <= max_payload and count < 255)
+        if self._packed_state:
+            out.append(len(state))
+            out.extend(state)
+            count += 1
+        out[0] = CONTAINER_FORMAT
+        out[1] = CONTAINER_VERSION
+        out[2] = count
+        return out
+
+    def discard(self):
+        """最後に pack() したコンテナを送れなかったので、入れたレコードを捨てる"""
+        del self._records[:self._packed]
+        self.dropped += self._packed
+        if self._packed_state:
+            self._state = None
+            self.dropped += 1
+        self._packed = 0
+        self._packed_state = False
+
+    def sent(self):
+        """最後に pack() したコンテナを送れたので、入れたレコードを取り除く"""
+        del self._records[:self._packed]
+        self.records += self._packed
+        if self._packed_state:
+            self._state = None
+            self.records += 1
+        self.packets += 1
+        self._packed = 0
+        self._packed_state = False
+
 class BLEConnection:
-    def __init__(self):
+    def __init__(self, command_queue_limit=COMMAND_QUEUE_LIMIT):
         self.hardware = Hardware()
         # デバイス名を設定
         self.ssid = self.hardware.get_wifi_ap_ssid()  # Wi-Fiを起動準備してssidを取得
         print(self.ssid)
         self.connection = None  # 接続オブジェクトを初期化
+        self.mtu = 23   # 接続で決まった ATT MTU
+        self.packer = NotificationPacker()
+        self.container = False  # ホストがまとめた通知を選んだ
+        self._flush = asyncio.ThreadSafeFlag()
         # 受信したコマンドの処理
         self.recvnum = 0
+        self.commands = None  # command_task で作る CommandQueue
         # サービスUUIDと characteristic UUID を定義
         self.IOT_SERVICE_UUID = bluetooth.UUID('0b50f3e4-607f-4151-9091-7d008d6ffc5c')
         IOT_COMMAND_CH__UUID = bluetooth.UUID('0b500100-607f-4151-9091-7d008d6ffc5c')
@@ -36,8 +206,12 @@ class BLEConnection:
 
         # サービスと characteristic を定義
         self.iot_service = aioble.Service(self.IOT_SERVICE_UUID)
-        self.command_characteristic = aioble.Characteristic(
-            self.iot_service, IOT_COMMAND_CH__UUID, read=True, write=True, notify=True
+        # capture=True: 書き込まれた値を IRQ 内でキューに積むので、
+        # 読み出す前に次の書き込みで上書きされてもコマンドを失わない
+        aioble.set_capture_queue_limit(command_queue_limit)
+        self.command_characteristic = aioble.BufferedCharacteristic(
+            self.iot_service, IOT_COMMAND_CH__UUID, read=True, write=True, notify=True, capture=True,
+            max_len=COMMAND_MAX_LEN
         )
         self.state_characteristic = aioble.Characteristic(
             self.iot_service, IOT_STATE_CH_UUID, read=True
@@ -67,12 +241,63 @@ class BLEConnection:
 
     def send_notification(self, data):
         if self.connection:
+            if self.container:
+                self.packer.add(data)
+                self._flush.set()
+                return
             # print("Sending notification to", self.connection.device)
             self.actionevent_characteristic.notify(self.connection, data)
             # print("Notification sent")
         else:
             print("No connection available to send notification")
 
+    def set_notify_format(self, version):
+        """通知の形式を選ぶ（0: 従来の 20 バイト、1: まとめた通知）。選べたら True
+
+        MTU が小さくてまとめる意味がないときは従来のままにする。
+        切り替えの知らせ（空のコンテナ）を送れなかったときも従来のままにする（ホストは選び直せる）。
+        """
+        enable = version == CONTAINER_VERSION and self.mtu - 3 >= CONTAINER_HEADER + 2 * (1 + LEGACY_PAYLOAD)
+        self.packer.clear()
+        if enable and self.connection:
+            # 空のコンテナを返して、ホストに切り替わったことを知らせる
+            try:
+                self.actionevent_characteristic.notify(self.connection, self.packer.pack(self.mtu - 3))
+                self.packer.sent()
+            except Exception as e:
+                print("Error in set_notify_format:", e)
+                self.packer.discard()
+                enable = False
+        self.container = enable
+        print("Notification format:", "container" if enable else "legacy", "MTU", self.mtu)
+        return enable
+
+    # まとめた通知を送る
+    async def notify_task(self):
+        while True:
+            await self._flush.wait()
+            await asyncio.sleep_ms(CONTAINER_WINDOW_MS)     # 続けて起きるイベントを待つ
+            retries = 0
+            while self.connection and self.container and len(self.packer):
+                try:
+                    self.actionevent_characteristic.notify(self.connection, self.packer.pack(self.mtu - 3))
+                except OSError as e:
+                    # 送信バッファが一杯。レコードは残して、少し待ってから送り直す
+                    retries += 1
+                    if retries <= NOTIFY_MAX_RETRIES:
+                        self.packer.retries += 1
+                        await asyncio.sleep_ms(NOTIFY_RETRY_MS)
+                        continue
+                    print(f"Error in notify_task: {e} ({retries - 1} retries)")
+                    self.packer.discard()
+                except Exception as e:
+                    print(f"Error in notify_task: {e}")
+                    self.packer.discard()
+                else:
+                    self.packer.sent()
+                retries = 0
+                await asyncio.sleep_ms(0)   # 続けて送る間もほかのタスクを動かす
+
     async def async_send_notification(self, data):
         try:
             if self.connection:
@@ -86,6 +311,9 @@ class BLEConnection:
 
     def state_write(self, buffer):
         self.state_characteristic.write(buffer, send_update=True)
+        if self.container and self.connection:
+            self.packer.set_state(buffer)
+            self._flush.set()
 
     # 接続を待ち、接続があれば3バイトのデータを送信
     async def peripheral_task(self):
@@ -99,17 +327,27 @@ class BLEConnection:
                 ) as connection:
                     print("Connection from", connection.device)
                     self.connection = connection  # 接続オブジェクトを設定
-                    # 送信する3バイトのデータを定義
+                    # 送信する3バイトのデータを定義（MTU の交換を待たずに先に書く）
                     hardware = 2 # 1:MICROBIT_V1, 2:MICROBIT_V2
                     protocol = 0
                     route = 0   # 0:BLE, 1:SERIAL
                     data_to_send = struct.pack('<BBB', hardware, protocol, route)
                     self.command_characteristic.write(data_to_send)
                     print("3バイト送信...") # 3バイトのデータを送信
+                    try:
+                        # 大きな MTU が決まれば、イベントをまとめて送れる
+                        self.mtu = await connection.exchange_mtu(PREFERRED_MTU) or self.mtu
+                    except Exception as e:
+                        print("MTU exchange failed:", e)
+                    print("MTU:", self.mtu)
                     # 切断を待ち、理由を取得して表示
                     reason = await connection.disconnected(timeout_ms=None)
                     print(f"Disconnected. Reason: {reason}")
+                    print("Command stats:", self.command_stats())
                     self.connection = None  # 接続オブジェクトを初期化
+                    self.mtu = 23
+                    self.container = False
+                    self.packer.clear()
             except Exception as e:
                 print("Error during advertising or connection:", e)
                 await asyncio.sleep_ms(1000)
@@ -126,12 +364,36 @@ class BLEConnection:
             print(f"Error in motion_task: {e}")
             await asyncio.sleep_ms(1000)
 
+    def command_stats(self):
+        """コマンド受信の統計（キャプチャキューの深さ、取りこぼし数など）"""
+        stats = {"capture": aioble.capture_stats(), "received": self.recvnum,
+                 "notify": {"mtu": self.mtu, "container": self.container, "records": self.packer.records,
+                            "packets": self.packer.packets, "dropped": self.packer.dropped,
+                            "retries": self.packer.retries}}
+        if self.commands is not None:
+            stats["pipeline"] = self.commands.stats()
+        return stats
+
     # コマンドを待ち、実行する
-    async def command_task(self, callback):
+    # key はコマンドの置き換えキーを返す関数（Device.command_key）
+    async def command_task(self, callback, key=None):
+        self.commands = CommandQueue(key=key)
+        asyncio.create_task(self.command_worker_task(callback))
         while True:
-            await self.command_characteristic.written()
-            data = self.command_characteristic.read()
+            # キャプチャモードでは (接続, 書き込まれた値) が順番に返る
+            _, data = await self.command_characteristic.written()
             self.recvnum += 1
             # print(f"Received {self.recvnum} command: {data}")
-            asyncio.create_task(callback(data))  # コマンドを実行
-            await asyncio.sleep(0)  # 他のタスクに制御を渡す
+            try:
+                await self.commands.put(data)  # 満杯なら空くまで待つ
+            except Exception as e:
+                print(f"Error in received command {data}: {e}")
+
+    # キューからコマンドを 1 つずつ取り出して実行する
+    async def command_worker_task(self, callback):
+        while True:
+            data = await self.commands.get()
+            try:
+                await callback(data)  # コマンドを実行
+            except Exception as e:
+                print(f"Error in command {data}: {e}")
@@ -10,8 +10,7 @@ import network
 import time
 import machine
 from machine import Pin, I2C, ADC, PWM, WDT
-from ahtx0 import AHT20
-from bh1750 import BH1750
+from sensors import get_registry
 from ssd1306 import SSD1306_I2C
 from config import Config 
 
@@ -225,32 +224,24 @@ def read_sensors():
             except OSError as e:
                 print(f"Error initializing oled: {e}")
 
+        # センサーのドライバは初回だけ作り、以降は使い回す
+        sensors = get_registry(i2c)
+
         # AHT20 温度・湿度
-        try:
-            aht20 = AHT20(i2c)
-            temperature = round(aht20.temperature, 1)
-            humidity = round(aht20.relative_humidity, 1)
-        except Exception as e:
-            print("AHT20 sensor error:", e)
+        values = sensors.read_temp_humi()
+        if values:
+            temperature = round(values[0], 1)
+            humidity = round(values[1], 1)
 
-        # BH1750 照度
-        for i in range(2):
-            try:
-                # print("I2C devices:", i2c.scan())
-                bh1750 = BH1750(i2c)
-                illuminance = round(bh1750.measurement, 1)
-                # print("BH1750",illuminance)
-                break;
-            except Exception as e:
-                print("BH1750 sensor error:", e)
-            time.sleep(1)
+        # BH1750 照度（連続測定モード）
+        lux = sensors.read_illuminance()
+        if lux is not None:
+            illuminance = round(lux, 1)
 
         # BME280（もし使うなら）
-        # try:
-        #     bme = BME280(i2c)
-        #     temperature, pressure, humidity = bme.read_data()
-        # except Exception as e:
-        #     print("BME280 sensor error:", e)
+        # values = sensors.read_bme280()
+        # if values:
+        #     temperature, pressure, humidity = values
 
     log_data = {
         "timestamp": time.time(),
@@ -1,11 +1,18 @@
 # ESP32C6 pcratch-IoT v1.5.1.3
 import struct
+import time
 import framebuf
+import micropython
 import network
 from machine import Pin, I2C, ADC, PWM
 from ssd1306 import SSD1306_I2C
 from neopixel import NeoPixel
-from ahtx0 import AHT20
+from sensors import get_registry, get_sampler
+from pinevents import PinEventRing, EVENT_RISE, EVENT_FALL
+from display import Display
+
+# ハード割り込みで例外が起きたときのメッセージ用
+micropython.alloc_emergency_exception_buf(100)
 
 VERSION = 'v2.0.1.0'
 # HW_VERSION=2.0 に対応（16と18が入れ替え）
@@ -51,12 +58,14 @@ class Hardware:
             self.PWM19 = PWM(Pin(19, Pin.OUT), freq=50, duty=0)
             self.PWM20 = PWM(Pin(20, Pin.OUT), freq=50, duty=0)
             self.PWM21 = PWM(Pin(21, Pin.OUT), freq=50, duty=0)
+            self.batch_depth = 0        # begin_batch() の入れ子の深さ
+            self.npled_dirty = False    # バッチ中に NeoPixel を変更した
             self.init_oled()
-            self.init_aht20()
+            self.init_sensors()
             self.init_pixcel()
-            self.register_button_irq()
-            self.pin_event_time = {}
             self.button_handlers = {}  # ハンドラーを登録する辞書
+            self.pin_events = PinEventRing()
+            self.register_button_irq()
 
             self.PASSWORD = "12345678"
             self.wifi_ap = None  # Wi-Fiアクセスポイントのインスタンス
@@ -155,18 +164,20 @@ class Hardware:
             self.oled = SSD1306_I2C(128, 64, self.i2c)
         except OSError as e:
             print(f"Error initializing oled: {e}")
+        # OLED への描画は display を通して領域ごとにまとめる
+        self.display = Display(self.oled)
     
     # 画面をさかさまにするコマンドを送信
     def flip_display(self):
         self.oled.write_cmd(0xA0)  # セグメントリマップ
         self.oled.write_cmd(0xC0)  # COM出力スキャン方向
 
-    def init_aht20(self):
-        self.aht20 = None
-        try:
-            self.aht20 = AHT20(self.i2c)
-        except OSError as e:
-            print(f"Error initializing aht20: {e}")
+    def init_sensors(self):
+        # I2C センサーのドライバは sensors モジュールで共有する
+        self.sensors = get_registry(self.i2c)
+        # センサーごとの周期で読み取り、最新値を snapshot に保持する（sampler.run() で動かす）
+        self.sampler = get_sampler(self.i2c)
+        self.sampler.add_channel("light", self.get_light_level, 250)  # 明るさ(ADC) 4Hz
 
     # ボタンの状態を取得
     def get_button_state(self, button_name):
@@ -177,31 +188,41 @@ class Hardware:
         self.button_handlers[pinIndex] = handler
         print(f"register_button_handler {pinIndex} {handler} {len(self.button_handlers)}")
 
+    # ハード割り込みから呼ばれる。メモリを確保せずにリングバッファに記録するだけ
     def handle_button_event(self, pin, pinIndex):
-        # time.sleep_ms(80)  # 80msの遅延を追加してチャタリングを軽減
-        # print(f"event {pinIndex}")
-        current_event = "RISE" if pin.value() == 1 else "FALL"
-        if pinIndex not in self.pin_event_time:
-            self.pin_event_time[pinIndex] = ''
-
-        if current_event == self.pin_event_time[pinIndex]:
+        ticks = time.ticks_ms()     # エッジの時刻
+        current_event = EVENT_RISE if pin.value() == 1 else EVENT_FALL
+        if current_event == self.pin_last_event[pinIndex]:
             return  # 同じイベントが発生した場合は無視
-        self.pin_event_time[pinIndex] = current_event
-        # print(f"event {pinIndex}  {current_event} {len(self.button_handlers)}")
-        # 登録されたハンドラーを呼び出す
-        if pinIndex in self.button_handlers:
-            handler = self.button_handlers[pinIndex]
-            # print(f"handler {pinIndex} に {current_event} イベント")
-            handler(pinIndex, current_event)  # ハンドラーにイベントを渡す
+        self.pin_last_event[pinIndex] = current_event
+        self.pin_events.put(pinIndex, current_event, ticks)
 
     def register_button_irq(self):
         """ボタンのIRQを登録"""
-        self.PIN17.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=lambda pin: self.handle_button_event(pin, 17))
-        if self.hw_version == "2.0":
-            # pin18とpin16を入れ替え
-            self.leftbtn.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=lambda pin: self.handle_button_event(pin, 16))
-        else:
-            self.leftbtn.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=lambda pin: self.handle_button_event(pin, 18))
+        left = 16 if self.hw_version == "2.0" else 18   # pin18とpin16を入れ替え
+        # 割り込み中に辞書へキーを追加しないように先に作っておく
+        self.pin_last_event = {17: 0, left: 0}
+        trigger = Pin.IRQ_FALLING | Pin.IRQ_RISING
+        self.PIN17.irq(trigger=trigger, handler=lambda pin: self.handle_button_event(pin, 17), hard=True)
+        self.leftbtn.irq(trigger=trigger, handler=lambda pin: self.handle_button_event(pin, left), hard=True)
+
+    async def pin_event_task(self):
+        """割り込みで記録したピンのイベントを、登録されたハンドラーに渡す"""
+        events = self.pin_events
+        while True:
+            await events.wait()
+            try:
+                events.drain(self._dispatch_pin_event)
+            except Exception as e:
+                print(f"Error in pin event handler: {e}")
+
+    def _dispatch_pin_event(self, record):
+        pinIndex = record[0]
+        handler = self.button_handlers.get(pinIndex)
+        if handler:
+            event_name = "RISE" if record[1] == EVENT_RISE else "FALL"
+            ticks = struct.unpack_from('<I', record, 2)[0]
+            handler(pinIndex, event_name, ticks)  # ハンドラーにイベントを渡す
 
     # print(f"ピン {pin} に {n} を出力")
     def digital_out(self, pin, n):
@@ -231,19 +252,21 @@ class Hardware:
         # print(f"文字 {s} を {t} ミリ秒間隔で流す")
         # 上10ドットを消去
         if self.oled:
-            self.oled.fill_rect(0, 0, self.oled.width, 10, 0)
-            self.oled.text(s, 0, 0)
-            self.oled.show()
+            self.display.update("status", self.oled.text, s, 0, 0)
         else:
             print("OLED not initialized", s)
 
+    # y が 0 なら上の 3 行、それ以外は下の 2 行の領域に描く
     def draw_icon(self, icon, x, y):
         if self.oled:
-            self.oled.fill_rect(x, y, 8, 5, 0)
-            for dx, val in enumerate(icon):
-                if val:
-                    self.oled.pixel(x + dx % 5, y + int(dx / 5), 1)
-            self.oled.show()
+            # icon は受信バッファを参照していることがあるので、描画までにコピーしておく
+            name = "icon_top" if y == 0 else "icon_bottom"
+            self.display.update(name, self._draw_icon, bytes(icon), x, y)
+
+    def _draw_icon(self, icon, x, y):
+        for dx, val in enumerate(icon):
+            if val:
+                self.oled.pixel(x + dx % 5, y + int(dx / 5), 1)
 
     def play_tone(self, f, v = 100):
         # print(f"Tone {f}Hz {v}% ...")
@@ -265,18 +288,43 @@ class Hardware:
     def get_light_level(self):
         return self.adc2.read() / 4095 * 100
 
+    def sensor_snapshot(self):
+        """サンプラーが保持している最新のセンサー値"""
+        return self.sampler.snapshot
+
     def temp_humi(self):
-        if self.aht20:
-            temperature = self.aht20.temperature
-            humidity = self.aht20.relative_humidity
-        else:
-            temperature = 0
-            humidity = 0
-        return temperature, humidity
+        values = self.sensors.read_temp_humi()  # 1回の変換で温度と湿度を取得
+        if values:
+            return values
+        return 0, 0
+
+    async def temp_humi_async(self):
+        """変換待ちの間イベントループを止めずに温度と湿度を取得"""
+        values = await self.sensors.read_temp_humi_async()
+        if values:
+            return values
+        return 0, 0
 
     def pixcel(self, n, r, g, b):
         self.npled[n] = (int(r / 100 * 255), int(g / 100 * 255), int(b / 100 * 255))  # n番の NeoPixel を点灯
-        self.npled.write()
+        if self.batch_depth:
+            self.npled_dirty = True
+        else:
+            self.npled.write()
+
+    def begin_batch(self):
+        """NeoPixel と OLED への書き込みを end_batch() までまとめる"""
+        self.batch_depth += 1
+        self.display.hold()
+
+    def end_batch(self):
+        self.batch_depth -= 1
+        self.display.release()
+        if self.batch_depth:
+            return
+        if self.npled_dirty:
+            self.npled_dirty = False
+            self.npled.write()
 
     def init_pixcel(self):
         self.pixcel(0, 0, 0, 0)
@@ -287,6 +335,27 @@ class Hardware:
         volt = ADC(3).read_u16() / 65535 * 3.3 * 3
         return volt
 
+    def oled_bitmap(self):
+        """OLEDのバッファを1ビットBMP形式のバイト列で返す（128x64 で 1086 バイト）"""
+        width, height = self.oled.width, self.oled.height
+        row_size = (width + 31) // 32 * 4   # 各行のバイト数（4バイト境界に揃える）
+        image_size = row_size * height
+        offset = 14 + 40 + 8    # ファイルヘッダー + 情報ヘッダー + パレット(2色)
+        if getattr(self, "_bmp_buffer", None) is None or len(self._bmp_buffer) != offset + image_size:
+            bmp = bytearray(offset + image_size)
+            struct.pack_into('<2sIHHI', bmp, 0, b'BM', len(bmp), 0, 0, offset)
+            # 高さを負にすると上の行から順に並べられる（上下反転が不要）
+            struct.pack_into('<IiiHHIIiiII', bmp, 14, 40, width, -height, 1, 1, 0,
+                             image_size, 2835, 2835, 2, 0)
+            bmp[54:62] = b'\x00\x00\x00\x00\xff\xff\xff\x00'   # 0: 黒, 1: 白
+            self._bmp_buffer = bmp
+            # MONO_HLSB は BMP の 1 ビット形式と同じ並び（上位ビットが左）
+            self._bmp_fb = framebuf.FrameBuffer(memoryview(bmp)[offset:], width, height,
+                                                framebuf.MONO_HLSB, row_size * 8)
+        # OLED の MONO_VLSB（縦 8 ドット単位）から横並びへの変換は blit に任せる
+        self._bmp_fb.blit(self.oled, 0, 0)
+        return self._bmp_buffer
+
     def send_oled_bitmap_24(self, cl):
         """OLEDのバッファを24ビットBMP形式で送信（上下正しい）"""
         if self.oled:
@@ -331,10 +400,7 @@ class Hardware:
             fb = framebuf.FrameBuffer(buffer, width, height, framebuf.MONO_HLSB)
 
             # OLEDの内容をバッファにコピー
-            for y in range(height):
-                for x in range(width):
-                    if self.oled.pixel(x, y):
-                        fb.pixel(x, y, 1)
+            fb.blit(self.oled, 0, 0)
 
             # ピクセルデータを行ごとに送信
             for y in range(height):  # 上下反転のために通常の順序でループ
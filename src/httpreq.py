@@ -0,0 +1,147 @@
+# ESP32C6 pcratch-IoT
+# HTTP リクエストの読み取り
+# リクエスト行とヘッダーを 1 行ずつ読み、ボディは Content-Length に従って少しずつ読む。
+# 大きなボディ（ファイルのアップロードなど）もメモリに全部載せずにファイルへ書ける。
+import asyncio
+
+READ_TIMEOUT_MS = 5000      # 1 行やボディの一部を待つ時間
+MAX_HEADER_BYTES = 2048     # リクエスト行とヘッダーの合計の上限
+MAX_FORM_BYTES = 2048       # フォーム (application/x-www-form-urlencoded) の上限
+CHUNK_SIZE = 1024           # ボディを読む単位
+
+
+class HttpError(Exception):
+    """リクエストが不正なとき。status を返して接続を閉じる"""
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+
+
+def url_decode(s):
+    """URL エンコードされた文字列をデコードする（+ は空白）"""
+    if "%" not in s and "+" not in s:
+        return s
+    s = s.replace("+", " ")
+    parts = s.split("%")
+    out = bytearray(parts[0].encode("utf-8"))
+    for part in parts[1:]:
+        try:
+            out.append(int(part[:2], 16))
+            out.extend(part[2:].encode("utf-8"))
+        except ValueError:
+            out.extend(b"%" + part.encode("utf-8"))
+    try:
+        return out.decode("utf-8")
+    except UnicodeError:
+        return s    # UTF-8 にならないときは %xx をそのまま残す
+
+
+def parse_query_string(query):
+    """クエリ文字列（フォームのボディ）を辞書にする"""
+    params = {}
+    for pair in query.split("&"):
+        if "=" in pair:
+            key, value = pair.split("=", 1)
+            params[url_decode(key)] = url_decode(value)
+    return params
+
+
+class HttpRequest:
+    """1 つのリクエスト。ボディはハンドラーが必要な分だけ読む"""
+
+    def __init__(self, reader, method, target, version, headers):
+        self.reader = reader
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # 小文字のヘッダー名 -> 値
+        path, _, query = target.partition("?")
+        self.path = url_decode(path)
+        self.query = parse_query_string(query) if query else {}
+        self.params = {}        # ルートのパスパラメータ（/jobs/{id} の id など）
+        try:
+            self.content_length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError("400 Bad Request", "bad content-length")
+        if self.content_length < 0:
+            raise HttpError("400 Bad Request", "bad content-length")
+        self.remaining = self.content_length   # まだ読んでいないボディのバイト数
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            self.keep_alive = connection == "keep-alive"
+        else:
+            self.keep_alive = connection != "close"
+
+    async def read(self, size=CHUNK_SIZE):
+        """ボディを最大 size バイト読む。終わりなら b"" """
+        if self.remaining <= 0:
+            return b""
+        data = await asyncio.wait_for_ms(self.reader.read(min(size, self.remaining)), READ_TIMEOUT_MS)
+        if not data:
+            raise HttpError("400 Bad Request", "body truncated")
+        self.remaining -= len(data)
+        return data
+
+    async def read_body(self, limit):
+        """ボディ全体を読む。limit を超えるときは 413"""
+        if self.content_length > limit:
+            raise HttpError("413 Payload Too Large")
+        chunks = []
+        while self.remaining:
+            chunks.append(await self.read())
+        return b"".join(chunks)
+
+    async def read_form(self, limit=MAX_FORM_BYTES):
+        """フォームのボディを読んでデコードした辞書を返す"""
+        return parse_query_string((await self.read_body(limit)).decode("utf-8"))
+
+    async def save_body(self, filename, limit):
+        """ボディを CHUNK_SIZE ずつファイルに書き出す。書いたバイト数を返す"""
+        if self.content_length > limit:
+            raise HttpError("413 Payload Too Large")
+        buf = bytearray(CHUNK_SIZE)
+        mv = memoryview(buf)
+        written = 0
+        with open(filename, "wb") as f:
+            while self.remaining:
+                n = await asyncio.wait_for_ms(
+                    self.reader.readinto(mv[:min(CHUNK_SIZE, self.remaining)]), READ_TIMEOUT_MS)
+                if not n:
+                    raise HttpError("400 Bad Request", "body truncated")
+                self.remaining -= n
+                f.write(mv[:n])
+                written += n
+        return written
+
+    async def discard(self):
+        """読まなかったボディを読み捨てる（keep-alive で次のリクエストを読むため）"""
+        while self.remaining:
+            await self.read()
+
+
+async def read_request(reader, writer=None):
+    """リクエスト行とヘッダーを読む。接続が閉じられたら None を返す"""
+    line = await asyncio.wait_for_ms(reader.readline(), READ_TIMEOUT_MS)
+    if not line:
+        return None
+    size = len(line)
+    try:
+        method, target, version = line.decode("utf-8").split()
+    except ValueError:
+        raise HttpError("400 Bad Request", "bad request line")
+    headers = {}
+    while True:
+        line = await asyncio.wait_for_ms(reader.readline(), READ_TIMEOUT_MS)
+        if not line or line == b"\r\n" or line == b"\n":
+            break
+        size += len(line)
+        if size > MAX_HEADER_BYTES:
+            raise HttpError("431 Request Header Fields Too Large")
+        name, _, value = line.decode("utf-8").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    request = HttpRequest(reader, method, target, version, headers)
+    # curl などは大きなボディを送る前に 100 Continue を待つ
+    if writer and headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+    return request
@@ -4,6 +4,7 @@ import struct
 import time
 from machine import Pin, I2C, ADC, PWM
 from hardware import Hardware
+from gesture import GestureEngine
 
 # ボタン関連の定義
 MbitMoreDataFormat = {
@@ -43,103 +44,202 @@ MbitMoreButtonEventID = {
 }
 MbitMoreButtonEventName = {v: k for k, v in MbitMoreButtonEventID.items()}
 
+# コマンドID
+CMD_DIGITAL_OUT = 33    # ピン pin を デジタル出力 n にする
+CMD_ANALOG_OUT = 34     # ピン pin を PWM 出力 n にする
+CMD_SHOW_TEXT = 65      # 文字を表示
+CMD_ICON_TOP = 66       # アイコン表示（上5x3）
+CMD_ICON_BOTTOM = 67    # アイコン表示（下5x2）
+CMD_STOP_TONE = 96      # 音を消す
+CMD_PLAY_TONE = 97      # 音を鳴らす
+CMD_LABEL_DATA = 130    # ラベル付きデータ
+CMD_NEOPIXEL = 161      # SetNeoPixcelColor(n, r, g, b)
+CMD_BATCH = 192         # 複数コマンドをまとめて実行 [len1, cmd1..., len2, cmd2...]
+CMD_NOTIFY_FORMAT = 193 # BLE の通知の形式を選ぶ [version] 0: 従来の 20 バイト, 1: まとめた通知
+
+# 実行待ちのコマンドを後のコマンドで置き換える単位
+COALESCE_COMMAND = 1    # 同じコマンドIDなら置き換える
+COALESCE_TARGET = 2     # 同じコマンドIDで対象（data[1]: ピン番号、LED番号）が同じなら置き換える
+
 class Device:
     def __init__(self, ble_conn):
         self.ble_conn = ble_conn # TODO: BLEConnectionを初期化する
+        self.links = [ble_conn]  # 通知を送る接続（BLE と WebSocket など）
         self.device_info = os.uname()
         self.hardware = Hardware()
         self.button_state = {
             'A': {'pressed': False, 'press_time': 0, 'down_count': 0},
             'B': {'pressed': False, 'press_time': 0, 'down_count': 0}
         }
-        self.pin_event_time = {}
+        self._pin_buffer = bytearray(20)    # ピンのイベント通知用（使い回す）
+        self._pin_buffer[19] = MbitMoreDataFormat["PIN_EVENT"]
+        self._button_buffer = bytearray(20)    # ボタンのイベント通知用（使い回す）
+        self._button_buffer[19] = MbitMoreDataFormat["ACTION_EVENT"]
+        # コマンドID -> (ハンドラー, struct フォーマット)
+        self._commands = {}
+        # コマンドID -> (置き換えの単位, キーに使うコマンドID)
+        self._coalesce = {}
+        self.register_default_commands()
 
+        # ボタンのジェスチャー（CLICK など）を判定して通知する
+        self.gestures = GestureEngine(self.button_notification)
+        # ピン番号 -> ボタン名（左ボタンが A、右ボタンが B）
+        self.button_pins = {17: 'B'}
         # PIN 17, 18 or 16 のイベントハンドラ登録
-        self.hardware.register_button_handler(17, self.pin_notification)
         if self.hardware.hw_version == "2.0":
             # pin18とpin16を入れ替え
-            self.hardware.register_button_handler(16, self.pin_notification)
+            self.button_pins[16] = 'A'
         else:
-            self.hardware.register_button_handler(18, self.pin_notification)
+            self.button_pins[18] = 'A'
+        for pinIndex, button_name in self.button_pins.items():
+            self.gestures.add_button(button_name)
+            self.hardware.register_button_handler(pinIndex, self.on_pin_event)
+
+    # ピンのイベントを通知し、ボタンならジェスチャーの判定に渡す
+    def on_pin_event(self, pinIndex, event_name, timestamp):
+        self.pin_notification(pinIndex, event_name, timestamp)
+        button_name = self.button_pins.get(pinIndex)
+        if button_name:
+            self.gestures.feed(button_name, event_name == "RISE", timestamp)
 
     # ピンのイベントをBLEで通知する
     # pinIndex = dataView.getUint8(0);
     # event = dataView.getUint8(1);
     # value: dataView.getUint32(2, true)
-    def pin_notification(self, pinIndex, event_name):
+    # timestamp はエッジの時刻 (ticks_ms)。省略すると現在の時刻
+    def pin_notification(self, pinIndex, event_name, timestamp=None):
         # print(f"pin_notification {pinIndex} に {event_name} イベント")
-        buffer = bytearray(20)
-        buffer[19] = MbitMoreDataFormat["PIN_EVENT"]
+        if timestamp is None:
+            timestamp = time.ticks_ms()
         event = MbitMorePinEvent[event_name]
-        timestamp = time.ticks_ms()
-        packed_data = struct.pack('<BBI', pinIndex, event, timestamp)
-        buffer[0:6] = packed_data
-        self.ble_conn.send_notification(buffer)
+        struct.pack_into('<BBI', self._pin_buffer, 0, pinIndex, event, timestamp)
+        self._send_notification(self._pin_buffer)
 
     # ボタンの状態を取得
     def get_button_state(self, button_name):
         return self.button_state[button_name]
+
+    def add_link(self, link):
+        """BLE のほかに通知を送る接続を追加する（send_notification と state_write を持つもの）"""
+        self.links.append(link)
+
+    def _send_notification(self, data):
+        for link in self.links:
+            link.send_notification(data)
     
-    async def do_command(self, data):
-        # バイナリデータをリストに変換
-        data_list = list(data)
-        # print(data_list)  # 出力: [1, 72, 101, 108, 108, 111]
-        command_id = data_list[0]
-        # print("Command ID:", command_id)
-        if command_id == 65:
-            # 文字 s を t ミリ秒間隔で流す
-            self.hardware.show_text(data[2:].decode('utf-8'), data[1])
-        elif command_id == 33:
-            # ピン pin を デジタル出力 n にする
-            pin = data[1]
-            val = data[2]
-            self.hardware.digital_out(pin, val)
-        elif command_id == 34:
-            # ピン pin を PWM 出力 n %にする
-            pin = data[1]
-            uint16_value = struct.unpack('<H', data[2:4])[0]     # 続く2バイトを数値に変換
-            # print("ピン", pin, "を PWM 出力", uint16_value, "%にする")
-            self.hardware.analog_out(pin, uint16_value)
-        elif command_id == 96:
-            # 音を消す
-            self.hardware.stop_tone()
-        elif command_id == 97:
-            # 1000000/data[1:5] Hzの音を data[5]/255*100 %の大きさで鳴らす
-            # vol は 0 か、それ以外で音量を調節できない
-            four_bytes = data[1:5]  # data[2:] から4バイトを取得
-            uint32_value = struct.unpack('<I', four_bytes)[0]   # 4バイトを uint32 の数値に変換
-            self.hardware.play_tone(1000000 / uint32_value, data[5]/255*100)
-        elif command_id == 130:
-            label = data[1:9].decode('utf-8')
-            value = data[9:].decode('utf-8')
-            print("label:", label, value)
-        elif command_id == 66:
-            # アイコン表示（上5x3）
-            self.hardware.draw_icon(data[1:], 0, 0)
-        elif command_id == 67:
-            # アイコン表示（下5x2）
-            self.hardware.draw_icon(data[1:], 0, 3)   # 下の部分だけ書き直す
-        elif command_id == 161:  # SetNeoPixcelColor(n, r, g, b)
-            n = data[1]
-            r = data[2]
-            g = data[3]
-            b = data[4]
-            self.hardware.pixcel(n, r, g, b)
+    def register_command(self, command_id, handler, fmt=None, coalesce=None):
+        """コマンドIDのハンドラーを登録する
+
+        fmt を指定すると data[1:] を struct でデコードした値を引数に渡す。
+        fmt が None のときは受信データの memoryview をそのまま渡す。
+        coalesce に COALESCE_COMMAND / COALESCE_TARGET を指定すると、実行待ちの
+        古いコマンドを置き換える。
+        """
+        self._commands[command_id] = (handler, fmt)
+        if coalesce:
+            self._coalesce[command_id] = coalesce
         else:
-            print("Command ID", command_id, "is not defined.")
+            self._coalesce.pop(command_id, None)
+
+    def command_key(self, data):
+        """コマンドの置き換えキーを返す。置き換えないコマンドと空のデータは None"""
+        if not data:
+            return None
+        coalesce = self._coalesce.get(data[0])
+        if coalesce is None:
+            return None
+        if coalesce == COALESCE_TARGET and len(data) > 1:
+            return data[0] << 8 | data[1]
+        return data[0] << 8
+
+    def register_default_commands(self):
+        hardware = self.hardware
+        self.register_command(CMD_SHOW_TEXT, self._cmd_show_text, coalesce=COALESCE_COMMAND)
+        # デジタル出力はパルス（0→1→0）を送ることがあるので置き換えない
+        self.register_command(CMD_DIGITAL_OUT, hardware.digital_out, "<BB")
+        self.register_command(CMD_ANALOG_OUT, hardware.analog_out, "<BH", coalesce=COALESCE_TARGET)
+        self.register_command(CMD_STOP_TONE, self._cmd_stop_tone)
+        self.register_command(CMD_PLAY_TONE, self._cmd_play_tone, "<IB")
+        self.register_command(CMD_LABEL_DATA, self._cmd_label_data)
+        self.register_command(CMD_ICON_TOP, self._cmd_icon_top)
+        self.register_command(CMD_ICON_BOTTOM, self._cmd_icon_bottom)
+        self.register_command(CMD_NEOPIXEL, hardware.pixcel, "<BBBB", coalesce=COALESCE_TARGET)
+        self.register_command(CMD_BATCH, self._cmd_batch)
+        self.register_command(CMD_NOTIFY_FORMAT, self.ble_conn.set_notify_format, "<B")
+
+    async def do_command(self, data):
+        # コピーせずに memoryview で参照する
+        self._dispatch(memoryview(data))
         return True
 
+    def _dispatch(self, mv):
+        command_id = mv[0]
+        entry = self._commands.get(command_id)
+        if entry is None:
+            print("Command ID", command_id, "is not defined.")
+            return
+        handler, fmt = entry
+        if fmt is None:
+            handler(mv)
+        else:
+            handler(*struct.unpack_from(fmt, mv, 1))
+
+    # 長さ付きのサブコマンドを順に実行し、NeoPixel と OLED への書き込みは最後に 1 回だけ行う
+    def _cmd_batch(self, mv):
+        self.hardware.begin_batch()
+        try:
+            offset = 1
+            end = len(mv)
+            while offset < end:
+                length = mv[offset]
+                offset += 1
+                if length == 0 or offset + length > end:
+                    print("Invalid batch command at", offset - 1)
+                    break
+                sub_command = mv[offset:offset + length]
+                offset += length
+                if sub_command[0] == CMD_BATCH:
+                    continue  # 入れ子のバッチは実行しない
+                self._dispatch(sub_command)
+        finally:
+            self.hardware.end_batch()
+
+    # 文字 s を t ミリ秒間隔で流す
+    def _cmd_show_text(self, mv):
+        self.hardware.show_text(str(mv[2:], "utf-8"), mv[1])
+
+    # 音を消す
+    def _cmd_stop_tone(self, mv):
+        self.hardware.stop_tone()
+
+    # 1000000/period Hzの音を vol/255*100 %の大きさで鳴らす
+    # vol は 0 か、それ以外で音量を調節できない
+    def _cmd_play_tone(self, period, vol):
+        self.hardware.play_tone(1000000 / period, vol / 255 * 100)
+
+    def _cmd_label_data(self, mv):
+        label = str(mv[1:9], "utf-8")
+        value = str(mv[9:], "utf-8")
+        print("label:", label, value)
+
+    # アイコン表示（上5x3）
+    def _cmd_icon_top(self, mv):
+        self.hardware.draw_icon(mv[1:], 0, 0)
+
+    # アイコン表示（下5x2）
+    def _cmd_icon_bottom(self, mv):
+        self.hardware.draw_icon(mv[1:], 0, 3)   # 下の部分だけ書き直す
+
     # ボタンのイベントをBLEで通知する
-    def button_notification(self, button_name, event_name):
-        buffer = bytearray(20)
-        buffer[19] = MbitMoreDataFormat["ACTION_EVENT"]
+    # timestamp はイベントが起きた時刻 (ticks_ms)。省略すると現在の時刻
+    def button_notification(self, button_name, event_name, timestamp=None):
+        if timestamp is None:
+            timestamp = time.ticks_ms()
         action = MbitMoreActionEvent["BUTTON"]
         button = MbitMoreButtonName[button_name]
         event = MbitMoreButtonEventName[event_name]
-        timestamp = time.ticks_ms()
-        packed_data = struct.pack('<BHBI', action, button, event, timestamp)
-        buffer[0:8] = packed_data
-        self.ble_conn.send_notification(buffer)
+        struct.pack_into('<BHBI', self._button_buffer, 0, action, button, event, timestamp)
+        self._send_notification(self._button_buffer)
 
     # 定期的にハードウェアのセンサ値を送信する
     '''
@@ -155,7 +255,8 @@ class Device:
         LOGO: 5
     };
     '''
-    def send_sensor_value(self):
+    def read_sensor_state(self):
+        """送信する (gpio, 明るさ, 温度, 湿度) を送信時の単位で返す"""
         if self.hardware.hw_version == "2.0":
             # pin18とpin16を入れ替え
             btnb = 0 if self.hardware.PIN17.value() == 0 else 1
@@ -178,9 +279,71 @@ class Device:
             (btnb << 4+24) |
             (self.hardware.human_sensor() << 5+24)
         )
-        light_level = int(self.hardware.get_light_level() / 100 * 255)
-        temperature, humidity = self.hardware.temp_humi()
+        # センサー値はサンプラーの最新値を使い、ここでは I2C を読まない
+        snapshot = self.hardware.sensor_snapshot()
+        light_level = int(snapshot["light"] / 100 * 255)
+        temperature = snapshot["temperature"]
+        humidity = snapshot["humidity"]
         temperature = max(0, min(255, int(temperature+128)))
         humidity = max(0, min(255, int(humidity/100*255)))
-        buffer = struct.pack('<I3B', gpio_data, light_level, temperature, humidity)
-        self.ble_conn.state_write(buffer)
+        return gpio_data, light_level, temperature, humidity
+
+    def send_sensor_value(self, state=None):
+        if state is None:
+            state = self.read_sensor_state()
+        buffer = struct.pack('<I3B', *state)
+        for link in self.links:
+            link.state_write(buffer)
+
+
+# センサー状態の送信ポリシー
+# 明るさ・温度・湿度の不感帯は送信時の単位（0～255）で指定する
+PUBLISH_POLICY = {
+    "poll_ms": 20,            # 状態を確認する間隔
+    "min_interval_ms": 100,   # 値の変化で送信するときの最短間隔
+    "heartbeat_ms": 1000,     # 変化がなくても送信する間隔
+    "light": 3,
+    "temperature": 1,
+    "humidity": 3,
+}
+
+class StatePublisher:
+    """変化があったときだけセンサー状態を送信する
+
+    GPIO（ボタンなど）のビットが変わったらすぐに送信し、明るさ・温度・湿度は
+    不感帯を超えたときに送信する。変化がなくても heartbeat_ms ごとに送信する。
+    """
+    def __init__(self, device, policy=None):
+        self.device = device
+        self.policy = dict(PUBLISH_POLICY)
+        if policy:
+            self.policy.update(policy)
+        self.poll_ms = self.policy["poll_ms"]
+        self.sent = 0
+        self.reset()
+
+    def reset(self):
+        """次の poll() で必ず送信する（接続直後など）"""
+        self._last = None
+        self._last_sent_ms = 0
+
+    def poll(self):
+        """状態を確認し、送信したら True を返す"""
+        state = self.device.read_sensor_state()
+        now = time.ticks_ms()
+        last = self._last
+        if last is not None and state[0] == last[0]:
+            elapsed = time.ticks_diff(now, self._last_sent_ms)
+            policy = self.policy
+            if elapsed < policy["heartbeat_ms"]:
+                if elapsed < policy["min_interval_ms"]:
+                    return False
+                if (abs(state[1] - last[1]) < policy["light"] and
+                        abs(state[2] - last[2]) < policy["temperature"] and
+                        abs(state[3] - last[3]) < policy["humidity"]):
+                    return False
+        self.device.send_sensor_value(state)
+        self._last = state
+        self._last_sent_ms = now
+        self.sent += 1
+        return True
@@ -0,0 +1,113 @@
+# ESP32C6 pcratch-IoT
+# 時間のかかる処理（デモや Wi-Fi スキャン）をバックグラウンドのタスクで動かす
+# HTTP のハンドラーは start() でジョブ ID をもらってすぐに 202 を返し、
+# ブラウザは GET /jobs/{id} で状態を見る。DELETE /jobs/{id} で止められる。
+#
+#   job = jobs.start("demo1", server.user_led_demo, group="demo")
+#   jobs.get(job.id).info()   # {"id": 1, "name": "demo1", "state": "running", ...}
+import time
+import asyncio
+
+MAX_JOBS = 8    # 覚えておくジョブの数（古い終わったジョブから忘れる）
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class Job:
+    """1 つのジョブの状態"""
+
+    def __init__(self, job_id, name, group):
+        self.id = job_id
+        self.name = name
+        self.group = group
+        self.state = RUNNING
+        self.error = None
+        self.started = time.ticks_ms()
+        self.elapsed_ms = 0
+        self.task = None
+
+    def finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.elapsed_ms = time.ticks_diff(time.ticks_ms(), self.started)
+        self.task = None
+
+    def running(self):
+        return self.state == RUNNING
+
+    def info(self):
+        """JSON で返す内容"""
+        elapsed = self.elapsed_ms
+        if self.running():
+            elapsed = time.ticks_diff(time.ticks_ms(), self.started)
+        info = {"id": self.id, "name": self.name, "state": self.state, "elapsed_ms": elapsed}
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class JobRunner:
+    """ジョブを起動して状態を覚えておくクラス"""
+
+    def __init__(self, max_jobs=MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.jobs = {}      # ID -> Job
+        self._next_id = 1
+
+    def start(self, name, func, *args, group=None):
+        """func(*args) をタスクで動かして Job を返す
+
+        group が同じジョブ（LED やスピーカーを使うデモなど）が動いていたら先に止める。
+        """
+        running = self.find(group) if group else None
+        if running:
+            self.cancel(running.id)
+        job = Job(self._next_id, name, group)
+        self._next_id += 1
+        self._forget_old()
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, func, args))
+        return job
+
+    def find(self, group):
+        """group のジョブが動いていればその Job を返す"""
+        for job in self.jobs.values():
+            if job.group == group and job.running():
+                return job
+        return None
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """ジョブを止める。止めたら True"""
+        job = self.jobs.get(job_id)
+        if job is None or not job.running():
+            return False
+        job.task.cancel()
+        job.finish(CANCELLED)
+        return True
+
+    async def _run(self, job, func, args):
+        try:
+            await func(*args)
+            job.finish(DONE)
+        except asyncio.CancelledError:
+            if job.running():
+                job.finish(CANCELLED)
+        except Exception as e:
+            print(f"ジョブ {job.name} でエラー:", e)
+            job.finish(FAILED, str(e))
+
+    def _forget_old(self):
+        """ジョブが多すぎるときは終わったジョブを古い順に忘れる"""
+        if len(self.jobs) < self.max_jobs:
+            return
+        for job_id in sorted(self.jobs):
+            if not self.jobs[job_id].running():
+                del self.jobs[job_id]
+                if len(self.jobs) < self.max_jobs:
+                    return
@@ -29,6 +29,7 @@ Author(s): Andreas Bühl, Kattni Rembor
 """
 
 import utime
+import asyncio
 from micropython import const
 
 
@@ -41,6 +42,8 @@ class AHT10:
     AHTX0_CMD_SOFTRESET = const(0xBA)  # Soft reset command
     AHTX0_STATUS_BUSY = const(0x80)  # Status bit for busy
     AHTX0_STATUS_CALIBRATED = const(0x08)  # Status bit for calibrated
+    AHTX0_CONVERSION_MS = const(80)  # Datasheet measurement time
+    AHTX0_POLL_MS = const(5)  # Poll interval while the sensor is still busy
 
     def __init__(self, i2c, address=AHTX0_I2CADDR_DEFAULT):
         utime.sleep_ms(20)  # 20ms delay to wake up
@@ -52,6 +55,8 @@ class AHT10:
             raise RuntimeError("Could not initialize")
         self._temp = None
         self._humidity = None
+        self._converting = False
+        self._error = None
 
     def reset(self):
         """Perform a soft-reset of the AHT"""
@@ -78,22 +83,89 @@ class AHT10:
 
     @property
     def relative_humidity(self):
-        """The measured relative humidity in percent."""
-        self._perform_measurement()
-        self._humidity = (
-            (self._buf[1] << 12) | (self._buf[2] << 4) | (self._buf[3] >> 4)
-        )
-        self._humidity = (self._humidity * 100) / 0x100000
+        """The measured relative humidity in percent.
+
+        Served from the last conversion; call :meth:`measure` to refresh."""
+        if self._humidity is None:
+            self.measure()
         return self._humidity
 
     @property
     def temperature(self):
-        """The measured temperature in degrees Celcius."""
-        self._perform_measurement()
-        self._temp = ((self._buf[3] & 0xF) << 16) | (self._buf[4] << 8) | self._buf[5]
-        self._temp = ((self._temp * 200.0) / 0x100000) - 50
+        """The measured temperature in degrees Celcius.
+
+        Served from the last conversion; call :meth:`measure` to refresh."""
+        if self._temp is None:
+            self.measure()
         return self._temp
 
+    def measure(self):
+        """Perform one conversion and update both temperature and humidity.
+
+        Waits the datasheet conversion time, then reads the status and data
+        together in one transfer (polling again only if still busy)."""
+        utime.sleep_ms(self.start_measurement())
+        while self.read_measurement() is None:
+            utime.sleep_ms(self.AHTX0_POLL_MS)
+
+    def read(self):
+        """Perform one conversion and return (temperature, relative_humidity)."""
+        self.measure()
+        return self._temp, self._humidity
+
+    async def read_async(self):
+        """Like :meth:`read`, but yields to the event loop during the conversion.
+
+        If another task is already waiting for a conversion, its result is shared
+        (and so is its error, if the conversion fails)."""
+        if self._converting:
+            while self._converting:
+                await asyncio.sleep_ms(self.AHTX0_POLL_MS)
+            if self._error:
+                raise self._error
+            return self._temp, self._humidity
+        self._converting = True
+        self._error = None
+        try:
+            self.start_measurement()
+            await asyncio.sleep_ms(self.AHTX0_CONVERSION_MS)
+            values = self.read_measurement()
+            while values is None:
+                await asyncio.sleep_ms(self.AHTX0_POLL_MS)
+                values = self.read_measurement()
+        except Exception as e:
+            self._error = e
+            raise
+        finally:
+            self._converting = False
+        return values
+
+    def start_measurement(self):
+        """Trigger a conversion without waiting for it.
+
+        Returns the conversion time in ms; call :meth:`read_measurement` after it."""
+        self._trigger_measurement()
+        return self.AHTX0_CONVERSION_MS
+
+    def read_measurement(self):
+        """Read a triggered conversion. Returns (temperature, relative_humidity),
+        or None if the sensor is still busy."""
+        # The status byte is the first byte of the measurement frame, so
+        # a single read both checks for completion and fetches the data.
+        self._read_to_buffer()
+        if self._buf[0] & self.AHTX0_STATUS_BUSY:
+            return None
+        self._convert_buffer()
+        return self._temp, self._humidity
+
+    def _convert_buffer(self):
+        """Convert the raw measurement buffer to temperature and humidity"""
+        buf = self._buf
+        humidity = (buf[1] << 12) | (buf[2] << 4) | (buf[3] >> 4)
+        self._humidity = (humidity * 100) / 0x100000
+        temp = ((buf[3] & 0xF) << 16) | (buf[4] << 8) | buf[5]
+        self._temp = ((temp * 200.0) / 0x100000) - 50
+
     def _read_to_buffer(self):
         """Read sensor data to buffer"""
         self._i2c.readfrom_into(self._address, self._buf)
@@ -23,6 +23,8 @@ try:
         BufferedCharacteristic,
         Descriptor,
         register_services,
+        set_capture_queue_limit,
+        capture_stats,
     )
 except:
     log_info("GATT server support disabled")
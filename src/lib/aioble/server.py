@@ -41,6 +41,44 @@ _FLAG_WRITE_CAPTURE = const(0x10000)
 
 _WRITE_CAPTURE_QUEUE_LIMIT = const(10)
 
+# Depth of the shared capture queue. Can be changed with
+# set_capture_queue_limit() before the first capture characteristic is
+# created.
+_capture_queue_limit = _WRITE_CAPTURE_QUEUE_LIMIT
+
+# Capture counters: writes captured, writes dropped because the queue was
+# full (the oldest queued write is discarded), and the deepest the queue
+# has been. Updated from the IRQ handler, so kept in a preallocated list.
+_CAPTURE_RECEIVED = const(0)
+_CAPTURE_DROPPED = const(1)
+_CAPTURE_MAX_DEPTH = const(2)
+_capture_counters = [0, 0, 0]
+
+
+def set_capture_queue_limit(limit):
+    global _capture_queue_limit
+    if hasattr(BaseCharacteristic, "_capture_queue"):
+        raise ValueError("Capture already initialised")
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    _capture_queue_limit = limit
+
+
+def capture_stats(reset=False):
+    stats = {
+        "limit": _capture_queue_limit,
+        "received": _capture_counters[_CAPTURE_RECEIVED],
+        "dropped": _capture_counters[_CAPTURE_DROPPED],
+        "max_depth": _capture_counters[_CAPTURE_MAX_DEPTH],
+        "depth": len(BaseCharacteristic._capture_queue)
+        if hasattr(BaseCharacteristic, "_capture_queue")
+        else 0,
+    }
+    if reset:
+        for i in range(len(_capture_counters)):
+            _capture_counters[i] = 0
+    return stats
+
 
 def _server_irq(event, data):
     if event == _IRQ_GATTS_WRITE:
@@ -107,7 +145,7 @@ class BaseCharacteristic:
         if hasattr(BaseCharacteristic, "_capture_queue"):
             return
 
-        BaseCharacteristic._capture_queue = deque((), _WRITE_CAPTURE_QUEUE_LIMIT)
+        BaseCharacteristic._capture_queue = deque((), _capture_queue_limit)
         BaseCharacteristic._capture_write_event = asyncio.ThreadSafeFlag()
         BaseCharacteristic._capture_consumed_event = asyncio.ThreadSafeFlag()
         BaseCharacteristic._capture_task = asyncio.create_task(
@@ -181,7 +219,14 @@ class BaseCharacteristic:
                 # value to the shared queue along with the matching characteristic object.
                 # The deque will enforce the max queue len.
                 data = characteristic.read()
-                BaseCharacteristic._capture_queue.append((conn, data, characteristic))
+                q = BaseCharacteristic._capture_queue
+                depth = len(q)
+                _capture_counters[_CAPTURE_RECEIVED] += 1
+                if depth >= _capture_queue_limit:
+                    _capture_counters[_CAPTURE_DROPPED] += 1
+                elif depth + 1 > _capture_counters[_CAPTURE_MAX_DEPTH]:
+                    _capture_counters[_CAPTURE_MAX_DEPTH] = depth + 1
+                q.append((conn, data, characteristic))
                 BaseCharacteristic._capture_write_event.set()
             else:
                 # Store the write connection handle to be later used to retrieve the data
@@ -23,10 +23,10 @@ class BH1750:
     MEASUREMENT_TIME_MIN = const(31)
     MEASUREMENT_TIME_MAX = const(254)
 
-    def __init__(self, i2c, address=35):
+    def __init__(self, i2c, address=35, measurement_mode=MEASUREMENT_MODE_ONE_TIME):
         self._address = address
         self._i2c = i2c
-        self._measurement_mode = BH1750.MEASUREMENT_MODE_ONE_TIME
+        self._measurement_mode = measurement_mode
         self._resolution = BH1750.RESOLUTION_HIGH
         self._measurement_time = BH1750.MEASUREMENT_TIME_DEFAULT
         
@@ -8,6 +8,10 @@ class BME280:
     t_fine = 0.0
     def __init__(self, i2c):
         self.i2c = i2c	#I2C(id1,scl=Pin(scl_pin),sda=Pin(sda_pin),freq=400000)
+        # 補正値はインスタンスごとに持つ（再初期化で値が積み重ならないように）
+        self.digT = []
+        self.digP = []
+        self.digH = []
         self.int280()
         self.get_calib_param()
     def int280(self):
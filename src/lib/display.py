@@ -0,0 +1,114 @@
+# Pcratch IoT OLED 表示の合成
+# 画面を名前付きの領域に分け、描画の要求を領域ごとに受け付ける。
+# 同じ領域への要求は最新のものだけを残し、画面への転送は 1 秒あたり max_fps 回までにまとめる。
+#
+#   display = Display(oled)
+#   asyncio.create_task(display.run())
+#   display.update("status", draw_status, "hello")   # 領域を消してから draw_status("hello") を呼ぶ
+#
+# run() のタスクがないときは update() のたびにすぐ描画して転送する。
+
+import time
+import asyncio
+
+DEFAULT_FPS = 10
+
+# 領域名 -> (x, y, 幅, 高さ)
+REGIONS = {
+    "screen": (0, 0, 128, 64),      # 画面全体
+    "status": (0, 0, 128, 10),      # 上 10 ドットのステータス表示
+    "body": (0, 10, 128, 54),       # ステータスより下
+    "icon_top": (0, 0, 8, 5),       # 5x5 アイコンの上 3 行
+    "icon_bottom": (0, 3, 8, 5),    # 5x5 アイコンの下 2 行
+}
+
+
+class Display:
+    """OLED への描画をまとめ、転送の回数を制限するクラス"""
+
+    def __init__(self, oled, max_fps=DEFAULT_FPS):
+        self.oled = oled
+        self.regions = dict(REGIONS)
+        self.interval_ms = 1000 // max_fps
+        self.running = False    # run() のタスクが動いているか
+        self.frames = 0         # 転送した回数
+        self.merged = 0         # 転送前に新しい要求で置き換えられた要求の数
+        self._hold = 0          # hold() の入れ子の深さ
+        self._pending = {}      # 領域名 -> (描画関数, 引数)
+        self._order = []        # 描画する順番（最後に要求された領域が最後）
+        self._last_flush = time.ticks_add(time.ticks_ms(), -self.interval_ms)
+        self._event = asyncio.Event()
+
+    def add_region(self, name, x, y, w, h):
+        self.regions[name] = (x, y, w, h)
+
+    def set_fps(self, max_fps):
+        self.interval_ms = 1000 // max_fps
+
+    def update(self, name, draw, *args):
+        """領域 name を消してから draw(*args) で描く要求を出す"""
+        if self.oled is None:
+            return
+        if name in self._pending:
+            self._order.remove(name)
+            self.merged += 1
+        self._pending[name] = (draw, args)
+        self._order.append(name)
+        if self.running:
+            self._event.set()
+        elif not self._hold:
+            self.flush()
+
+    def hold(self):
+        """release() まで転送しない（run() のタスクがないときのまとめ書き用）"""
+        self._hold += 1
+
+    def release(self):
+        self._hold -= 1
+        if not self._hold and self._order and not self.running:
+            self.flush()
+
+    def flush(self):
+        """たまっている要求を描いて画面に転送する"""
+        oled = self.oled
+        order = self._order
+        pending = self._pending
+        self._order = []
+        self._pending = {}
+        for name in order:
+            draw, args = pending[name]
+            x, y, w, h = self.regions[name]
+            oled.fill_rect(x, y, w, h, 0)
+            try:
+                draw(*args)
+            except Exception as e:
+                print(f"Error drawing {name}: {e}")
+        oled.show()
+        self._last_flush = time.ticks_ms()
+        self.frames += 1
+
+    def poll(self):
+        """転送してよい時刻なら転送する。次に転送できるまでの時間 (ms) を返す"""
+        if not self._order:
+            return 0
+        wait = self.interval_ms - time.ticks_diff(time.ticks_ms(), self._last_flush)
+        if wait > 0:
+            return wait
+        self.flush()
+        return 0
+
+    async def run(self):
+        """要求を待ち、max_fps を超えない間隔で転送するタスク"""
+        self.running = True
+        event = self._event
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+                wait = self.poll()
+                while wait > 0:
+                    # 待っている間に来た要求も次の転送にまとめる
+                    await asyncio.sleep_ms(wait)
+                    wait = self.poll()
+        finally:
+            self.running = False
@@ -0,0 +1,108 @@
+# Pcratch IoT シリアル用のフレーム
+# 中身の後ろに CRC-8 (多項式 0x07) を付けて COBS でエンコードし、0x00 で区切る。
+# COBS のデータには 0x00 が出てこないので、途中から読み始めても次の 0x00 で
+# フレームの先頭がわかる。print() の出力などが混ざっても CRC で捨てられる。
+#
+#   port.write(encode_frame(data))     # 0x00 + COBS(中身 + CRC) + 0x00
+#   decoder = FrameDecoder()
+#   for payload in decoder.feed(port.read(64)):
+#       ...
+# PC 側のツール (serialclient.py) も同じファイルを使う。
+
+MAX_PAYLOAD = 240   # BLE の COMMAND_MAX_LEN と同じ
+
+
+def _crc8_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+_CRC8 = _crc8_table()
+
+
+def crc8(data, crc=0):
+    for b in data:
+        crc = _CRC8[crc ^ b]
+    return crc
+
+
+def cobs_encode(data):
+    """0x00 を含まないバイト列にする（区切りの 0x00 は付けない）"""
+    out = bytearray(len(data) + len(data) // 254 + 2)
+    code_pos = 0
+    code = 1
+    n = 1
+    for b in data:
+        if b:
+            out[n] = b
+            n += 1
+            code += 1
+        if not b or code == 0xFF:
+            out[code_pos] = code
+            code_pos = n
+            n += 1
+            code = 1
+    out[code_pos] = code
+    return bytes(out[:n])
+
+
+def cobs_decode(data):
+    """cobs_encode() の逆。壊れていれば None"""
+    out = bytearray()
+    i = 0
+    end = len(data)
+    while i < end:
+        code = data[i]
+        if code == 0 or i + code > end:
+            return None
+        out.extend(data[i + 1:i + code])
+        i += code
+        if code < 0xFF and i < end:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_frame(data):
+    """中身 + CRC-8 を COBS にして前後に区切りの 0x00 を付ける
+
+    前にも 0x00 を付けるので、直前に print() の出力などがあってもそこで区切られる。
+    """
+    return b"\x00" + cobs_encode(bytes(data) + bytes((crc8(data),))) + b"\x00"
+
+
+class FrameDecoder:
+    """受け取ったバイト列からフレームの中身を取り出す"""
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.max_encoded = max_payload + max_payload // 254 + 3
+        self._buf = bytearray()
+        self._skip = False      # 長すぎるフレームを次の区切りまで読み捨てている
+        self.errors = 0
+
+    def feed(self, chunk):
+        """中身のリストを返す（CRC が合わないフレームは数えて捨てる）"""
+        frames = []
+        buf = self._buf
+        for b in chunk:
+            if b:
+                if len(buf) < self.max_encoded:
+                    buf.append(b)
+                else:
+                    self._skip = True
+                continue
+            if self._skip:
+                self.errors += 1
+            elif buf:
+                decoded = cobs_decode(buf)
+                if decoded and crc8(decoded[:-1]) == decoded[-1]:
+                    frames.append(decoded[:-1])
+                else:
+                    self.errors += 1
+            self._skip = False
+            self._buf = buf = bytearray()
+        return frames
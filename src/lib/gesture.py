@@ -0,0 +1,118 @@
+# Pcratch IoT ボタンのジェスチャー判定
+# ボタンのエッジ（押した・離した）とその時刻から DOWN / UP / CLICK / DOUBLE_CLICK /
+# LONG_CLICK / HOLD を判定する。HOLD は押したままの時間で決まるので、
+# run() のタスクが次の期限まで眠って判定する（定期的なポーリングはしない）。
+#
+#   gestures = GestureEngine(emit)          # emit(button_name, event_name, ticks)
+#   gestures.add_button('A')
+#   gestures.feed('A', True, ticks)         # 押した
+#   gestures.feed('A', False, ticks)        # 離した
+#   asyncio.create_task(gestures.run())
+
+import time
+import asyncio
+
+# ジェスチャーの判定時間 (ms)
+GESTURE_THRESHOLDS = {
+    "debounce_ms": 20,        # これより短い間隔のエッジはチャタリングとして無視する
+    "long_click_ms": 1000,    # これ以上押してから離すと LONG_CLICK
+    "hold_ms": 1500,          # 押したままこの時間が過ぎると HOLD（押している間に 1 回）
+    "double_click_ms": 300,   # CLICK からこの時間内にもう一度 CLICK すると DOUBLE_CLICK
+}
+
+
+class _Button:
+    def __init__(self):
+        self.pressed = False
+        self.edge_at = None       # 最後に受け付けたエッジの時刻
+        self.down_at = 0          # 押した時刻
+        self.click_at = None      # 最後の CLICK の時刻（DOUBLE_CLICK の判定用）
+        self.hold_at = None       # HOLD を出す時刻。出した後や離したときは None
+
+
+class GestureEngine:
+    """ボタンごとの状態を持ち、ジェスチャーを emit で通知するクラス"""
+
+    def __init__(self, emit, thresholds=None):
+        self.emit = emit
+        self.thresholds = dict(GESTURE_THRESHOLDS)
+        if thresholds:
+            self.thresholds.update(thresholds)
+        self.buttons = {}
+        self._wakeup = asyncio.Event()
+
+    def add_button(self, name):
+        self.buttons[name] = _Button()
+
+    def set_threshold(self, key, value):
+        self.thresholds[key] = value
+        self._wakeup.set()
+
+    def feed(self, name, pressed, ticks):
+        """ボタンのエッジを渡す。ticks はエッジの時刻 (ticks_ms)"""
+        button = self.buttons[name]
+        if pressed == button.pressed:
+            return
+        thresholds = self.thresholds
+        if button.edge_at is not None and time.ticks_diff(ticks, button.edge_at) < thresholds["debounce_ms"]:
+            return
+        button.edge_at = ticks
+        button.pressed = pressed
+        if pressed:
+            button.down_at = ticks
+            button.hold_at = time.ticks_add(ticks, thresholds["hold_ms"])
+            self.emit(name, "DOWN", ticks)
+            self._wakeup.set()
+            return
+
+        # 離したときは、期限を過ぎていた HOLD を先に出す
+        self._fire_hold(name, button, ticks)
+        button.hold_at = None
+        self.emit(name, "UP", ticks)
+        duration = time.ticks_diff(ticks, button.down_at)
+        if duration >= thresholds["long_click_ms"]:
+            button.click_at = None
+            self.emit(name, "LONG_CLICK", ticks)
+        elif button.click_at is not None and \
+                time.ticks_diff(ticks, button.click_at) <= thresholds["double_click_ms"]:
+            button.click_at = None
+            self.emit(name, "DOUBLE_CLICK", ticks)
+        else:
+            button.click_at = ticks
+            self.emit(name, "CLICK", ticks)
+
+    def _fire_hold(self, name, button, now):
+        if button.hold_at is not None and time.ticks_diff(now, button.hold_at) >= 0:
+            hold_at = button.hold_at
+            button.hold_at = None
+            self.emit(name, "HOLD", hold_at)
+
+    def check(self):
+        """期限が来た HOLD を出し、次の期限までの時間 (ms) を返す。期限がなければ None"""
+        now = time.ticks_ms()
+        wait = None
+        for name, button in self.buttons.items():
+            self._fire_hold(name, button, now)
+            if button.hold_at is not None:
+                remain = time.ticks_diff(button.hold_at, now)
+                if wait is None or remain < wait:
+                    wait = remain
+        return wait
+
+    async def run(self):
+        """HOLD の期限まで眠り、期限が来たら判定するタスク"""
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            try:
+                wait = self.check()
+            except Exception as e:
+                print(f"Error in gesture engine: {e}")
+                wait = None
+            if wait is None:
+                await wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for_ms(wakeup.wait(), max(1, wait))
+                except asyncio.TimeoutError:
+                    pass
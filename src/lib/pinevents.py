@@ -0,0 +1,91 @@
+# Pcratch IoT ピンイベントのリングバッファ
+# ピンの割り込みで記録し、asyncio のタスクで取り出して送信する。
+# 割り込み側はあらかじめ確保した bytearray に書き込むだけで、ヒープを使わない。
+#
+#   events = PinEventRing()
+#   pin.irq(handler=lambda pin: events.put(17, EVENT_RISE, time.ticks_ms()), hard=True)
+#   while True:
+#       await events.wait()
+#       events.drain(handler)
+#
+# 1 件のレコードは BLE の PIN_EVENT 通知と同じ 20 バイトの形式で、そのまま送信できる。
+#   [0] ピン番号  [1] イベント  [2:6] エッジの時刻 (ticks_ms, little endian)  [19] データ形式
+
+import asyncio
+from micropython import const
+
+RECORD_SIZE = const(20)
+DEFAULT_SIZE = const(32)
+
+EVENT_RISE = const(2)   # MbitMorePinEvent["RISE"]
+EVENT_FALL = const(3)   # MbitMorePinEvent["FALL"]
+PIN_EVENT_FORMAT = const(0x11)  # MbitMoreDataFormat["PIN_EVENT"]
+
+
+class PinEventRing:
+    """割り込みから書き込める固定長のイベントキュー"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.buffer = bytearray(size * RECORD_SIZE)
+        self.records = memoryview(self.buffer)
+        for i in range(size):
+            self.buffer[i * RECORD_SIZE + 19] = PIN_EVENT_FORMAT
+        self.flag = asyncio.ThreadSafeFlag()
+        # 位置は 0～2*size-1 で回し、満杯と空を区別する
+        self._wrap = 2 * size
+        self._head = 0      # 次に書き込む位置（割り込み側だけが更新する）
+        self._tail = 0      # 次に読み出す位置（タスク側だけが更新する）
+        self.count = 0      # 記録したイベントの数
+        self.overflow = 0   # バッファが一杯で記録できなかったイベントの数
+        self.max_depth = 0
+
+    def put(self, pin_index, event, ticks):
+        """イベントを記録する。割り込みから呼ぶのでメモリを確保しない"""
+        head = self._head
+        depth = (head - self._tail) % self._wrap
+        if depth >= self.size:
+            self.overflow += 1
+            self.flag.set()
+            return False
+        buffer = self.buffer
+        offset = (head % self.size) * RECORD_SIZE
+        buffer[offset] = pin_index
+        buffer[offset + 1] = event
+        buffer[offset + 2] = ticks & 0xFF
+        buffer[offset + 3] = (ticks >> 8) & 0xFF
+        buffer[offset + 4] = (ticks >> 16) & 0xFF
+        buffer[offset + 5] = (ticks >> 24) & 0xFF
+        # 読み出し側が見る位置はレコードを書き終えてから進める
+        self._head = (head + 1) % self._wrap
+        self.count += 1
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        self.flag.set()
+        return True
+
+    def __len__(self):
+        return (self._head - self._tail) % self._wrap
+
+    async def wait(self):
+        """イベントが記録されるまで待つ"""
+        if self._head == self._tail:
+            await self.flag.wait()
+
+    def drain(self, handler):
+        """記録されたイベントを古い順に handler(record) に渡す
+
+        record は 20 バイトの memoryview で、handler から戻ると次のイベントで上書きされる。
+        """
+        n = 0
+        while self._tail != self._head:
+            offset = (self._tail % self.size) * RECORD_SIZE
+            try:
+                handler(self.records[offset:offset + RECORD_SIZE])
+            finally:
+                self._tail = (self._tail + 1) % self._wrap
+            n += 1
+        return n
+
+    def stats(self):
+        return {"count": self.count, "overflow": self.overflow, "max_depth": self.max_depth}
@@ -0,0 +1,308 @@
+# Pcratch IoT 共有センサーレジストリ
+# I2C バスを起動時に一度だけ調べ、見つかったセンサーのドライバを使い回す。
+# 読み取りエラーが起きたドライバだけを作り直す。
+#
+#   from sensors import get_registry
+#   sensors = get_registry(i2c)
+#   temperature, humidity = sensors.read_temp_humi() or (0, 0)
+#
+# SensorSampler は各センサーの変換を同時に開始し、一番遅い変換の完了を
+# 待ってからまとめて結果を集める。結果は snapshot に保存されるので、
+# BLE 送信や OLED 表示は I2C を触らずに最新値を使える。
+#
+#   sampler = get_sampler(i2c)
+#   asyncio.create_task(sampler.run())   # asyncio のとき
+#   sampler.poll()                       # ループで呼ぶとき（待たずに戻る）
+#   sampler.snapshot["temperature"]
+
+import time
+import asyncio
+from micropython import const
+
+from ahtx0 import AHT20
+from bh1750 import BH1750
+
+AHT20_ADDR = const(0x38)
+BH1750_ADDR = const(0x23)
+BME280_ADDR = const(0x76)
+
+# 初期化に失敗したセンサーを再試行するまでの時間
+RETRY_MS = const(5000)
+# 変換がまだ終わっていないときに読み直すまでの時間
+BUSY_RETRY_MS = const(5)
+
+# センサーごとのサンプリング間隔 (ms)
+DEFAULT_INTERVALS = {
+    "illuminance": 250,    # BH1750 照度 4Hz
+    "temp_humi": 2000,     # AHT20 温度・湿度 0.5Hz
+    "bme280": 2000,        # BME280 気圧 0.5Hz
+}
+# チャネル名 -> SensorRegistry のドライバ名
+_DRIVERS = {
+    "illuminance": "bh1750",
+    "temp_humi": "aht20",
+    "bme280": "bme280",
+}
+
+_registries = {}
+_samplers = {}
+
+
+def get_registry(i2c):
+    """I2C バスごとに 1 つの SensorRegistry を返す"""
+    key = id(i2c)
+    if key not in _registries:
+        _registries[key] = SensorRegistry(i2c)
+    return _registries[key]
+
+
+def get_sampler(i2c, intervals=None):
+    """I2C バスごとに 1 つの SensorSampler を返す"""
+    key = id(i2c)
+    if key not in _samplers:
+        _samplers[key] = SensorSampler(get_registry(i2c), intervals)
+    return _samplers[key]
+
+
+class SensorRegistry:
+    """I2C センサーのドライバを保持し、エラー時だけ再初期化するクラス"""
+
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.aht20 = None
+        self.bh1750 = None
+        self.bme280 = None
+        self.present = []
+        self.errors = 0
+        self._retry_at = {}  # センサー名 -> 再初期化してよい時刻 (ticks_ms)
+        self.probe()
+
+    def probe(self):
+        """バスをスキャンして、存在するセンサーのドライバを作る"""
+        try:
+            self.present = self.i2c.scan()
+        except OSError as e:
+            print("I2C scan error:", e)
+            self.present = []
+        for name in ("aht20", "bh1750", "bme280"):
+            if self._address(name) in self.present:
+                self._init(name)
+
+    def _address(self, name):
+        if name == "aht20":
+            return AHT20_ADDR
+        if name == "bh1750":
+            return BH1750_ADDR
+        return BME280_ADDR
+
+    def _init(self, name):
+        """ドライバを作る。失敗したら RETRY_MS 後まで再試行しない"""
+        self._retry_at[name] = time.ticks_add(time.ticks_ms(), RETRY_MS)
+        try:
+            if name == "aht20":
+                self.aht20 = AHT20(self.i2c)
+            elif name == "bh1750":
+                # 連続測定モードにして、読むたびに測定を待たなくてよいようにする
+                self.bh1750 = BH1750(self.i2c, measurement_mode=BH1750.MEASUREMENT_MODE_CONTINUOUSLY)
+            else:
+                from bme280 import BME280
+                self.bme280 = BME280(self.i2c)
+            return True
+        except Exception as e:
+            print(f"Error initializing {name}: {e}")
+            return False
+
+    def _get(self, name):
+        """ドライバを返す。エラーで破棄されていれば再試行時刻を過ぎたときだけ作り直す"""
+        driver = getattr(self, name)
+        if driver is None and name in self._retry_at:
+            if time.ticks_diff(time.ticks_ms(), self._retry_at[name]) >= 0:
+                self._init(name)
+                driver = getattr(self, name)
+        return driver
+
+    def _failed(self, name, e):
+        """読み取りエラー。次の読み取りでドライバを作り直す"""
+        print(f"{name} sensor error: {e}")
+        self.errors += 1
+        setattr(self, name, None)
+        self._retry_at[name] = time.ticks_ms()
+
+    def read_temp_humi(self):
+        """AHT20 の (温度, 湿度) を返す。読めなければ None"""
+        aht20 = self._get("aht20")
+        if aht20 is None:
+            return None
+        try:
+            return aht20.read()
+        except Exception as e:
+            self._failed("aht20", e)
+            return None
+
+    async def read_temp_humi_async(self):
+        """read_temp_humi の asyncio 版"""
+        aht20 = self._get("aht20")
+        if aht20 is None:
+            return None
+        try:
+            return await aht20.read_async()
+        except Exception as e:
+            self._failed("aht20", e)
+            return None
+
+    def read_illuminance(self):
+        """BH1750 の照度 (lx) を返す。読めなければ None"""
+        bh1750 = self._get("bh1750")
+        if bh1750 is None:
+            return None
+        try:
+            return bh1750.measurement
+        except Exception as e:
+            self._failed("bh1750", e)
+            return None
+
+    def read_bme280(self):
+        """BME280 の (温度, 気圧, 湿度) を返す。読めなければ None"""
+        bme280 = self._get("bme280")
+        if bme280 is None:
+            return None
+        try:
+            return bme280.read_data()
+        except Exception as e:
+            self._failed("bme280", e)
+            return None
+
+
+class SensorSampler:
+    """センサーの変換を重ねて行い、最新値を snapshot に保持するクラス"""
+
+    def __init__(self, registry, intervals=None):
+        self.registry = registry
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.snapshot = {
+            "temperature": 0,
+            "humidity": 0,
+            "illuminance": 0,
+            "pressure": 0,
+        }
+        self.updated = {}   # snapshot のキー -> 更新時刻 (ticks_ms)
+        self.seq = 0        # snapshot が更新されるたびに増える
+        self._channels = {}  # 名前 -> 読み取り関数（ADC など待ち時間のないもの）
+        self._next = {}     # 名前 -> 次に開始する時刻 (ticks_ms)
+        self._pending = []  # 変換を開始して結果待ちのチャネル
+        self._deadline = 0
+
+    def add_channel(self, name, read, interval_ms):
+        """変換待ちのないチャネルを追加する。read() の戻り値を snapshot[name] に入れる"""
+        self._channels[name] = read
+        self.intervals[name] = interval_ms
+        self.snapshot[name] = 0
+
+    def set_interval(self, name, interval_ms):
+        """チャネルのサンプリング間隔を変更する"""
+        self.intervals[name] = interval_ms
+        self._next.pop(name, None)
+
+    def _store(self, key, value, now):
+        self.snapshot[key] = value
+        self.updated[key] = now
+
+    def _start(self, name):
+        """変換を開始し、結果が出るまでの時間 (ms) を返す。開始できなければ None"""
+        if name in self._channels:
+            return 0
+        registry = self.registry
+        if name == "temp_humi":
+            aht20 = registry._get("aht20")
+            if aht20 is None:
+                return None
+            try:
+                return aht20.start_measurement()
+            except Exception as e:
+                registry._failed("aht20", e)
+                return None
+        # BH1750（連続測定）と BME280（ノーマルモード）は常に変換しているので待たない
+        if registry._get(_DRIVERS[name]) is None:
+            return None
+        return 0
+
+    def _collect(self, name, now):
+        """結果を読み取る。変換中でまだ読めなければ False を返す"""
+        if name in self._channels:
+            self._store(name, self._channels[name](), now)
+            return True
+        registry = self.registry
+        if name == "temp_humi":
+            aht20 = registry.aht20
+            if aht20 is None:
+                return True
+            try:
+                values = aht20.read_measurement()
+            except Exception as e:
+                registry._failed("aht20", e)
+                return True
+            if values is None:
+                return False
+            self._store("temperature", values[0], now)
+            self._store("humidity", values[1], now)
+        elif name == "illuminance":
+            lux = registry.read_illuminance()
+            if lux is not None:
+                self._store("illuminance", lux, now)
+        elif name == "bme280":
+            values = registry.read_bme280()
+            if values is not None:
+                self._store("pressure", values[1], now)
+        return True
+
+    def poll(self):
+        """待たずに 1 ステップ進める。次に呼ぶべきまでの時間 (ms) を返す"""
+        now = time.ticks_ms()
+        if self._pending:
+            wait = time.ticks_diff(self._deadline, now)
+            if wait > 0:
+                return wait
+            still_busy = []
+            for name in self._pending:
+                if not self._collect(name, now):
+                    still_busy.append(name)
+            self.seq += 1
+            self._pending = still_busy
+            if still_busy:
+                self._deadline = time.ticks_add(now, BUSY_RETRY_MS)
+                return BUSY_RETRY_MS
+
+        # 期限が来たチャネルの変換をまとめて開始する
+        longest = -1
+        next_wait = 1000
+        for name, interval in self.intervals.items():
+            due = self._next.get(name, now)
+            wait = time.ticks_diff(due, now)
+            if wait > 0:
+                next_wait = min(next_wait, wait)
+                continue
+            self._next[name] = time.ticks_add(now, interval)
+            next_wait = min(next_wait, interval)
+            conversion = self._start(name)
+            if conversion is None:
+                continue
+            self._pending.append(name)
+            longest = max(longest, conversion)
+        if longest < 0:
+            return next_wait
+        self._deadline = time.ticks_add(now, longest)
+        if longest == 0:
+            return self.poll()
+        return longest
+
+    async def run(self):
+        """サンプリングを続けるタスク"""
+        while True:
+            try:
+                wait = self.poll()
+            except Exception as e:
+                print(f"Error in sensor sampler: {e}")
+                wait = 1000
+            await asyncio.sleep_ms(max(1, wait))
@@ -24,6 +24,9 @@ SET_PRECHARGE = const(0xD9)
 SET_VCOM_DESEL = const(0xDB)
 SET_CHARGE_PUMP = const(0x8D)
 
+# 変更されたバイト数が画面全体のこの割合 (%) を超えたら、全体を 1 回で送る
+FULL_FLUSH_PERCENT = const(75)
+
 
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
@@ -35,6 +38,14 @@ class SSD1306(framebuf.FrameBuffer):
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        # 前回の show() から変更されたページごとの列の範囲 (lo > hi なら変更なし)
+        self._dirty_lo = bytearray(self.pages)
+        self._dirty_hi = bytearray(self.pages)
+        # 表示側の RAM に送った内容。変更がなかった列は送らない
+        self._sent = bytearray(len(self.buffer))
+        self.bytes_sent = 0     # show() で送ったデータのバイト数
+        self._full = True       # 表示側の RAM の内容がわからないので、最初は全体を送る
+        self._clear_dirty()
         self.init_display()
 
     def init_display(self):
@@ -93,9 +104,92 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
         self.write_cmd(SET_SEG_REMAP | (rotate & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    # 変更された範囲を記録する。引数を省略すると画面全体
+    def mark_dirty(self, x=0, y=0, w=None, h=None):
+        if w is None:
+            w = self.width - x
+        if h is None:
+            h = self.height - y
+        if x < 0:
+            w += x
+            x = 0
+        if y < 0:
+            h += y
+            y = 0
+        x1 = min(x + w, self.width) - 1
+        y1 = min(y + h, self.height) - 1
+        if x1 < x or y1 < y:
+            return
+        lo = self._dirty_lo
+        hi = self._dirty_hi
+        for page in range(y >> 3, (y1 >> 3) + 1):
+            if lo[page] > hi[page]:
+                lo[page] = x
+                hi[page] = x1
+            else:
+                if x < lo[page]:
+                    lo[page] = x
+                if x1 > hi[page]:
+                    hi[page] = x1
+
+    def _clear_dirty(self):
+        for page in range(self.pages):
+            self._dirty_lo[page] = 1
+            self._dirty_hi[page] = 0
+
+    # 描画メソッドは変更範囲を記録してから FrameBuffer の描画を行う
+    def fill(self, c):
+        self.mark_dirty()
+        super().fill(c)
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        self.mark_dirty(x, y, 1, 1)
+        super().pixel(x, y, c)
+
+    def hline(self, x, y, w, c):
+        self.mark_dirty(x, y, w, 1)
+        super().hline(x, y, w, c)
+
+    def vline(self, x, y, h, c):
+        self.mark_dirty(x, y, 1, h)
+        super().vline(x, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        self.mark_dirty(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+        super().line(x1, y1, x2, y2, c)
+
+    def rect(self, x, y, w, h, c, *args):
+        self.mark_dirty(x, y, w, h)
+        super().rect(x, y, w, h, c, *args)
+
+    def fill_rect(self, x, y, w, h, c):
+        self.mark_dirty(x, y, w, h)
+        super().fill_rect(x, y, w, h, c)
+
+    def ellipse(self, x, y, xr, yr, c, *args):
+        self.mark_dirty(x - xr, y - yr, 2 * xr + 1, 2 * yr + 1)
+        super().ellipse(x, y, xr, yr, c, *args)
+
+    def poly(self, x, y, coords, c, *args):
+        self.mark_dirty()
+        super().poly(x, y, coords, c, *args)
+
+    def text(self, s, x, y, c=1):
+        self.mark_dirty(x, y, 8 * len(s), 8)
+        super().text(s, x, y, c)
+
+    def blit(self, fbuf, x, y, *args):
+        # 元の大きさがわからないときは (x, y) から右下をすべて変更済みにする
+        self.mark_dirty(x, y, getattr(fbuf, "width", None), getattr(fbuf, "height", None))
+        super().blit(fbuf, x, y, *args)
+
+    def scroll(self, xstep, ystep):
+        self.mark_dirty()
+        super().scroll(xstep, ystep)
+
+    def _set_window(self, x0, x1, page0, page1):
         if self.width != 128:
             # narrow displays use centred columns
             col_offset = (128 - self.width) // 2
@@ -105,9 +199,69 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(x0)
         self.write_cmd(x1)
         self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(page0)
+        self.write_cmd(page1)
+
+    def write_data_list(self, bufs):
+        for buf in bufs:
+            self.write_data(buf)
+
+    def show(self, full=False):
+        """変更されたページと列の範囲だけを送る。変更が多いときは画面全体を送る"""
+        full = full or self._full
+        self._full = False
+        width = self.width
+        buffer = self.buffer
+        sent = self._sent
+        lo = self._dirty_lo
+        hi = self._dirty_hi
+        windows = []    # (ページ, 開始列, 終了列)
+        total = 0
+        if not full:
+            for page in range(self.pages):
+                x0 = lo[page]
+                x1 = hi[page]
+                if x0 > x1:
+                    continue
+                # 表示中の内容と同じ列を両端から除く
+                base = page * width
+                while x0 <= x1 and buffer[base + x0] == sent[base + x0]:
+                    x0 += 1
+                while x1 >= x0 and buffer[base + x1] == sent[base + x1]:
+                    x1 -= 1
+                if x0 <= x1:
+                    windows.append((page, x0, x1))
+                    total += x1 - x0 + 1
+            full = total > len(buffer) * FULL_FLUSH_PERCENT // 100
+        self._clear_dirty()
+        if full:
+            self._set_window(0, width - 1, 0, self.pages - 1)
+            self.write_data(buffer)
+            sent[:] = buffer
+            self.bytes_sent += len(buffer)
+            return
+
+        # 続いているページは列の範囲をまとめて 1 つのウィンドウで送る
+        mv = memoryview(buffer)
+        i = 0
+        while i < len(windows):
+            page0, x0, x1 = windows[i]
+            j = i + 1
+            while j < len(windows) and windows[j][0] == windows[j - 1][0] + 1:
+                x0 = min(x0, windows[j][1])
+                x1 = max(x1, windows[j][2])
+                j += 1
+            page1 = windows[j - 1][0]
+            self._set_window(x0, x1, page0, page1)
+            bufs = []
+            for page in range(page0, page1 + 1):
+                start = page * width + x0
+                end = page * width + x1 + 1
+                bufs.append(mv[start:end])
+                sent[start:end] = mv[start:end]
+                self.bytes_sent += end - start
+            self.write_data_list(bufs)
+            i = j
 
 
 class SSD1306_I2C(SSD1306):
@@ -127,6 +281,10 @@ class SSD1306_I2C(SSD1306):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
 
+    def write_data_list(self, bufs):
+        # 複数ページのデータを 1 回の I2C 転送で送る
+        self.i2c.writevto(self.addr, [self.write_list[0]] + bufs)
+
 
 class SSD1306_SPI(SSD1306):
     def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
@@ -0,0 +1,86 @@
+# Pcratch IoT 共有 Wi-Fi スキャン
+# スキャン結果を SSID ごとに 1 つにまとめ（一番強い RSSI を残す）、強い順に並べて
+# SCAN_TTL_MS の間キャッシュする。STA を止めたり入れ直したりせずにスキャンするので、
+# 接続中のリンクは切れない。Web の設定ページと growlog のメニューで同じ結果を使う。
+#
+#   from wifiscan import get_scanner
+#   scanner = get_scanner()
+#   scanner.networks                 # キャッシュ [(ssid, bssid, channel, RSSI, security, hidden)]
+#   scanner.scan_now()               # ループで呼ぶとき（TTL 内ならスキャンしない）
+#   await scanner.scan(force=True)   # asyncio のとき
+#
+# WLAN.scan() は終わるまで（1〜2 秒）戻らない。asyncio では scan() がいったん
+# 呼び出し元に戻ってからスキャンするので、HTTP の応答などは先に送られる。
+import time
+import asyncio
+import network
+
+SCAN_TTL_MS = 60000     # この間は前回の結果を使う
+
+_scanner = None
+
+
+def get_scanner(sta=None):
+    """1 つの WifiScanner を返す（Web サーバーとメニューで共有）"""
+    global _scanner
+    if _scanner is None:
+        _scanner = WifiScanner(sta or network.WLAN(network.STA_IF))
+    return _scanner
+
+
+class WifiScanner:
+    """Wi-Fi のスキャン結果をまとめてキャッシュするクラス"""
+
+    def __init__(self, sta, ttl_ms=SCAN_TTL_MS):
+        self.sta = sta
+        self.ttl_ms = ttl_ms
+        self.networks = []      # SSID ごとに 1 つ、RSSI の強い順
+        self.scanned = None     # 最後にスキャンした時刻 (ticks_ms)
+        self.version = 0        # 結果が変わるたびに増える（表示の作り直しの判定用）
+        self.scans = 0
+
+    def fresh(self):
+        """キャッシュが TTL 内なら True"""
+        return self.scanned is not None and time.ticks_diff(time.ticks_ms(), self.scanned) < self.ttl_ms
+
+    def scan_now(self, force=False):
+        """キャッシュが古ければスキャンして結果を返す。失敗したら前回の結果を返す"""
+        if self.fresh() and not force:
+            return self.networks
+        sta = self.sta
+        was_active = sta.active()
+        try:
+            if not was_active:
+                sta.active(True)
+            found = sta.scan()
+        except OSError as e:
+            # 接続の途中などはスキャンできない
+            print("Wi-Fiスキャンに失敗:", e)
+            return self.networks
+        finally:
+            if not was_active:
+                sta.active(False)
+        self.scans += 1
+        self.scanned = time.ticks_ms()
+        self._update(found)
+        return self.networks
+
+    async def scan(self, force=False):
+        """scan_now() の asyncio 版"""
+        if self.fresh() and not force:
+            return self.networks
+        await asyncio.sleep_ms(0)
+        return self.scan_now(force)
+
+    def _update(self, found):
+        best = {}
+        for net in found:
+            ssid = net[0]
+            if not ssid:
+                continue    # SSID を隠しているネットワーク
+            if ssid not in best or net[3] > best[ssid][3]:
+                best[ssid] = net
+        networks = sorted(best.values(), key=lambda net: net[3], reverse=True)
+        if [net[0] for net in networks] != [net[0] for net in self.networks]:
+            self.version += 1
+        self.networks = networks
@@ -1,8 +1,9 @@
 # ESP32C6 pcratch-IoT v1.5.1.3
 import asyncio
-import _thread
 from ble_conn import BLEConnection
-from iotdevice import Device
+from ws_conn import WebSocketConnection
+from serial_conn import SerialConnection
+from iotdevice import Device, StatePublisher
 from hardware import Hardware
 from server import IoTServer  # 作成したモジュールをインポート
 
@@ -11,6 +12,13 @@ class IoTManager:
     def __init__(self):
         self.ble_conn = BLEConnection()
         self.device = Device(self.ble_conn)
+        # Wi-Fi の WebSocket (/ws) でも同じコマンドと通知をやりとりする
+        self.ws_conn = WebSocketConnection(self.queue_command)
+        self.device.add_link(self.ws_conn)
+        # USB シリアルでも同じコマンドと通知をやりとりする (route=1)
+        self.serial_conn = SerialConnection(self.queue_command)
+        self.device.add_link(self.serial_conn)
+        self.publisher = StatePublisher(self.device)
         self.hardware = Hardware()
         self.connected_displayed = False
         self.temp_data = []
@@ -22,10 +30,17 @@ class IoTManager:
         self.colors3 = []
         self.music = []
         self.demo_handlers = {}  # デモハンドラーを格納する辞書
+        self.demo_task = None   # 実行中のデモ
+        asyncio.create_task(self.hardware.sampler.run())
+        asyncio.create_task(self.hardware.display.run())
+        asyncio.create_task(self.hardware.pin_event_task())
+        asyncio.create_task(self.device.gestures.run())
         asyncio.create_task(self.ble_conn.motion_task())
         asyncio.create_task(self.ble_conn.peripheral_task())
+        asyncio.create_task(self.ble_conn.notify_task())
         asyncio.create_task(self.sensor_task())
-        asyncio.create_task(self.ble_conn.command_task(self.device.do_command))
+        asyncio.create_task(self.ble_conn.command_task(self.device.do_command, self.device.command_key))
+        asyncio.create_task(self.serial_conn.serial_task())
 
     # センサーの値をOLEDに表示
     def disp_sensor_value(self):
@@ -38,20 +53,14 @@ class IoTManager:
                 self.hardware.show_text(self.hardware.ssid[-16:])
                 self.connected_displayed = False
 
-            # 温度、湿度を取得
-            temperature, humidity = self.hardware.temp_humi()
-            light_level = self.hardware.get_light_level()
+            # 温度、湿度を取得（サンプラーの最新値）
+            snapshot = self.hardware.sensor_snapshot()
+            temperature = snapshot["temperature"]
+            humidity = snapshot["humidity"]
+            light_level = snapshot["light"]
 
-            # OLED 128 x 64
-            t = 6
-            hardware = self.hardware
-            hardware.oled.fill_rect(0, 10, hardware.oled.width, hardware.oled.height - 10, 0)
-            hardware.oled.text( "Temp: {:.1f}C".format(temperature), 0, t+10)
-            hardware.oled.text( "Humi: {:.1f}%".format(humidity), 0, t+20)
-            hardware.oled.text( "Ligh: {:.1f}".format(light_level), 0, t+30)   # 照度センサーの値
-            hardware.oled.text( "A0  : {:.1f}".format(hardware.human_sensor()), 0, t+40)
-            hardware.oled.text(f"  {hardware.version}-{hardware.hw_version}", 0, t+50)
-            hardware.oled.show()
+            self.hardware.display.update("body", self.draw_sensor_value,
+                                         temperature, humidity, light_level, self.hardware.human_sensor())
 
         # ホストと未接続なら、デモができる
         if not self.ble_conn.connection:
@@ -61,14 +70,36 @@ class IoTManager:
             elif self.hardware.leftbtn.value() == 1:
                 demo_name = "PIN18"
             if demo_name in self.demo_handlers:
-                self.demo_handlers[demo_name]()
+                # デモは非同期で動かし、終わるまで次のデモは始めない
+                if self.demo_task is None or self.demo_task.done():
+                    self.demo_task = asyncio.create_task(self.demo_handlers[demo_name]())
 
-    # センサーの値を 250ms 毎に送信
+    # OLED 128 x 64 の上 10 ドットより下にセンサーの値を描く
+    def draw_sensor_value(self, temperature, humidity, light_level, human):
+        t = 6
+        hardware = self.hardware
+        hardware.oled.text( "Temp: {:.1f}C".format(temperature), 0, t+10)
+        hardware.oled.text( "Humi: {:.1f}%".format(humidity), 0, t+20)
+        hardware.oled.text( "Ligh: {:.1f}".format(light_level), 0, t+30)   # 照度センサーの値
+        hardware.oled.text( "A0  : {:.1f}".format(human), 0, t+40)
+        hardware.oled.text(f"  {hardware.version}-{hardware.hw_version}", 0, t+50)
+
+    # センサーの値が変化したとき（と一定間隔ごと）に送信
     async def sensor_task(self):
+        publisher = self.publisher
         while True:
-            if self.ble_conn.connection:  # BLE接続がある場合
-                self.device.send_sensor_value()
-            await asyncio.sleep_ms(250)
+            if self.ble_conn.connection or self.ws_conn.connection or self.serial_conn.connection:
+                publisher.poll()
+            else:
+                publisher.reset()
+            await asyncio.sleep_ms(publisher.poll_ms)
+
+    # WebSocket やシリアルで届いたコマンドも BLE と同じキューに入れて順に実行する
+    async def queue_command(self, data):
+        if self.ble_conn.commands is not None:
+            await self.ble_conn.commands.put(data)
+        else:
+            await self.device.do_command(data)
 
     def register_demo_handler(self, demo_name, demo_handler):
         self.demo_handlers[demo_name] = demo_handler
@@ -76,8 +107,9 @@ class IoTManager:
 async def main():
     # インスタンスの作成と使用例
     iot_manager = IoTManager()
-    server = IoTServer()  # HTTPサーバーをバックグラウンドスレッドで実行
-    _thread.start_new_thread(server.start_http_server, ())
+    server = IoTServer()  # HTTPサーバーを同じイベントループで実行
+    iot_manager.ws_conn.register_routes(server)
+    asyncio.create_task(server.start_http_server())
     iot_manager.register_demo_handler("PIN17", server.np_led_demo)
     iot_manager.register_demo_handler("PIN18", server.user_led_demo)
 
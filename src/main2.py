@@ -1,6 +1,5 @@
 # ESP32C6 pcratch-IoT v1.4.0
 import asyncio
-import _thread
 
 from weather import Weather
 from ntpclock import Clock
@@ -12,12 +11,14 @@ from server import IoTServer  # 作成したモジュールをインポート
 # アプリ実行
 async def app():
     hardware = Hardware()
-    default_ssid, default_password, default_main_module = hardware.get_wifi_config()
-    hardware.oled.fill(0)
-    hardware.oled.text(default_ssid, 0, 16)
-    hardware.oled.text(default_password, 0, 26)
-    hardware.oled.text(default_main_module, 0, 36)
-    hardware.oled.show()
+    server = IoTServer()  # HTTPサーバーを同じイベントループで実行
+    asyncio.create_task(server.start_http_server())
+    default_ssid, default_password, default_main_module, _ = hardware.get_wifi_config()
+    def draw_config():
+        hardware.oled.text(default_ssid, 0, 16)
+        hardware.oled.text(default_password, 0, 26)
+        hardware.oled.text(default_main_module, 0, 36)
+    hardware.display.update("screen", draw_config)
 
     print('wifi_sta_active...')
     wlan = hardware.wifi_sta_active()
@@ -31,8 +32,9 @@ async def app():
             await asyncio.sleep(0.4)
         print('WiFi connected:', wlan.ifconfig())
 
-        weather = Weather(hardware.oled)
-        ntpclock = Clock(hardware.oled)
+        weather = Weather(hardware.display)
+        weather.register_routes(server)
+        ntpclock = Clock(hardware.display)
         print('時計合わせ...')
         await ntpclock.get_ntptime()
         print('天気予報取得...')
@@ -41,13 +43,11 @@ async def app():
 
         while True:
             for _ in range(10):
-                temperature = hardware.aht20.temperature
-                humidity = hardware.aht20.relative_humidity
+                temperature, humidity = await hardware.temp_humi_async()
                 ntpclock.display_time(temperature, humidity)
                 await asyncio.sleep(1)
             for _ in range(10):
-                temperature = hardware.aht20.temperature
-                humidity = hardware.aht20.relative_humidity
+                temperature, humidity = await hardware.temp_humi_async()
                 weather.display_weather(temperature, humidity)
                 await asyncio.sleep(1)
     except OSError as e:
@@ -64,14 +64,7 @@ def print_memory_usage():
     print("Allocated memory: {} bytes".format(allocated_memory))
     print("Total memory: {} bytes".format(total_memory))
 
-# サーバーをバックグラウンドスレッドで実行
-def server_thread():
-    # time.sleep(10)  # スレッドの初期化を待つ
-    server = IoTServer()
-    server.start_http_server()  # HTTPサーバーを起動
-
 def main():
-    _thread.start_new_thread(server_thread, ())
     asyncio.run(app())
 
 main()
\ No newline at end of file
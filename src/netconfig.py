@@ -1,4 +1,5 @@
 # ESP32C6 pcratch-IoT v1.4.0
+import asyncio
 from server import IoTServer
 from hardware import Hardware
 
@@ -7,4 +8,4 @@ if __name__ == "__main__":
     ssid = hardware.get_wifi_ap_ssid()  # Wi-Fiを起動準備してssidを取得
     hardware.show_text(ssid)  # 接続完了メッセージを表示
     server = IoTServer()
-    server.start_http_server()  # HTTPサーバーを起動（関数から戻らない）
+    asyncio.run(server.start_http_server())  # HTTPサーバーを起動（関数から戻らない）
@@ -8,8 +8,9 @@ import asyncio
 days_of_week = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 class Clock:
-    def __init__(self, oled):
-        self.oled = oled
+    def __init__(self, display):
+        self.display = display
+        self.oled = display.oled
 
     async def get_ntptime(self):
         async def set_time():
@@ -33,14 +34,13 @@ class Clock:
         formatted_time = "{:02}:{:02}:{:02}".format(current_time[3], current_time[4], current_time[5])
         formatted_temp = "{:5.1f}C {:5.1f}%".format(temperature, humidity)
 
-        # 上10ドットをそのままにして、下の部分だけ書き直す
-        if self.oled:
-            self.oled.fill_rect(0, 0, self.oled.width, self.oled.height - 0, 0)
-            self.oled.text(formatted_date, 0, 0)
-            self.draw_text_double_size(formatted_time, 0, 30)
-            self.oled.line(0, 50, 127, 50, 1)
-            self.oled.text(formatted_temp, 0, 54)
-            self.oled.show()
+        self.display.update("screen", self.draw_time, formatted_date, formatted_time, formatted_temp)
+
+    def draw_time(self, formatted_date, formatted_time, formatted_temp):
+        self.oled.text(formatted_date, 0, 0)
+        self.draw_text_double_size(formatted_time, 0, 30)
+        self.oled.line(0, 50, 127, 50, 1)
+        self.oled.text(formatted_temp, 0, 54)
 
     def draw_text_double_size(self, text, x, y):
         temp_buf = bytearray(8 * 8 // 8)  # 8x8のビットマップ用バッファ
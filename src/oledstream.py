@@ -0,0 +1,93 @@
+# ESP32C6 pcratch-IoT
+# OLED の表示をブラウザに流す (Server-Sent Events)
+# 前のフレームから変わったページ（縦 8 ドット）の列の範囲だけを送る。
+#
+# 1 つのイベントは変わったページごとに 1 行の data を持つ。
+#   data: <ページ> <開始列> <MONO_VLSB の列データを base64>
+# 最初のフレームは全ページを送る。
+import time
+import binascii
+
+MIN_INTERVAL_MS = 100       # 最短のフレーム間隔 (10fps)
+MAX_INTERVAL_MS = 2000      # 送信が遅いクライアントでの最長のフレーム間隔
+KEEPALIVE_MS = 15000        # 変化がなくてもこの間隔でコメントを送り、切断を検出する
+
+SSE_HEADER = (b"HTTP/1.1 200 OK\r\n"
+              b"Content-Type: text/event-stream\r\n"
+              b"Cache-Control: no-store\r\n"
+              b"Connection: close\r\n\r\n"
+              b"retry: 2000\n\n")
+
+
+class OledStream:
+    """OLED の変化を SSE のイベントにするクラス（接続ごとに 1 つ作る）"""
+
+    def __init__(self, oled, min_interval_ms=MIN_INTERVAL_MS):
+        self.oled = oled
+        self.min_interval_ms = min_interval_ms
+        self.interval_ms = min_interval_ms
+        self._sent = bytearray(len(oled.buffer))   # クライアントに送った内容
+        self._first = True
+        self._bytes_sent = -1   # oled.bytes_sent が変わっていなければ画面は変わっていない
+        self._last_event = time.ticks_ms()
+        self.frames = 0
+        self.bytes = 0
+
+    def frame(self):
+        """変わったページのイベントを返す。変化がなければ None"""
+        oled = self.oled
+        if oled.bytes_sent == self._bytes_sent and not self._first:
+            return None
+        self._bytes_sent = oled.bytes_sent
+        width = oled.width
+        buffer = oled.buffer
+        sent = self._sent
+        lines = []
+        for page in range(oled.pages):
+            start = page * width
+            end = start + width
+            if not self._first and buffer[start:end] == sent[start:end]:
+                continue
+            x0 = start
+            x1 = end - 1
+            if not self._first:
+                while buffer[x0] == sent[x0]:
+                    x0 += 1
+                while buffer[x1] == sent[x1]:
+                    x1 -= 1
+            data = buffer[x0:x1 + 1]
+            sent[x0:x1 + 1] = data
+            lines.append(b"data: %d %d " % (page, x0 - start))
+            lines.append(binascii.b2a_base64(data))    # 末尾に改行が付く
+        self._first = False
+        if not lines:
+            return None
+        lines.append(b"\n")
+        self._last_event = time.ticks_ms()
+        return b"".join(lines)
+
+    def keepalive(self):
+        """しばらく送っていなければコメント行を返す"""
+        if time.ticks_diff(time.ticks_ms(), self._last_event) < KEEPALIVE_MS:
+            return None
+        self._last_event = time.ticks_ms()
+        return b": ping\n\n"
+
+    def sent(self, size, elapsed_ms):
+        """送信にかかった時間からフレーム間隔を調整する"""
+        self.frames += 1
+        self.bytes += size
+        # 送信に時間がかかるクライアントには、その 4 倍の間隔で送る
+        target = max(self.min_interval_ms, min(MAX_INTERVAL_MS, elapsed_ms * 4))
+        if target > self.interval_ms:
+            self.interval_ms = target
+        else:
+            # 速くなったら少しずつ戻す
+            self.interval_ms = max(target, self.interval_ms * 3 // 4)
+
+    def next_event(self):
+        """送るべきイベントを返す（フレームかキープアライブ）。なければ None"""
+        event = self.frame()
+        if event is None:
+            event = self.keepalive()
+        return event
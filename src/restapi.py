@@ -0,0 +1,151 @@
+# ESP32C6 pcratch-IoT
+# センサーと出力の JSON API
+# 読み取りはサンプラーの snapshot を使い、ここでは I2C を触らない。
+# /api/sensors の JSON は snapshot が変わったとき（sampler.seq が進んだとき）だけ作り直す。
+#
+#   GET  /api/sensors   {"seq":12,"temperature":24.5,"humidity":40.1,...}
+#   GET  /api/state     ボタン、人感センサー、API で設定した出力
+#   POST /api/pin       {"pin":19,"value":1} または {"pin":19,"analog":512}
+#   POST /api/pixel     {"n":0,"r":100,"g":0,"b":0}   （0〜100）
+#   POST /api/tone      {"freq":440,"ms":500}          （freq が 0 なら止める）
+#   POST /api/text      {"text":"hello"}
+import json
+import asyncio
+from httpreq import HttpError
+
+MAX_BODY_BYTES = 256
+OUTPUT_PINS = (1, 15, 19, 20)   # digital_out / analog_out が使えるピン
+PIXELS = 2
+
+_JSON_HEADER = (b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Cache-Control: no-store\r\n"
+                b"Content-Length: %d\r\n\r\n")
+_OK = _JSON_HEADER % 11 + b'{"ok":true}'
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _int(params, name, low, high):
+    """params[name] を low〜high の整数にする。なければ、範囲外なら 400"""
+    try:
+        value = int(params[name])
+    except (KeyError, TypeError, ValueError):
+        raise HttpError("400 Bad Request", "bad " + name)
+    if not low <= value <= high:
+        raise HttpError("400 Bad Request", "bad " + name)
+    return value
+
+
+class RestApi:
+    """/api/* のハンドラー"""
+
+    def __init__(self, hardware):
+        self.hardware = hardware
+        self.outputs = {}       # ピン -> API で設定した値
+        self.pixels = [[0, 0, 0] for _ in range(PIXELS)]
+        self.tone = 0
+        self._tone_task = None
+        self._sensors_seq = -1
+        self._sensors_response = None
+
+    def register_routes(self, server):
+        server.add_route("GET", "/api/sensors", self.route_sensors)
+        server.add_route("GET", "/api/state", self.route_state)
+        server.add_route("POST", "/api/pin", self.route_pin)
+        server.add_route("POST", "/api/pixel", self.route_pixel)
+        server.add_route("POST", "/api/tone", self.route_tone)
+        server.add_route("POST", "/api/text", self.route_text)
+
+    async def read_json(self, request):
+        try:
+            params = json.loads(await request.read_body(MAX_BODY_BYTES))
+        except ValueError:
+            raise HttpError("400 Bad Request", "bad json")
+        if not isinstance(params, dict):
+            raise HttpError("400 Bad Request", "bad json")
+        return params
+
+    def sensors_response(self):
+        """/api/sensors のレスポンス（ヘッダー込み）。snapshot が変わったときだけ作る"""
+        sampler = self.hardware.sampler
+        if sampler.seq != self._sensors_seq:
+            values = {"seq": sampler.seq}
+            for key, value in sampler.snapshot.items():
+                values[key] = round(value, 2) if isinstance(value, float) else value
+            body = _dumps(values)
+            self._sensors_response = _JSON_HEADER % len(body) + body
+            self._sensors_seq = sampler.seq
+        return self._sensors_response
+
+    async def route_sensors(self, writer, request):
+        writer.write(self.sensors_response())
+
+    async def route_state(self, writer, request):
+        hardware = self.hardware
+        body = _dumps({
+            "left": hardware.leftbtn.value(),
+            "right": hardware.PIN17.value(),
+            "human": hardware.human_sensor(),
+            "led": hardware.PIN15.value(),
+            "outputs": self.outputs,
+            "pixels": self.pixels,
+            "tone": self.tone,
+        })
+        writer.write(_JSON_HEADER % len(body))
+        writer.write(body)
+
+    async def route_pin(self, writer, request):
+        params = await self.read_json(request)
+        pin = params.get("pin")
+        if pin not in OUTPUT_PINS:
+            raise HttpError("400 Bad Request", "bad pin")
+        if "analog" in params:
+            value = _int(params, "analog", 0, 1024)
+            self.hardware.analog_out(pin, value)
+        else:
+            value = _int(params, "value", 0, 1)
+            self.hardware.digital_out(pin, value)
+        self.outputs[str(pin)] = value
+        writer.write(_OK)
+
+    async def route_pixel(self, writer, request):
+        params = await self.read_json(request)
+        n = _int(params, "n", 0, PIXELS - 1)
+        color = [_int(params, name, 0, 100) for name in ("r", "g", "b")]
+        self.hardware.pixcel(n, *color)
+        self.pixels[n] = color
+        writer.write(_OK)
+
+    async def route_tone(self, writer, request):
+        params = await self.read_json(request)
+        freq = _int(params, "freq", 0, 20000)
+        # 出力を変える前に全部の値を確かめる（400 のときは今の音をそのままにする）
+        ms = _int(params, "ms", 1, 60000) if freq and "ms" in params else None
+        if self._tone_task:
+            self._tone_task.cancel()
+            self._tone_task = None
+        if freq:
+            self.hardware.play_tone(freq)
+            if ms:
+                self._tone_task = asyncio.create_task(self._stop_tone_after(ms))
+        else:
+            self.hardware.stop_tone()
+        self.tone = freq
+        writer.write(_OK)
+
+    async def _stop_tone_after(self, ms):
+        await asyncio.sleep_ms(ms)
+        self.hardware.stop_tone()
+        self.tone = 0
+        self._tone_task = None
+
+    async def route_text(self, writer, request):
+        params = await self.read_json(request)
+        text = params.get("text")
+        if not isinstance(text, str):
+            raise HttpError("400 Bad Request", "bad text")
+        self.hardware.show_text(text)
+        writer.write(_OK)
@@ -0,0 +1,121 @@
+# ESP32C6 pcratch-IoT
+# 設定ページ（GET /）のキャッシュ
+# HTML の固定部分は root.html に置いたままにして、送るときにフラッシュから
+# CHUNK_SIZE ずつ読む。変わる部分は root.html の @@名前@@ の位置に差し込む。
+# 変わる部分は set() で渡されたときだけ作り直し、root.html と合わせた CRC32 を ETag にする。
+#
+#   page = RootPage()
+#   page.set(ssid_options=b"...", password=b"...", py_file_options=b"...")
+#   if request.headers.get("if-none-match") == page.etag: 304 を返す
+#   await page.send(writer)
+import binascii
+
+TEMPLATE = "root.html"
+CHUNK_SIZE = 512    # root.html を読んで送る単位
+
+
+def escape(s):
+    """HTML に埋め込む文字列をエスケープして bytes にする"""
+    if "&" in s:
+        s = s.replace("&", "&amp;")
+    if "<" in s:
+        s = s.replace("<", "&lt;")
+    if '"' in s:
+        s = s.replace('"', "&quot;")
+    return s.encode("utf-8")
+
+
+class RootPage:
+    """root.html に値を差し込んで送るクラス"""
+
+    def __init__(self, template=TEMPLATE):
+        self.template = template
+        self._layout = None     # [(root.html の位置, 長さ) または 差し込む名前]
+        self._static_length = 0
+        self._template_crc = 0
+        self._values = {}
+        self.etag = None        # None のときは set() が必要
+        self.length = 0
+        self.builds = 0
+
+    def _load(self):
+        """root.html の固定部分の位置と @@名前@@ を調べ、CRC32 を計算する（1 回だけ）"""
+        layout = []
+        pos = 0
+        start = 0
+        crc = 0
+        with open(self.template, "rb") as f:
+            for line in f:
+                crc = binascii.crc32(line, crc)
+                if b"@@" in line:
+                    parts = line.split(b"@@")
+                    for i, part in enumerate(parts):
+                        if i % 2:
+                            layout.append((start, pos - start))
+                            layout.append(part.decode())
+                            pos += len(part) + 4
+                            start = pos
+                        else:
+                            pos += len(part)
+                else:
+                    pos += len(line)
+        layout.append((start, pos - start))
+        self._layout = [s for s in layout if not isinstance(s, tuple) or s[1]]
+        self._static_length = sum(s[1] for s in self._layout if isinstance(s, tuple))
+        self._template_crc = crc
+
+    def reload(self):
+        """root.html が置き換えられたとき"""
+        self._layout = None
+        self.etag = None
+
+    def invalidate(self):
+        """差し込む値の元（ネットワークの一覧や設定）が変わったとき"""
+        self.etag = None
+
+    def set(self, **values):
+        """差し込む値 (bytes) を設定して ETag を計算する"""
+        if self._layout is None:
+            self._load()
+        self._values = values
+        # 同じ長さの root.html に置き換えても ETag が変わるように、中身の CRC から始める
+        crc = self._template_crc
+        length = self._static_length
+        for name in self._layout:
+            if not isinstance(name, tuple):
+                value = values.get(name, b"")
+                crc = binascii.crc32(value, crc)
+                length += len(value)
+        self.length = length
+        self.etag = b'"%08x"' % (crc & 0xFFFFFFFF)
+        self.builds += 1
+
+    async def send(self, writer):
+        """ヘッダーとページを送る。固定部分は CHUNK_SIZE ずつ読んで送る"""
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/html; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"ETag: %s\r\n"
+                     b"Content-Length: %d\r\n\r\n" % (self.etag, self.length))
+        buf = bytearray(CHUNK_SIZE)
+        mv = memoryview(buf)
+        with open(self.template, "rb") as f:
+            for segment in self._layout:
+                if not isinstance(segment, tuple):
+                    writer.write(self._values.get(segment, b""))
+                    continue
+                offset, remaining = segment
+                f.seek(offset)
+                while remaining:
+                    n = f.readinto(mv[:min(CHUNK_SIZE, remaining)])
+                    if not n:
+                        raise OSError("root.html changed")
+                    writer.write(mv[:n])
+                    await writer.drain()
+                    remaining -= n
+
+    def send_not_modified(self, writer):
+        """ブラウザのキャッシュと同じときは本文なしで返す"""
+        writer.write(b"HTTP/1.1 304 Not Modified\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"ETag: %s\r\n\r\n" % self.etag)
@@ -0,0 +1,56 @@
+# ESP32C6 pcratch-IoT
+# HTTP のルーティング
+# (メソッド, パス) の辞書で固定のパスを 1 回で引き、{name} を含むパスは
+# セグメント数ごとに分けた少数のパターンだけと比べる。
+#
+#   router = Router()
+#   router.add("GET", "/", handler)
+#   router.add("GET", "/jobs/{id}", handler)     # request.params["id"]
+#   handler, params = router.match("GET", "/jobs/3")
+
+
+class Router:
+    """メソッドとパスからハンドラーを探すクラス"""
+
+    def __init__(self):
+        self._static = {}   # (メソッド, パス) -> ハンドラー
+        self._dynamic = {}  # (メソッド, セグメント数) -> [(セグメントのリスト, ハンドラー)]
+        self._paths = {}    # パス -> 使えるメソッドのリスト（405 の判定用）
+
+    def add(self, method, path, handler):
+        """ルートを登録する。同じメソッドとパスは後から登録したもので置き換える"""
+        if "{" in path:
+            segments = path.strip("/").split("/")
+            routes = self._dynamic.setdefault((method, len(segments)), [])
+            for i, (pattern, _) in enumerate(routes):
+                if pattern == segments:
+                    routes[i] = (segments, handler)
+                    break
+            else:
+                routes.append((segments, handler))
+        else:
+            self._static[(method, path)] = handler
+            methods = self._paths.setdefault(path, [])
+            if method not in methods:
+                methods.append(method)
+
+    def match(self, method, path):
+        """(ハンドラー, パスパラメータ) を返す。見つからなければ (None, None)"""
+        handler = self._static.get((method, path))
+        if handler:
+            return handler, None
+        segments = path.strip("/").split("/")
+        for pattern, handler in self._dynamic.get((method, len(segments)), ()):
+            params = {}
+            for name, value in zip(pattern, segments):
+                if name.startswith("{"):
+                    params[name[1:-1]] = value
+                elif name != value:
+                    break
+            else:
+                return handler, params
+        return None, None
+
+    def allowed_methods(self, path):
+        """固定のパスに登録されているメソッドのリスト"""
+        return self._paths.get(path, ())
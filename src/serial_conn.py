@@ -0,0 +1,81 @@
+# ESP32C6 pcratch-IoT
+# BLE と同じバイナリのコマンドと通知を USB シリアル（REPL のポート）で送受信する (route=1)
+# フレームは framing.py の COBS + CRC-8。中身は BLE の characteristic と同じで、
+# デバイスからのフレームは長さで種類がわかる（3: hello, 7: 状態, 20: イベント）。
+#
+# ホストは空のフレームを送ってセッションを始める。デバイスは hello を返し、
+# それからは Ctrl-C (0x03) で止まらないようにする（コマンドに 0x03 が入るため）。
+# 空のフレームには空のフレームを返すので、ホストはこれで往復の時間を測れる。
+# SESSION_TIMEOUT_MS の間フレームが届かなければセッションを終わり、Ctrl-C を戻す。
+import sys
+import time
+import struct
+import asyncio
+import micropython
+from framing import FrameDecoder, encode_frame
+
+ROUTE_SERIAL = 1            # 0:BLE, 1:SERIAL
+SESSION_TIMEOUT_MS = 5000   # ホストは空のフレームをこれより短い間隔で送る
+READ_SIZE = 64
+
+
+class SerialConnection:
+    """シリアルのセッションを管理し、BLEConnection と同じ送信メソッドを持つクラス"""
+
+    def __init__(self, on_command, stream_in=None, stream_out=None):
+        self.on_command = on_command    # async on_command(data)
+        # 省略すると USB の REPL のポート
+        self.stream_in = stream_in or sys.stdin.buffer
+        self.stream_out = stream_out or sys.stdout.buffer
+        self.connection = False
+        self.decoder = FrameDecoder()
+        self.received = 0
+        self._last_frame = 0
+
+    def _write(self, data):
+        if self.connection:
+            self.stream_out.write(encode_frame(data))
+
+    def send_notification(self, data):
+        self._write(data)
+
+    def state_write(self, buffer):
+        self._write(buffer)
+
+    def _open(self):
+        print("シリアル接続")
+        micropython.kbd_intr(-1)    # Ctrl-C を無効にする
+        self.connection = True
+        self._write(struct.pack("<BBB", 2, 0, ROUTE_SERIAL))
+
+    def _close(self):
+        self.connection = False
+        micropython.kbd_intr(3)
+        print(f"シリアル切断: 受信 {self.received}, エラー {self.decoder.errors}")
+
+    async def serial_task(self):
+        """フレームを読んでコマンドを実行する（BLE と並べて動かす）"""
+        reader = asyncio.StreamReader(self.stream_in)
+        while True:
+            try:
+                chunk = await asyncio.wait_for_ms(reader.read(READ_SIZE), SESSION_TIMEOUT_MS)
+            except asyncio.TimeoutError:
+                chunk = b""
+            if not chunk:
+                if self.connection and time.ticks_diff(time.ticks_ms(), self._last_frame) > SESSION_TIMEOUT_MS:
+                    self._close()
+                continue
+            for frame in self.decoder.feed(chunk):
+                self._last_frame = time.ticks_ms()
+                if not self.connection:
+                    if not frame:
+                        self._open()
+                    continue    # セッションの前のコマンドは実行しない
+                if not frame:
+                    self._write(b"")    # 生存確認への返事
+                    continue
+                self.received += 1
+                try:
+                    await self.on_command(frame)
+                except Exception as e:
+                    print(f"Error in serial command {frame}: {e}")
@@ -1,9 +1,23 @@
 # ESP32C6 pcratch-IoT v1.4.1
-import socket
 import os
 import time
+import json
+import asyncio
 import machine
 from hardware import Hardware
+from oledstream import OledStream, SSE_HEADER
+from httpreq import read_request, parse_query_string, HttpError
+from router import Router
+from jobs import JobRunner
+from rootpage import RootPage, escape, TEMPLATE as ROOT_TEMPLATE
+from wifiscan import get_scanner
+from restapi import RestApi
+
+HTTP_PORT = 80
+MAX_CLIENTS = 4             # 同時に処理する接続の数（超えたら 503）
+MAX_KEEPALIVE_REQUESTS = 20 # 1 つの接続で処理するリクエストの数
+MAX_UPLOAD_BYTES = 128 * 1024  # /upload で受け取るファイルの上限
+MAX_OLED_STREAMS = 2    # /oled_stream を同時に配信するクライアントの数
 
 class IoTServer:
     def __init__(self):
@@ -11,46 +25,57 @@ class IoTServer:
         self.hardware = Hardware()
         self.running = True  # サーバーの実行状態を管理するフラグ
         self.wifi_confifg = ()
-        self.networks = []  # Wi-Fiネットワークのリストを初期化
+        self.scanner = get_scanner(self.hardware.get_wifi_sta())  # Wi-Fiスキャンの結果（キャッシュ）
+        self.networks_version = -1  # root_page に入っているスキャン結果の version
+        self.oled_streams = 0  # 配信中の /oled_stream の数
+        self.clients = 0  # 処理中の接続の数
+        self.server = None
+        self.root_page = RootPage()  # GET / のページ（設定が変わったときだけ作り直す）
+        self.jobs = JobRunner()  # /demo1 などをバックグラウンドで動かす
+        self.router = Router()
+        self.add_default_routes()
 
     def stop_server(self):
         """サーバーを停止"""
         self.running = False
+        if self.server:
+            self.server.close()
         print("サーバーを停止します")
 
     def parse_query_string(self, query):
-        """クエリ文字列を解析"""
-        params = {}
-        pairs = query.split("&")
-        for pair in pairs:
-            if "=" in pair:
-                key, value = pair.split("=", 1)
-                params[key] = value
-        return params
-
-    def user_led_demo(self):
-        for i in range(2):
-            self.hardware.play_tone(440)  # 音を鳴らす
-            for i in range(4):
-                self.hardware.PIN15.value(1)
-                time.sleep(0.1)
-                self.hardware.PIN15.value(0)
-                time.sleep(0.1)
+        """クエリ文字列を解析（URL デコードする）"""
+        return parse_query_string(query)
+
+    async def user_led_demo(self):
+        try:
+            for i in range(2):
+                self.hardware.play_tone(440)  # 音を鳴らす
+                for i in range(4):
+                    self.hardware.PIN15.value(1)
+                    await asyncio.sleep(0.1)
+                    self.hardware.PIN15.value(0)
+                    await asyncio.sleep(0.1)
+                self.hardware.stop_tone()
+                for i in range(4):
+                    self.hardware.PIN15.value(1)
+                    await asyncio.sleep(0.5)
+                    self.hardware.PIN15.value(0)
+                    await asyncio.sleep(0.5)
+        finally:
+            # 途中で止められても LED と音を消す
+            self.hardware.PIN15.value(0)
             self.hardware.stop_tone()
-            for i in range(4):
-                self.hardware.PIN15.value(1)
-                time.sleep(0.5)
-                self.hardware.PIN15.value(0)
-                time.sleep(0.5)
 
-    def play_tone(self, frequency, duration):
+    async def play_tone(self, frequency, duration):
         """指定した周波数と持続時間で音を再生"""
         self.hardware.play_tone(frequency)
-        time.sleep(duration / 2)
-        self.hardware.stop_tone()  # 音を止める
-        time.sleep(0.01)
+        try:
+            await asyncio.sleep(duration / 2)
+        finally:
+            self.hardware.stop_tone()  # 音を止める
+        await asyncio.sleep(0.01)
 
-    def play_melody(self):
+    async def play_melody(self):
         """Happy Birthday to You を再生"""
         melody = [
             (264, 0.25), (264, 0.25), (297, 0.5), (264, 0.5), (352, 0.5), (330, 1),
@@ -60,28 +85,30 @@ class IoTServer:
         ]
         for note in melody:
             frequency, duration = note
-            self.play_tone(frequency, duration)
+            await self.play_tone(frequency, duration)
 
     def npoff(self):
         """NeoPixelを消灯"""
         for i in range(2):
             self.hardware.pixcel(i, 0, 0, 0)
 
-    def color_wipe(self, color, delay=200):
+    async def color_wipe(self, color, delay=200):
         """NeoPixelを指定した色に変化させる"""
         for i in range(2):
             r, g, b = color
             self.hardware.pixcel(i, r / 255 * 100, g / 255 * 100, b / 255 * 100)
-            time.sleep_ms(delay)
+            await asyncio.sleep_ms(delay)
 
-    def np_led_demo(self):
+    async def np_led_demo(self):
         """デモ1: 赤、緑、青の順に点灯"""
-        for i in range(3):
-            self.color_wipe((255, 0, 0))
-            self.color_wipe((0, 255, 0))
-            self.color_wipe((0, 0, 255))
-            time.sleep(0.5)
-        self.npoff()
+        try:
+            for i in range(3):
+                await self.color_wipe((255, 0, 0))
+                await self.color_wipe((0, 255, 0))
+                await self.color_wipe((0, 0, 255))
+                await asyncio.sleep(0.5)
+        finally:
+            self.npoff()
 
     # デフォルトのHTMLレスポンス
     def get_default_response(self):
@@ -94,19 +121,19 @@ Content-Type: text/html; charset=utf-8
 <head>
     <title>Wi-Fi設定</title>
     <style>
-        body {{
+        body {
             font-size: 20px; /* フォントサイズを大きく設定 */
-        }}
-        h1 {{
+        }
+        h1 {
             font-size: 24px; /* 見出しのフォントサイズをさらに大きく設定 */
-        }}
-        label, select, input {{
+        }
+        label, select, input {
             font-size: 18px; /* ラベルや入力欄のフォントサイズを調整 */
-        }}
-        button {{
+        }
+        button {
             font-size: 18px; /* ボタンのフォントサイズを調整 */
             margin: 10px; /* ボタン間の余白を設定 */
-        }}
+        }
     </style>
 </head>
 <body>
@@ -136,192 +163,331 @@ Content-Type: text/html; charset=utf-8
 """
         return redirect_response
 
-    def get_root_response(self, ssid_options, py_file_options, default_password):
-        """ルートディレクトリのHTMLレスポンスを生成"""
-        # HTMLページを送信
-        response = f"""\
-HTTP/1.1 200 OK
-Content-Type: text/html; charset=utf-8
-
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Wi-Fi設定</title>
-    <style>
-        body {{
-            font-size: 36px; /* フォントサイズを大きく設定 */
-        }}
-        select {{
-            font-size: 36px;  /* <select> のフォントサイズ */
-        }}
-        h1 {{
-            font-size: 48px; /* 見出しのフォントサイズをさらに大きく設定 */
-        }}
-        label, select, input {{
-            font-size: 18px; /* ラベルや入力欄のフォントサイズを調整 */
-        }}
-        input, button {{
-            font-size: 36px; /* ボタンのフォントサイズを調整 */
-            margin: 20px 40px; /* ボタン間の余白を設定 */
-        }}
-    </style>
-</head>
-<body>
-    <h1>Wi-Fi設定</h1>
-    <form action="/" method="post">
-        <label for="ssid">SSID:</label>
-        <select id="ssid" name="ssid">
-            {ssid_options}
-        </select><br><br>
-        <label for="password">パスワード:</label>
-        <input type="password" id="password" name="password" value="{default_password}"><br><br>
-        <label for="main_module">メインモジュール:</label>
-        <select id="main_module" name="main_module">
-            {py_file_options}
-        </select><br><br>
-        <input type="submit" value="設定変更">
-        <button type="button" onclick="location.href='/scan'">WiFiスキャン</button>
-    </form>
-    <button onclick="location.href='/demo1'">Lチカ</button>
-    <button onclick="location.href='/demo2'">カラーLEDデモ</button>
-    <button onclick="location.href='/demo3'">音楽デモ</button>
-    <p><img src="/oled_bitmap.bmp" alt="OLED Bitmap" style="width: 100%; height: auto; border: 5px solid black;"></p>
-</body>
-</html>
-"""
-        return response
-
     def get_wifi_config(self):
             """Configを読み込む"""
             self.wifi_confifg = (self.hardware.get_wifi_config())
-            default_ssid, default_password, default_main_module = self.wifi_confifg
+            default_ssid, default_password, default_main_module = self.wifi_confifg[:3]
             print("デフォルトSSID:", default_ssid)
             print("デフォルトパスワード:", default_password)
             print("デフォルトメインモジュール:", default_main_module)
             # ルートディレクトリの *.py ファイルをリストアップ
             self.py_files = [f for f in os.listdir() if f.endswith(".py")]
-            # default_ssid を既存のネットワークリストに追加
-            self.networks.append((default_ssid.encode('utf-8'), None, None, None, None, None))
-
-    def scan_wifi_networks(self):
-            # Wi-Fiネットワークをスキャン
-            sta = self.hardware.get_wifi_sta()
-            sta.active(False)
-            time.sleep(1)
-            sta.active(True)
-            self.networks = sta.scan()
-            # default_ssid を既存のネットワークリストに追加
-            default_ssid, _, _ = self.wifi_confifg
-            self.networks.append((default_ssid.encode('utf-8'), None, None, None, None, None))
-            print("スキャンしたWi-Fiネットワーク:", self.networks)
-
-    def handle_request(self, cl, request):
-        # GETリクエストでフォームを表示
-        if "GET / " in request:
-            print("GET リクエスト処理...")
-            default_ssid, default_password, default_main_module = self.wifi_confifg
-            # Wi-Fiネットワークをスキャン
-            ssid_options = ""
-            for net in self.networks:
-                ssid = net[0].decode("utf-8")
-                selected = "selected" if ssid == default_ssid else ""
-                ssid_options += f'<option value="{ssid}" {selected}>{ssid}</option>'
-
-            py_file_options = ""
-            for py_file in self.py_files:
-                selected = "selected" if py_file == default_main_module else ""
-                py_file_options += f'<option value="{py_file}" {selected}>{py_file}</option>'
-            response = self.get_root_response(ssid_options, py_file_options, default_password)
-
-            print("GET レスポンス送信...")
-            cl.send(response)
-            print("GET レスポンス送信終了")
-
-        # POSTリクエストでSSIDとパスワードを保存
-        elif "POST / " in request:
-            print("POST リクエストを処理中")
-            # リクエストボディを取得
-            headers, body = request.split("\r\n\r\n", 1)
-            print("リクエストボディ:", body)
-
-            # クエリ文字列を解析
-            params = self.parse_query_string(body)
-            ssid = params.get("ssid", "")
-            password = params.get("password", "")
-            main_module = params.get("main_module", "")
-            print("Wi-Fi設定を保存します:", ssid, password)
-            print("選択されたメインモジュール:", main_module)
-
-            # SSIDとパスワードをファイルに保存
-            with open("wifi_config.txt", "w") as f:
-                f.write(f"SSID={ssid}\n")
-                f.write(f"PASSWORD={password}\n")
-                f.write(f"MAIN_MODULE={main_module}\n")
-            print("設定を保存しました")
-
-            # 保存完了メッセージを送信
-            cl.send(self.get_redirect_response())
-            print("デバイスを再起動します...")
-            machine.reset()  # デバイスを再起動
-
-        elif "GET /scan" in request:
-            print("Wi-Fiスキャンを開始します...")
-            # self.get_wifi_config
-            self.scan_wifi_networks()
-            cl.send(self.get_redirect_response())
-
-        elif "GET /demo1" in request:
-            print("ESP32C6 LEDのデモ...")
-            self.user_led_demo()
-            cl.send(self.get_redirect_response())
-        elif "GET /demo2" in request:
-            print("NP_LED のデモ...")
-            self.np_led_demo()
-            cl.send(self.get_redirect_response())
-        elif "GET /demo3" in request:
-            print("demo3...")
-            self.play_melody()
-            cl.send(self.get_redirect_response())
-
-        elif "GET /oled_bitmap.bmp" in request:
-            # print("OLEDビットマップを送信します")
-            self.hardware.send_oled_bitmap_24(cl)
-
-        else:
+            self.root_page.invalidate()
+
+    async def scan_wifi_networks(self, force=False):
+            """Wi-Fiネットワークをスキャン（STA は止めないので接続は切れない）"""
+            networks = await self.scanner.scan(force)
+            print("スキャンしたWi-Fiネットワーク:", [net[0] for net in networks])
+
+    def respond(self, writer, response, close=False):
+        """get_*_response() のレスポンスに Content-Length を付けて送る"""
+        head, body = response.split("\n\n", 1)
+        body = body.encode("utf-8")
+        writer.write(head.replace("\n", "\r\n").encode("utf-8"))
+        writer.write(b"\r\nContent-Length: %d\r\n" % len(body))
+        if close:
+            writer.write(b"Connection: close\r\n")
+        writer.write(b"\r\n")
+        writer.write(body)
+
+    def add_route(self, method, path, handler):
+        """ルートを登録する。handler(writer, request) は接続を閉じるときだけ False を返す
+
+        path には "/jobs/{id}" のようにパラメータを書ける（request.params["id"]）。
+        他のモジュールも自分のエンドポイントをここで追加できる。
+        """
+        self.router.add(method, path, handler)
+
+    def add_default_routes(self):
+        self.add_route("GET", "/", self.route_root)
+        self.add_route("POST", "/", self.route_save_config)
+        self.add_route("POST", "/upload", self.upload_file)
+        self.add_route("PUT", "/upload", self.upload_file)
+        self.add_route("GET", "/scan", self.route_scan)
+        self.add_route("GET", "/demo1", self.route_demo1)
+        self.add_route("GET", "/demo2", self.route_demo2)
+        self.add_route("GET", "/demo3", self.route_demo3)
+        self.add_route("GET", "/oled_bitmap.bmp", self.route_oled_bitmap)
+        self.add_route("GET", "/oled_stream", self.route_oled_stream)
+        self.add_route("GET", "/jobs", self.route_jobs)
+        self.add_route("GET", "/jobs/{id}", self.route_job)
+        self.add_route("DELETE", "/jobs/{id}", self.route_cancel_job)
+        self.api = RestApi(self.hardware)  # /api/* のセンサーと出力の JSON API
+        self.api.register_routes(self)
+
+    def respond_json(self, writer, obj, status="200 OK"):
+        """obj を JSON にして送る"""
+        body = json.dumps(obj).encode("utf-8")
+        writer.write(b"HTTP/1.1 %s\r\nContent-Type: application/json\r\n"
+                     b"Cache-Control: no-store\r\nContent-Length: %d\r\n\r\n" % (status.encode(), len(body)))
+        writer.write(body)
+
+    async def handle_request(self, writer, request):
+        """リクエストを処理する。接続を続けてよければ True を返す"""
+        handler, params = self.router.match(request.method, request.path)
+        if handler is None:
+            if self.router.allowed_methods(request.path):
+                writer.write(b"HTTP/1.1 405 Method Not Allowed\r\nAllow: %s\r\nContent-Length: 0\r\n\r\n"
+                             % ", ".join(self.router.allowed_methods(request.path)).encode())
+                return True
             # その他のリクエストには404エラーを返す
             print("404 Not Found")
-            cl.send(self.get_default_response())
-
-
-    def start_http_server(self):
-        """HTTPサーバーを起動"""
+            self.respond(writer, self.get_default_response())
+            return True
+        request.params = params or {}
+        return await handler(writer, request) is not False
+
+    # GETリクエストでフォームを表示
+    async def route_root(self, writer, request):
+        print("GET リクエスト処理...")
+        page = self.root_page
+        if self.networks_version != self.scanner.version:
+            page.invalidate()
+        if not self.scanner.fresh() and self.jobs.find("scan") is None:
+            # 結果が古ければ裏でスキャンしておく（このページは前回の結果で返す）
+            self.jobs.start("scan", self.scan_wifi_networks, group="scan")
+        if page.etag is None:
+            self.build_root_page()
+        if request.headers.get("if-none-match", "").encode() == page.etag:
+            page.send_not_modified(writer)
+            return
+        print("GET レスポンス送信...")
+        await page.send(writer)
+        print("GET レスポンス送信終了")
+
+    def build_root_page(self):
+        """ネットワークの一覧、*.py ファイル、設定から選択肢を作って root_page に設定する"""
+        default_ssid, default_password, default_main_module = self.wifi_confifg[:3]
+        # 設定済みの SSID は見つからなくても先頭に出す
+        ssids = [default_ssid] if default_ssid else []
+        for net in self.scanner.networks:
+            ssid = net[0].decode("utf-8")
+            if ssid != default_ssid:
+                ssids.append(ssid)
+        self.networks_version = self.scanner.version
+        ssid_options = []
+        for ssid in ssids:
+            selected = b" selected" if ssid == default_ssid else b""
+            ssid = escape(ssid)
+            ssid_options.append(b'<option value="%s"%s>%s</option>' % (ssid, selected, ssid))
+
+        py_file_options = []
+        for py_file in self.py_files:
+            selected = b" selected" if py_file == default_main_module else b""
+            py_file = escape(py_file)
+            py_file_options.append(b'<option value="%s"%s>%s</option>' % (py_file, selected, py_file))
+
+        self.root_page.set(ssid_options=b"".join(ssid_options),
+                           password=escape(default_password),
+                           py_file_options=b"".join(py_file_options))
+
+    # POSTリクエストでSSIDとパスワードを保存
+    async def route_save_config(self, writer, request):
+        print("POST リクエストを処理中")
+        # フォームのボディを読んで解析（URL デコード済み）
+        params = await request.read_form()
+        print("リクエストボディ:", params)
+        ssid = params.get("ssid", "")
+        password = params.get("password", "")
+        main_module = params.get("main_module", "")
+        print("Wi-Fi設定を保存します:", ssid, password)
+        print("選択されたメインモジュール:", main_module)
+
+        # SSIDとパスワードをファイルに保存
+        with open("wifi_config.txt", "w") as f:
+            f.write(f"SSID={ssid}\n")
+            f.write(f"PASSWORD={password}\n")
+            f.write(f"MAIN_MODULE={main_module}\n")
+        print("設定を保存しました")
+
+        # 保存完了メッセージを送信
+        self.respond(writer, self.get_redirect_response(), close=True)
+        await writer.drain()
+        print("デバイスを再起動します...")
+        machine.reset()  # デバイスを再起動
+
+    def respond_job(self, writer, job):
+        """ジョブを受け付けたことを 202 で返す。状態は Location の URL で見る"""
+        body = json.dumps(job.info()).encode("utf-8")
+        writer.write(b"HTTP/1.1 202 Accepted\r\nContent-Type: application/json\r\n"
+                     b"Location: /jobs/%d\r\nContent-Length: %d\r\n\r\n" % (job.id, len(body)))
+        writer.write(body)
+
+    async def route_scan(self, writer, request):
+        # スキャン中ならそのジョブを返す。?force=1 がなければ TTL 内はスキャンしない
+        job = self.jobs.find("scan")
+        if job is None:
+            print("Wi-Fiスキャンを開始します...")
+            job = self.jobs.start("scan", self.scan_wifi_networks, request.query.get("force") == "1",
+                                  group="scan")
+        self.respond_job(writer, job)
+
+    async def route_demo1(self, writer, request):
+        print("ESP32C6 LEDのデモ...")
+        self.respond_job(writer, self.jobs.start("demo1", self.user_led_demo, group="demo"))
+
+    async def route_demo2(self, writer, request):
+        print("NP_LED のデモ...")
+        self.respond_job(writer, self.jobs.start("demo2", self.np_led_demo, group="demo"))
+
+    async def route_demo3(self, writer, request):
+        print("demo3...")
+        self.respond_job(writer, self.jobs.start("demo3", self.play_melody, group="demo"))
+
+    async def route_jobs(self, writer, request):
+        self.respond_json(writer, [self.jobs.jobs[i].info() for i in sorted(self.jobs.jobs)])
+
+    def _find_job(self, writer, request):
+        try:
+            job = self.jobs.get(int(request.params["id"]))
+        except ValueError:
+            job = None
+        if job is None:
+            self.respond_json(writer, {"error": "no such job"}, "404 Not Found")
+        return job
+
+    async def route_job(self, writer, request):
+        job = self._find_job(writer, request)
+        if job:
+            self.respond_json(writer, job.info())
+
+    async def route_cancel_job(self, writer, request):
+        job = self._find_job(writer, request)
+        if job:
+            self.jobs.cancel(job.id)
+            self.respond_json(writer, job.info())
+
+    async def route_oled_bitmap(self, writer, request):
+        # print("OLEDビットマップを送信します")
+        if not self.hardware.oled:
+            self.respond(writer, self.get_default_response())
+        elif request.query.get("bpp") == "24":
+            # 24ビット形式（要求されたときだけ）は長さを付けずに送るので接続を閉じる
+            self.hardware.send_oled_bitmap_24(_SocketAdapter(writer))
+            return False
+        else:
+            bmp = self.hardware.oled_bitmap()
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: image/bmp\r\n"
+                         b"Content-Disposition: inline; filename=\"oled_bitmap.bmp\"\r\n"
+                         b"Cache-Control: no-store\r\n"
+                         b"Content-Length: %d\r\n\r\n" % len(bmp))
+            writer.write(bmp)
+
+    async def route_oled_stream(self, writer, request):
+        if self.hardware.oled and self.oled_streams < MAX_OLED_STREAMS:
+            await self.stream_oled(writer)
+        else:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\nContent-Length: 0\r\n\r\n")
+        return False
+
+    async def stream_oled(self, writer):
+        """OLED の変化をクライアントが切断するまで送る"""
+        stream = OledStream(self.hardware.oled)
+        self.oled_streams += 1
+        try:
+            writer.write(SSE_HEADER)
+            await writer.drain()
+            while self.running:
+                event = stream.next_event()
+                if event:
+                    start = time.ticks_ms()
+                    writer.write(event)
+                    await writer.drain()
+                    stream.sent(len(event), time.ticks_diff(time.ticks_ms(), start))
+                await asyncio.sleep_ms(stream.interval_ms)
+        except OSError as e:
+            print("OLEDストリーム終了:", e)
+        finally:
+            self.oled_streams -= 1
+            print(f"OLEDストリーム: {stream.frames} フレーム, {stream.bytes} バイト")
+
+    async def upload_file(self, writer, request):
+        """ボディをそのままファイルに保存する（例: POST /upload?name=wifi_config.txt）"""
+        name = request.query.get("name", "")
+        if not name or "/" in name or name.startswith("."):
+            raise HttpError("400 Bad Request", "bad file name")
+        # 途中で切れても元のファイルが壊れないように、一時ファイルに書いてから置き換える
+        temp = name + ".tmp"
+        try:
+            size = await request.save_body(temp, MAX_UPLOAD_BYTES)
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+            os.rename(temp, name)
+        except Exception:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        print(f"ファイルを保存しました: {name} ({size} バイト)")
+        if name.endswith(".py"):
+            self.py_files = [f for f in os.listdir() if f.endswith(".py")]
+            self.root_page.invalidate()
+        elif name == ROOT_TEMPLATE:
+            self.root_page.reload()
+        body = b"saved %d bytes\n" % size
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n" % len(body))
+        writer.write(body)
+        return True
+
+    async def handle_client(self, reader, writer):
+        """1 つの接続を処理する。keep-alive のときは続けてリクエストを読む"""
+        if self.clients >= MAX_CLIENTS:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            try:
+                await writer.drain()
+            finally:
+                writer.close()
+                await writer.wait_closed()
+            return
+        self.clients += 1
+        try:
+            for _ in range(MAX_KEEPALIVE_REQUESTS):
+                request = await read_request(reader, writer)
+                if request is None:
+                    break
+                keep_alive = await self.handle_request(writer, request)  # リクエストを処理
+                if keep_alive and request.keep_alive:
+                    await request.discard()     # 読まれなかったボディを読み捨てる
+                await writer.drain()
+                if not keep_alive or not request.keep_alive:
+                    break
+        except asyncio.TimeoutError:
+            pass  # 次のリクエストが来なかった
+        except HttpError as e:
+            print("不正なリクエスト:", e.status, e)
+            writer.write(b"HTTP/1.1 %s\r\nContent-Length: 0\r\nConnection: close\r\n\r\n" % e.status.encode())
+            await writer.drain()
+        except Exception as e:
+            print("リクエスト処理中にエラー:", e)
+        finally:
+            self.clients -= 1
+            writer.close()  # ソケットを確実に閉じる
+            await writer.wait_closed()
+
+    async def start_http_server(self):
+        """HTTPサーバーを起動（BLE などと同じイベントループで動く）"""
         print("アクセスポイントを起動...")
         ap = self.hardware.wifi_ap_conect()  # Wi-Fi接続
         while not ap.isconnected():
-            time.sleep(1)
+            await asyncio.sleep(1)
         print("アクセスポイント接続完了:", ap.ifconfig())
 
+        self.get_wifi_config()  # CONFIG情報を取得
+
         print("HTTPサーバーを起動...")
-        addr = socket.getaddrinfo("0.0.0.0", 80)[0][-1]
-        s = socket.socket()
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(addr)
-        s.listen(1)
+        self.server = await asyncio.start_server(self.handle_client, "0.0.0.0", HTTP_PORT)
         print("HTTPサーバーが起動しました")
+        await self.server.wait_closed()
 
-        self.get_wifi_config()  # CONFIG情報を取得
 
-        while self.running:
-            try:
-                cl, addr = s.accept()
-                print("クライアント接続:", addr)
-                try:
-                    request = cl.recv(1024).decode("utf-8")
-                    # print("リクエスト:", request)
-                    self.handle_request(cl, request)  # リクエストを処理
-                except Exception as e:
-                    print("リクエスト処理中にエラー:", e)
-                finally:
-                    cl.close()  # ソケットを確実に閉じる
-            except Exception as e:
-                print("エラー:", e)
+class _SocketAdapter:
+    """socket の send() を使う関数に StreamWriter を渡すためのクラス"""
+    def __init__(self, writer):
+        self.writer = writer
+
+    def send(self, data):
+        self.writer.write(data)
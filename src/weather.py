@@ -64,10 +64,20 @@ weather_icons = {
 }
 
 class Weather:
-    def __init__(self, oled):
-        self.oled = oled
+    def __init__(self, display):
+        self.display = display
+        self.oled = display.oled
         self.font = None
 
+    # HTTPサーバーに天気情報のエンドポイントを追加
+    def register_routes(self, server):
+        self.server = server
+        server.add_route("GET", "/weather", self.route_weather)
+
+    async def route_weather(self, writer, request):
+        self.server.respond_json(writer, {"location": getattr(self, "location", ""),
+                                          "days": getattr(self, "weather_data", [])})
+
     # 天気情報を取得
     async def fetch_weather(self, location):
         self.location = location
@@ -91,55 +101,53 @@ class Weather:
 
     # 天気情報を表示
     def display_weather(self, temperature = 0, humidity = 0):
-        if self.oled:
-            # 上10ドットをそのままにして、下の部分だけ書き直す
-            self.oled.fill_rect(0, 0, self.oled.width, self.oled.height - 0, 0)
-            # self.oled.fill(0)
-            for i, day in enumerate(self.weather_data):
-                if i >= 3:  # 最初の3日分の天気を表示
-                    break
-                date = day['date']
-                forecast = day['forecast']
-                mintemp = day['mintemp']
-                maxtemp = day['maxtemp']
-                # print(date, forecast, mintemp, maxtemp)
+        self.display.update("screen", self.draw_weather, temperature, humidity)
+
+    def draw_weather(self, temperature, humidity):
+        for i, day in enumerate(self.weather_data):
+            if i >= 3:  # 最初の3日分の天気を表示
+                break
+            date = day['date']
+            forecast = day['forecast']
+            mintemp = day['mintemp']
+            maxtemp = day['maxtemp']
+            # print(date, forecast, mintemp, maxtemp)
 
-                # "日(" を "(" に置換
-                date = date.replace("日(", "(")
-                date = date.replace("(月)", "Mo")
-                date = date.replace("(火)", "Tu")
-                date = date.replace("(水)", "We")
-                date = date.replace("(木)", "Th")
-                date = date.replace("(金)", "Fr")
-                date = date.replace("(土)", "Sa")
-                date = date.replace("(日)", "Su")
+            # "日(" を "(" に置換
+            date = date.replace("日(", "(")
+            date = date.replace("(月)", "Mo")
+            date = date.replace("(火)", "Tu")
+            date = date.replace("(水)", "We")
+            date = date.replace("(木)", "Th")
+            date = date.replace("(金)", "Fr")
+            date = date.replace("(土)", "Sa")
+            date = date.replace("(日)", "Su")
 
-                # 天気を置換
-                weather = forecast.replace("曇", "C")
-                weather = weather.replace("晴", "S")
-                weather = weather.replace("雨", "R")
-                weather = weather.replace("時々", "")
-                weather = weather.replace("後", "")
-                weather = weather.replace("止む", "")
+            # 天気を置換
+            weather = forecast.replace("曇", "C")
+            weather = weather.replace("晴", "S")
+            weather = weather.replace("雨", "R")
+            weather = weather.replace("時々", "")
+            weather = weather.replace("後", "")
+            weather = weather.replace("止む", "")
 
-                if self.font:
-                    self.font.draw(date, i * 43, 0)  # MisakiFontを使用して日付を表示
-                    self.font.draw(weather.replace("曇", "ク"), i * 43, 18)  # MisakiFontを使用して天気を表示
-                else:
-                    self.oled.text(date, i * 43, 0)
-                    # self.oled.text(weather, i * 40, 18)
-                self.oled.text(f"{mintemp}|{maxtemp}", i * 43, 40)
-                
-                # 天気に応じたアイコンを表示
+            if self.font:
+                self.font.draw(date, i * 43, 0)  # MisakiFontを使用して日付を表示
+                self.font.draw(weather.replace("曇", "ク"), i * 43, 18)  # MisakiFontを使用して天気を表示
+            else:
+                self.oled.text(date, i * 43, 0)
+                # self.oled.text(weather, i * 40, 18)
+            self.oled.text(f"{mintemp}|{maxtemp}", i * 43, 40)
+            
+            # 天気に応じたアイコンを表示
+            icon = weather_icons["晴"]
+            if "晴" in forecast[0]:
                 icon = weather_icons["晴"]
-                if "晴" in forecast[0]:
-                    icon = weather_icons["晴"]
-                if "曇" in forecast[0]:
-                    icon = weather_icons["曇"]
-                if "雨" in forecast[0]:
-                    icon = weather_icons["雨"]
-                self.draw_icon(icon, i * 43, 16)
-            self.oled.line(0, 50, 127, 50, 1)
-            formatted_temp = "{:5.1f}C {:5.1f}%".format(temperature, humidity)
-            self.oled.text(formatted_temp, 0, 54)
-            self.oled.show()
+            if "曇" in forecast[0]:
+                icon = weather_icons["曇"]
+            if "雨" in forecast[0]:
+                icon = weather_icons["雨"]
+            self.draw_icon(icon, i * 43, 16)
+        self.oled.line(0, 50, 127, 50, 1)
+        formatted_temp = "{:5.1f}C {:5.1f}%".format(temperature, humidity)
+        self.oled.text(formatted_temp, 0, 54)
@@ -0,0 +1,154 @@
+# ESP32C6 pcratch-IoT
+# BLE と同じバイナリのコマンドと通知を WebSocket (GET /ws) で送受信する
+# Wi-Fi なら BLE の接続間隔を待たないので、往復の遅れが小さい。
+#
+# フレームはすべてバイナリで、中身は BLE の characteristic と同じ:
+#   ホスト -> デバイス: コマンド（command characteristic に書くのと同じ）
+#   デバイス -> ホスト: 長さで種類がわかる
+#     3 バイト  接続時の (hardware, protocol, route)。route は 2 (WebSocket)
+#     7 バイト  センサー状態（state characteristic と同じ '<I3B'）
+#     20 バイト ピン／ボタンのイベント（action event characteristic と同じ）
+import struct
+import hashlib
+import asyncio
+import binascii
+
+WS_GUID = b"258EAFA5-E914-47DA-95C5-C5AB0DC11B65"
+MAX_CLIENTS = 2             # 同時に接続できるクライアントの数
+MAX_FRAME_BYTES = 240       # 受け取るコマンドの上限（BLE の COMMAND_MAX_LEN と同じ）
+MAX_PENDING_BYTES = 2048    # 送れていないデータがこれを超えたら状態の送信を飛ばす
+PING_INTERVAL_MS = 20000    # 何も送らなかったら ping を送る間隔
+IDLE_TIMEOUT_MS = 60000     # 何も届かなかったら切断する時間
+ROUTE_WEBSOCKET = 2         # 0:BLE, 1:SERIAL
+
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def frame_header(opcode, length):
+    """サーバーから送るフレームのヘッダー（マスクなし）"""
+    if length < 126:
+        return bytes((0x80 | opcode, length))
+    return struct.pack("!BBH", 0x80 | opcode, 126, length)
+
+
+class _Client:
+    """1 つの WebSocket 接続"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = 0        # drain() を待っているバイト数
+        self.dropped = 0        # 送れなかった状態のフレーム数
+        self.ready = asyncio.Event()
+
+    def send(self, opcode, data, droppable=False):
+        if droppable and self.pending > MAX_PENDING_BYTES:
+            self.dropped += 1
+            return
+        frame = frame_header(opcode, len(data)) + data     # data は使い回しのバッファでもよい
+        self.writer.write(frame)
+        self.pending += len(frame)
+        self.ready.set()
+
+    async def sender(self):
+        """書いたフレームを送り出す。しばらく送っていなければ ping を送る"""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for_ms(self.ready.wait(), PING_INTERVAL_MS)
+                except asyncio.TimeoutError:
+                    self.send(OP_PING, b"")
+                self.ready.clear()
+                await self.writer.drain()
+                self.pending = 0
+        except OSError:
+            pass    # 切断は receive() のほうで処理する
+
+
+class WebSocketConnection:
+    """WebSocket のクライアントをまとめて、BLEConnection と同じ送信メソッドを持つクラス"""
+
+    def __init__(self, on_command):
+        self.on_command = on_command    # async on_command(data)
+        self.clients = []
+        self.received = 0
+
+    @property
+    def connection(self):
+        """クライアントが 1 つでもつながっていれば True（BLEConnection.connection と同じ使い方）"""
+        return bool(self.clients)
+
+    def register_routes(self, server):
+        server.add_route("GET", "/ws", self.route_ws)
+
+    def send_notification(self, data):
+        for client in self.clients:
+            client.send(OP_BINARY, data)
+
+    def state_write(self, buffer):
+        # 状態は次の送信で新しい値が届くので、遅いクライアントには飛ばしてよい
+        for client in self.clients:
+            client.send(OP_BINARY, buffer, droppable=True)
+
+    async def route_ws(self, writer, request):
+        headers = request.headers
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return True
+        if len(self.clients) >= MAX_CLIENTS:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = binascii.b2a_base64(hashlib.sha1(key.encode() + WS_GUID).digest())[:-1]
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\n"
+                     b"Upgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: %s\r\n\r\n" % accept)
+        client = _Client(writer)
+        client.send(OP_BINARY, struct.pack("<BBB", 2, 0, ROUTE_WEBSOCKET))
+        self.clients.append(client)
+        sender = asyncio.create_task(client.sender())
+        print("WebSocket接続:", len(self.clients))
+        try:
+            await self.receive(request.reader, client)
+        except (OSError, asyncio.TimeoutError, EOFError) as e:
+            print("WebSocket切断:", e)
+        finally:
+            self.clients.remove(client)
+            sender.cancel()
+            print(f"WebSocket終了: 受信 {self.received}, 飛ばした状態 {client.dropped}")
+        return False
+
+    async def receive(self, reader, client):
+        """フレームを読んでコマンドを実行する。クライアントが閉じたら戻る"""
+        mask = bytearray(4)
+        while True:
+            head = await asyncio.wait_for_ms(reader.readexactly(2), IDLE_TIMEOUT_MS)
+            fin_opcode, length = head[0], head[1] & 0x7F
+            if not head[1] & 0x80:
+                raise OSError("unmasked frame")
+            if length == 126:
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+            elif length == 127:
+                raise OSError("frame too large")
+            if length > MAX_FRAME_BYTES or not fin_opcode & 0x80:
+                raise OSError("frame too large")    # 分割されたフレームも受け取らない
+            mask[:] = await reader.readexactly(4)
+            data = bytearray(await reader.readexactly(length)) if length else bytearray()
+            for i in range(length):
+                data[i] ^= mask[i & 3]
+            opcode = fin_opcode & 0x0F
+            if opcode == OP_BINARY:
+                self.received += 1
+                try:
+                    await self.on_command(data)
+                except Exception as e:
+                    print(f"Error in WebSocket command {data}: {e}")
+            elif opcode == OP_PING:
+                client.send(OP_PONG, data)
+            elif opcode == OP_CLOSE:
+                client.send(OP_CLOSE, data[:2])
+                return
+            # テキストと pong は使わない
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import base64
+import struct
+import asyncio
+import hashlib
+import argparse
+# PC から デバイスの /ws につないで、BLE と同じバイナリのコマンドを送り、通知を表示する
+# 例: python wsclient.py 192.168.4.1 --text "Hello"      # 文字を表示して、通知を 10 秒表示
+#     python wsclient.py 192.168.4.1 --bench 200         # コマンドの往復の時間を測る
+#
+# 往復の時間は、GPIO19 へのデジタル出力コマンドを送ってから、GPIO19 と線でつないだ
+# GPIO17（右ボタン）のピンのイベントの通知が返るまで。コマンドはデバイスのコマンドキューと
+# do_command を通り、通知は割り込みから返る。GPIO19 と GPIO17 を線でつないでおくこと
+# （PC のエミュレーターなら python host/emulator.py --jumper 19）。
+# BLE との比較は host/roundtrip_bench.py（接続間隔の遅れを入れたシミュレーション）。
+
+CMD_DIGITAL_OUT = 33
+CMD_SHOW_TEXT = 65
+CMD_STOP_TONE = 96
+CMD_PLAY_TONE = 97
+CMD_NEOPIXEL = 161
+WS_GUID = b"258EAFA5-E914-47DA-95C5-C5AB0DC11B65"
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+PIN_EVENT = 0x11
+PIN_RISE = 2
+PIN_FALL = 3
+BENCH_OUTPUT_PIN = 19   # 往復を測るときにデジタル出力するピン
+BENCH_INPUT_PIN = 17    # BENCH_OUTPUT_PIN とつなぐ入力（右ボタン）
+
+
+class WebSocketClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port=80, path="/ws"):
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16))
+        writer.write(b"GET %s HTTP/1.1\r\nHost: %s\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n"
+                     % (path.encode(), host.encode(), key))
+        await writer.drain()
+        status = await reader.readline()
+        if b" 101 " not in status:
+            raise ConnectionError(status.decode().strip())
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("sec-websocket-accept", "").encode() != accept:
+            raise ConnectionError("bad Sec-WebSocket-Accept")
+        return cls(reader, writer)
+
+    def send(self, data, opcode=OP_BINARY):
+        """クライアントからのフレームはマスクする"""
+        mask = os.urandom(4)
+        if len(data) < 126:
+            head = struct.pack("!BB", 0x80 | opcode, 0x80 | len(data))
+        else:
+            head = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, len(data))
+        self.writer.write(head + mask + bytes(b ^ mask[i & 3] for i, b in enumerate(data)))
+
+    async def receive(self):
+        """(opcode, data) を返す"""
+        head = await self.reader.readexactly(2)
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        return head[0] & 0x0F, await self.reader.readexactly(length)
+
+    async def close(self):
+        self.send(struct.pack("!H", 1000), OP_CLOSE)
+        await self.writer.drain()
+        self.writer.close()
+
+
+def describe(data):
+    """デバイスからのフレームを読める形にする"""
+    if len(data) == 3:
+        return "hello hardware=%d protocol=%d route=%d" % tuple(data)
+    if len(data) == 7:
+        gpio, light, temperature, humidity = struct.unpack("<I3B", data)
+        return f"state gpio={gpio:#010x} light={light} temp={temperature - 128} humi={humidity * 100 // 255}%"
+    if len(data) == 20 and data[19] == 0x11:
+        pin, event, timestamp = struct.unpack_from("<BBI", data)
+        return f"pin {pin} event={event} t={timestamp}"
+    if len(data) == 20 and data[19] == 0x12:
+        action, button, event, timestamp = struct.unpack_from("<BHBI", data)
+        return f"button {button} event={event} t={timestamp}"
+    return data.hex()
+
+
+def is_echo(data, value):
+    """value を出力したときに返る、入力ピンのイベントの通知か"""
+    return (len(data) == 20 and data[19] == PIN_EVENT and data[0] == BENCH_INPUT_PIN
+            and data[1] == (PIN_RISE if value else PIN_FALL))
+
+
+def print_times(name, times):
+    """往復の時間 (ms) の分布を表示する"""
+    times = sorted(times)
+    print(f"{name} 往復 {len(times)} 回: 最小={times[0]:.1f} 50%={times[len(times) // 2]:.1f} "
+          f"95%={times[int(len(times) * 0.95)]:.1f} 最大={times[-1]:.1f} ms")
+
+
+async def bench(ws, count):
+    """デジタル出力のコマンドが入力ピンのイベントとして返るまでを count 回測る（ほかの通知は読み飛ばす）"""
+    times = []
+    for i in range(count):
+        value = (i + 1) & 1     # 毎回エッジができるように 1 と 0 を交互に出す
+        start = time.perf_counter()
+        ws.send(bytes((CMD_DIGITAL_OUT, BENCH_OUTPUT_PIN, value)))
+        await ws.writer.drain()
+        deadline = start + 2    # 状態の通知は届き続けるので、1 回の往復全体で時間を区切る
+        while True:
+            opcode, data = await asyncio.wait_for(ws.receive(), deadline - time.perf_counter())
+            if opcode == OP_BINARY and is_echo(data, value):
+                break
+        times.append((time.perf_counter() - start) * 1000)
+    ws.send(bytes((CMD_DIGITAL_OUT, BENCH_OUTPUT_PIN, 0)))
+    await ws.writer.drain()
+    return times
+
+
+async def run(args):
+    ws = await WebSocketClient.connect(args.host, args.port)
+    if args.text is not None:
+        text = args.text.encode()
+        ws.send(bytes((CMD_SHOW_TEXT, 0)) + text)
+    if args.tone:
+        ws.send(struct.pack("<BIB", CMD_PLAY_TONE, 1000000 // args.tone, 255))
+    if args.pixel:
+        ws.send(bytes([CMD_NEOPIXEL] + args.pixel))
+    await ws.writer.drain()
+    if args.bench:
+        try:
+            print_times("WebSocket", await bench(ws, args.bench))
+        except asyncio.TimeoutError:
+            print(f"GPIO{BENCH_INPUT_PIN} のイベントが返りません（GPIO{BENCH_OUTPUT_PIN} とつないでください）")
+    else:
+        end = time.monotonic() + args.listen
+        try:
+            while time.monotonic() < end:
+                opcode, data = await asyncio.wait_for(ws.receive(), end - time.monotonic())
+                if opcode == OP_BINARY:
+                    print(describe(data))
+        except asyncio.TimeoutError:
+            pass
+    if args.tone:
+        ws.send(bytes((CMD_STOP_TONE,)))
+    await ws.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="デバイスの WebSocket (/ws) クライアント")
+    parser.add_argument("host", help="デバイスの IP アドレス（アクセスポイントなら 192.168.4.1）")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--text", help="OLED に表示する文字")
+    parser.add_argument("--tone", type=int, help="鳴らす音の周波数 (Hz)")
+    parser.add_argument("--pixel", type=int, nargs=4, metavar=("N", "R", "G", "B"), help="NeoPixel の色 (0〜100)")
+    parser.add_argument("--listen", type=float, default=10, help="通知を表示する秒数")
+    parser.add_argument("--bench", type=int, help="コマンドの往復の時間を測る回数")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())